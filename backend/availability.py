@@ -0,0 +1,356 @@
+# -----------------------------
+# AVAILABILITY ENGINE
+# -----------------------------
+# Computes per-window free slots for a test on a date with a fixed number
+# of queries, independent of how many windows the schedule has:
+#   1. schedule + test + lab/test/doctor holiday for the date (one joined row)
+#   2. windows of the schedule with their booking counts (one grouped query)
+
+import json
+from datetime import timedelta
+
+
+def time_str_to_minutes(t: str):
+    """Convert 'HH:MM' string to total minutes"""
+    h, m = map(int, t.split(":"))
+    return h * 60 + m
+
+
+def calculate_adjusted_max(window_start, window_end, holiday_start, holiday_end, max_tests):
+    """
+    Reduce max_tests proportionally when availability overlaps partially
+    (lab/test/doctor available only for part of the window).
+    """
+
+    w_start = time_str_to_minutes(window_start)
+    w_end = time_str_to_minutes(window_end)
+    h_start = time_str_to_minutes(holiday_start)
+    h_end = time_str_to_minutes(holiday_end)
+
+    return _adjusted_max_minutes(w_start, w_end, h_start, h_end, max_tests)
+
+
+def _adjusted_max_minutes(w_start, w_end, h_start, h_end, max_tests):
+    """Same as calculate_adjusted_max, on values already converted to minutes."""
+    window_minutes = w_end - w_start
+    if window_minutes <= 0:
+        return 0
+
+    # Available time inside the window
+    available_start = max(w_start, h_start)
+    available_end = min(w_end, h_end)
+
+    if available_start >= available_end:
+        return 0  # no availability at all
+
+    available_minutes = available_end - available_start
+
+    # Proportional reduction
+    fraction = available_minutes / window_minutes
+    adjusted = max_tests * fraction
+
+    # Round down safely (never exceed max_tests)
+    return max(0, int(adjusted))
+
+
+def holiday_intervals(*holidays):
+    """
+    Turn (is_closed, opens_at, closes_at) holiday rows into open intervals
+    in minutes. Returns None if any of them closes the whole day.
+    Missing rows (None) are ignored.
+    """
+    intervals = []
+    for holiday in holidays:
+        if not holiday or holiday[0] is None:
+            continue
+        is_closed, opens_at, closes_at = holiday
+        if is_closed:
+            return None
+        intervals.append((time_str_to_minutes(opens_at), time_str_to_minutes(closes_at)))
+    return intervals
+
+
+def window_capacity(window_start, window_end, max_tests, intervals):
+    """Effective max_tests of a window after applying all partial holidays."""
+    adjusted_max = max_tests
+    if not intervals:
+        return adjusted_max
+
+    w_start = time_str_to_minutes(window_start)
+    w_end = time_str_to_minutes(window_end)
+    for h_start, h_end in intervals:
+        adjusted_max = min(
+            adjusted_max,
+            _adjusted_max_minutes(w_start, w_end, h_start, h_end, max_tests)
+        )
+    return adjusted_max
+
+
+def compute_available_slots(cursor, test_id: str, booking_date: str, day_number: int):
+    """
+    Return [{window_id, window_start, window_end, available_slots}] for a test
+    on booking_date ('YYYY-MM-DD', weekday day_number).
+    """
+
+    # -----------------------------
+    # Schedule, test flags and holidays (one row)
+    # -----------------------------
+    cursor.execute("""
+        SELECT
+            ts.schedule_id,
+            ts.is_closed,
+            lh.is_closed, lh.opens_at, lh.closes_at,
+            th.is_closed, th.opens_at, th.closes_at,
+            dh.is_closed, dh.opens_at, dh.closes_at
+        FROM test_schedule ts
+        JOIN tests t ON t.test_id = ts.test_id
+        LEFT JOIN lab_holidays lh
+            ON lh.date = :date
+        LEFT JOIN test_holidays th
+            ON th.test_id = ts.test_id AND th.date = :date
+        LEFT JOIN doctor_holidays dh
+            ON t.requires_doctor
+           AND dh.date = :date
+           AND dh.doctor_id = (
+                SELECT doctor_id FROM test_doctor_assignments
+                WHERE test_id = ts.test_id
+                LIMIT 1
+           )
+        WHERE ts.test_id = :test_id AND ts.day_of_week = :day
+        LIMIT 1
+    """, {"test_id": test_id, "date": booking_date, "day": day_number})
+    row = cursor.fetchone()
+
+    if not row:
+        return []  # no schedule for this day (or unknown test)
+
+    schedule_id, is_closed = row[0], row[1]
+    if is_closed:
+        return []
+
+    intervals = holiday_intervals(row[2:5], row[5:8], row[8:11])
+    if intervals is None:
+        return []  # lab, test or doctor closed for the whole day
+
+    # -----------------------------
+    # Windows + booking counts (one grouped query)
+    # -----------------------------
+    cursor.execute("""
+        SELECT
+            w.window_id,
+            w.window_start,
+            w.window_end,
+            w.max_tests,
+            COUNT(b.booking_id)
+        FROM test_schedule_windows w
+        LEFT JOIN bookings b
+            ON b.window_id = w.window_id AND b.booking_date = ?
+        WHERE w.test_id = ? AND w.schedule_id = ?
+        GROUP BY w.window_id
+        ORDER BY w.window_start
+    """, (booking_date, test_id, schedule_id))
+
+    return [
+        {
+            "window_id": window_id,
+            "window_start": window_start,
+            "window_end": window_end,
+            "available_slots": max(
+                0, window_capacity(window_start, window_end, max_tests, intervals) - booked
+            )
+        }
+        for window_id, window_start, window_end, max_tests, booked in cursor.fetchall()
+    ]
+
+
+# -----------------------------
+# RANGE AVAILABILITY (calendar views)
+# -----------------------------
+# Same rules as compute_available_slots, evaluated for many tests and dates
+# with set-based queries. Results are produced date batch by date batch so
+# memory stays bounded by batch_days x tests x windows, not by the range.
+
+def _json_ids(ids):
+    return json.dumps(list(ids))
+
+
+def _load_test_layout(cursor, test_ids):
+    """
+    Windows per (test_id, day_of_week) plus doctor info per test.
+    Sized by schedule configuration only, not by the date range.
+    """
+    cursor.execute("""
+        SELECT
+            t.test_id,
+            t.requires_doctor,
+            (SELECT doctor_id FROM test_doctor_assignments a
+             WHERE a.test_id = t.test_id LIMIT 1)
+        FROM tests t
+        WHERE t.test_id IN (SELECT value FROM json_each(:ids))
+    """, {"ids": _json_ids(test_ids)})
+    doctors = {
+        test_id: (doctor_id if requires_doctor else None)
+        for test_id, requires_doctor, doctor_id in cursor.fetchall()
+    }
+
+    cursor.execute("""
+        SELECT
+            ts.test_id,
+            ts.day_of_week,
+            ts.schedule_id,
+            ts.is_closed,
+            w.window_id,
+            w.window_start,
+            w.window_end,
+            w.max_tests
+        FROM test_schedule ts
+        LEFT JOIN test_schedule_windows w
+            ON w.schedule_id = ts.schedule_id AND w.test_id = ts.test_id
+        WHERE ts.test_id IN (SELECT value FROM json_each(:ids))
+        ORDER BY ts.test_id, ts.day_of_week, ts.rowid, w.window_start
+    """, {"ids": _json_ids(doctors)})
+
+    # (test_id, day) -> (schedule_id, is_closed, [windows]); first schedule wins
+    layout = {}
+    for test_id, day, schedule_id, is_closed, window_id, w_start, w_end, max_tests in cursor.fetchall():
+        entry = layout.setdefault((test_id, day), (schedule_id, is_closed, []))
+        if entry[0] != schedule_id or window_id is None:
+            continue
+        entry[2].append((window_id, w_start, w_end, max_tests))
+
+    return doctors, layout
+
+
+def _holidays_by_key(cursor, sql, params):
+    """First holiday row per key, like fetchone() on the single-date path."""
+    cursor.execute(sql, params)
+    holidays = {}
+    for row in cursor.fetchall():
+        holidays.setdefault(tuple(row[:-3]), tuple(row[-3:]))
+    return holidays
+
+
+def _iter_capacity_batches(cursor, test_ids, start_date, end_date, batch_days=7):
+    """
+    Yield (batch_start, batch_end, ordered_tests, days) per date batch, where
+    days is [(test_id, date_str, windows)] and windows is
+    [(window_id, window_start, window_end, capacity)] (empty when closed).
+    """
+    doctors, layout = _load_test_layout(cursor, test_ids)
+    ordered_tests = [t for t in test_ids if t in doctors]
+    if not ordered_tests:
+        return
+
+    doctor_ids = sorted({d for d in doctors.values() if d})
+
+    batch_start = start_date
+    while batch_start <= end_date:
+        batch_end = min(end_date, batch_start + timedelta(days=batch_days - 1))
+        params = {
+            "start": batch_start.isoformat(),
+            "end": batch_end.isoformat(),
+            "tests": _json_ids(ordered_tests),
+            "doctors": _json_ids(doctor_ids),
+        }
+
+        # -----------------------------
+        # Holidays for the batch (by date range)
+        # -----------------------------
+        lab_holidays = _holidays_by_key(cursor, """
+            SELECT date, is_closed, opens_at, closes_at
+            FROM lab_holidays
+            WHERE date BETWEEN :start AND :end
+        """, params)
+        test_holidays = _holidays_by_key(cursor, """
+            SELECT test_id, date, is_closed, opens_at, closes_at
+            FROM test_holidays
+            WHERE date BETWEEN :start AND :end
+              AND test_id IN (SELECT value FROM json_each(:tests))
+        """, params)
+        doctor_holidays = _holidays_by_key(cursor, """
+            SELECT doctor_id, date, is_closed, opens_at, closes_at
+            FROM doctor_holidays
+            WHERE date BETWEEN :start AND :end
+              AND doctor_id IN (SELECT value FROM json_each(:doctors))
+        """, params) if doctor_ids else {}
+
+        days = []
+        day = batch_start
+        while day <= batch_end:
+            date_str = day.isoformat()
+            for test_id in ordered_tests:
+                days.append((test_id, date_str, _windows_for_day(
+                    layout.get((test_id, day.weekday())),
+                    lab_holidays.get((date_str,)),
+                    test_holidays.get((test_id, date_str)),
+                    doctor_holidays.get((doctors[test_id], date_str)) if doctors[test_id] else None,
+                )))
+            day += timedelta(days=1)
+
+        yield batch_start, batch_end, ordered_tests, days
+        batch_start = batch_end + timedelta(days=1)
+
+
+def iter_window_capacity(cursor, test_ids, start_date, end_date, batch_days=7):
+    """Yield (test_id, date_str, [(window_id, window_start, window_end, capacity)])."""
+    for _, _, _, days in _iter_capacity_batches(cursor, test_ids, start_date, end_date, batch_days):
+        yield from days
+
+
+def iter_availability_range(cursor, test_ids, start_date, end_date, batch_days=7):
+    """
+    Yield {"test_id", "date", "slots"} for every test in test_ids and every
+    date in [start_date, end_date], ordered by date then test. "slots" has the
+    same shape as compute_available_slots() for that test and date.
+    """
+    batches = _iter_capacity_batches(cursor, test_ids, start_date, end_date, batch_days)
+    for batch_start, batch_end, ordered_tests, days in batches:
+
+        # -----------------------------
+        # Bookings grouped by (window_id, booking_date)
+        # -----------------------------
+        cursor.execute("""
+            SELECT window_id, booking_date, COUNT(*)
+            FROM bookings
+            WHERE booking_date BETWEEN :start AND :end
+              AND test_id IN (SELECT value FROM json_each(:tests))
+            GROUP BY window_id, booking_date
+        """, {
+            "start": batch_start.isoformat(),
+            "end": batch_end.isoformat(),
+            "tests": _json_ids(ordered_tests),
+        })
+        booked = {(w, d): n for w, d, n in cursor.fetchall()}
+
+        for test_id, date_str, windows in days:
+            yield {
+                "test_id": test_id,
+                "date": date_str,
+                "slots": [
+                    {
+                        "window_id": window_id,
+                        "window_start": window_start,
+                        "window_end": window_end,
+                        "available_slots": max(0, capacity - booked.get((window_id, date_str), 0))
+                    }
+                    for window_id, window_start, window_end, capacity in windows
+                ]
+            }
+
+
+def _windows_for_day(schedule, lab_holiday, test_holiday, doctor_holiday):
+    if not schedule:
+        return []
+    _, is_closed, windows = schedule
+    if is_closed or not windows:
+        return []
+
+    intervals = holiday_intervals(lab_holiday, test_holiday, doctor_holiday)
+    if intervals is None:
+        return []
+
+    return [
+        (window_id, window_start, window_end,
+         window_capacity(window_start, window_end, max_tests, intervals))
+        for window_id, window_start, window_end, max_tests in windows
+    ]
@@ -0,0 +1,297 @@
+# -----------------------------
+# WINDOW CAPACITY PROJECTION
+# -----------------------------
+# window_capacity holds the effective max_tests of every bookable window for
+# each date of a rolling horizon (today + HORIZON_DAYS), with lab, test and
+# doctor holidays already applied. A window/date without a row is not
+# bookable (closed day, full holiday or no schedule).
+#
+# Writers keep it current by calling refresh_capacity() for the tests and
+# dates they touched, inside their own transaction. Availability for a date
+# in the horizon is then a single join (projected_available_slots).
+#
+# Admission (crud_backend._claim_slot) counts bookings in booking_counters,
+# while availability reads count the bookings table. The two must agree:
+# check_booking_counters() lists (window, date) rows where they differ and
+# reconcile_booking_counters() resets those rows to the real count (run at
+# backend startup).
+#
+#   python -m backend.capacity check     # compare with the live computation, check counters
+#   python -m backend.capacity rebuild   # rebuild the whole horizon, reconcile counters
+
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+from backend.availability import compute_available_slots, iter_window_capacity, _json_ids
+
+HORIZON_DAYS = 90
+
+
+def _parse(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _parse_or_none(value):
+    """Like _parse, None for rows stored before dates were validated."""
+    try:
+        return _parse(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_horizon(cursor):
+    """(start_date, end_date) of the built projection, or None."""
+    cursor.execute("SELECT start_date, end_date FROM capacity_horizon WHERE id = 1")
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return _parse(row[0]), _parse(row[1])
+
+
+def _all_test_ids(cursor):
+    cursor.execute("SELECT test_id FROM tests")
+    return [r[0] for r in cursor.fetchall()]
+
+
+def _rebuild_range(cursor, test_ids, start_date, end_date):
+    """Replace the rows of test_ids for [start_date, end_date]."""
+    params = {"start": start_date.isoformat(), "end": end_date.isoformat(), "tests": _json_ids(test_ids)}
+    cursor.execute("""
+        DELETE FROM window_capacity
+        WHERE test_id IN (SELECT value FROM json_each(:tests))
+          AND date BETWEEN :start AND :end
+    """, params)
+
+    # rows are computed on a second cursor while executemany streams them in
+    reader = cursor.connection.cursor()
+    cursor.executemany("""
+        INSERT INTO window_capacity (window_id, date, test_id, effective_max)
+        VALUES (?, ?, ?, ?)
+    """, (
+        (window_id, date_str, test_id, capacity)
+        for test_id, date_str, windows in iter_window_capacity(reader, test_ids, start_date, end_date)
+        for window_id, _, _, capacity in windows
+    ))
+
+
+def refresh_capacity(cursor, test_ids=None, dates=None):
+    """
+    Recompute the projection for test_ids (None: every test) on dates
+    (None: the whole horizon). Dates outside the horizon are ignored.
+    Runs on the caller's cursor, so it commits with the caller's change.
+    """
+    horizon = get_horizon(cursor)
+    if horizon is None:
+        return  # projection not built yet; readers fall back to live computation
+
+    if test_ids is None:
+        # deleted tests: drop their rows too
+        cursor.execute("DELETE FROM window_capacity WHERE test_id NOT IN (SELECT test_id FROM tests)")
+        test_ids = _all_test_ids(cursor)
+    test_ids = [t for t in test_ids if t]
+    if not test_ids:
+        return
+
+    start, end = horizon
+    if dates is None:
+        _rebuild_range(cursor, test_ids, start, end)
+        return
+
+    # a malformed date matches no window/date row, so there is nothing to refresh for it
+    for day in sorted({day for day in map(_parse_or_none, dates) if day}):
+        if start <= day <= end:
+            _rebuild_range(cursor, test_ids, day, day)
+
+
+def refresh_capacity_for_doctor(cursor, doctor_id, dates=None):
+    """Refresh the tests assigned to doctor_id (doctor holidays / assignments)."""
+    cursor.execute("SELECT DISTINCT test_id FROM test_doctor_assignments WHERE doctor_id=?", (doctor_id,))
+    test_ids = [r[0] for r in cursor.fetchall()]
+    if test_ids:
+        refresh_capacity(cursor, test_ids, dates)
+
+
+def drop_test_capacity(cursor, test_id):
+    cursor.execute("DELETE FROM window_capacity WHERE test_id=?", (test_id,))
+
+
+# -----------------------------
+# ROLLING HORIZON
+# -----------------------------
+def roll_horizon(conn, today=None, days=HORIZON_DAYS):
+    """
+    Move the horizon to [today, today + days - 1]: drop past dates and build
+    only the dates that are new. Builds everything the first time.
+    Commits. Returns the new (start_date, end_date).
+    """
+    today = today or date.today()
+    target = (today, today + timedelta(days=days - 1))
+
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_horizon(cursor)
+        if current != target:
+            test_ids = _all_test_ids(cursor)
+            if current is None or current[1] < today:
+                cursor.execute("DELETE FROM window_capacity")
+                _rebuild_range(cursor, test_ids, target[0], target[1])
+            else:
+                cursor.execute("DELETE FROM window_capacity WHERE date < ?", (today.isoformat(),))
+                if current[1] < target[1]:
+                    _rebuild_range(cursor, test_ids, current[1] + timedelta(days=1), target[1])
+                if target[1] < current[1]:
+                    cursor.execute("DELETE FROM window_capacity WHERE date > ?", (target[1].isoformat(),))
+                if today < current[0]:
+                    _rebuild_range(cursor, test_ids, today, current[0] - timedelta(days=1))
+
+            cursor.execute("""
+                INSERT INTO capacity_horizon (id, start_date, end_date) VALUES (1, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET start_date = excluded.start_date, end_date = excluded.end_date
+            """, (target[0].isoformat(), target[1].isoformat()))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return target
+
+
+_ROLLED_ON = None
+_ROLL_LOCK = threading.Lock()
+
+
+def horizon_for_reads(conn):
+    """
+    Horizon usable by readers in this process. Rolls it forward at most
+    once per day per process; the projection itself is shared by all.
+    """
+    global _ROLLED_ON
+    today = date.today()
+    if _ROLLED_ON is None or _ROLLED_ON[0] != today:
+        with _ROLL_LOCK:
+            if _ROLLED_ON is None or _ROLLED_ON[0] != today:
+                _ROLLED_ON = (today, roll_horizon(conn, today))
+    return _ROLLED_ON[1]
+
+
+# -----------------------------
+# READ PATH
+# -----------------------------
+def projected_available_slots(cursor, test_id: str, booking_date: str):
+    """Same result as compute_available_slots, read from the projection."""
+    cursor.execute("""
+        SELECT
+            w.window_id,
+            w.window_start,
+            w.window_end,
+            MAX(0, c.effective_max - (
+                SELECT COUNT(*) FROM bookings b
+                WHERE b.window_id = c.window_id AND b.booking_date = c.date
+            ))
+        FROM window_capacity c
+        JOIN test_schedule_windows w ON w.window_id = c.window_id
+        WHERE c.test_id = ? AND c.date = ?
+        ORDER BY w.window_start
+    """, (test_id, booking_date))
+
+    return [
+        {
+            "window_id": window_id,
+            "window_start": window_start,
+            "window_end": window_end,
+            "available_slots": available
+        }
+        for window_id, window_start, window_end, available in cursor.fetchall()
+    ]
+
+
+# -----------------------------
+# CONSISTENCY CHECK
+# -----------------------------
+def check_capacity(cursor, start_date=None, end_date=None, test_ids=None):
+    """
+    Compare the projection with compute_available_slots for every test and
+    date in the range (default: the horizon). Returns a list of mismatches
+    {"test_id", "date", "projected", "live"}; empty means consistent.
+    """
+    horizon = get_horizon(cursor)
+    if horizon is None:
+        return []
+    start = max(_parse(start_date), horizon[0]) if start_date else horizon[0]
+    end = min(_parse(end_date), horizon[1]) if end_date else horizon[1]
+    test_ids = test_ids or _all_test_ids(cursor)
+
+    mismatches = []
+    day = start
+    while day <= end:
+        date_str = day.isoformat()
+        for test_id in test_ids:
+            live = compute_available_slots(cursor, test_id, date_str, day.weekday())
+            projected = projected_available_slots(cursor, test_id, date_str)
+            if live != projected:
+                mismatches.append({"test_id": test_id, "date": date_str, "projected": projected, "live": live})
+        day += timedelta(days=1)
+    return mismatches
+
+
+# -----------------------------
+# BOOKING COUNTERS
+# -----------------------------
+def check_booking_counters(cursor):
+    """
+    booking_counters rows whose count differs from the bookings table:
+    [{"window_id", "date", "counter", "bookings"}]; empty means consistent.
+    """
+    cursor.execute("""
+        SELECT c.window_id, c.booking_date, c.booked, COUNT(b.booking_id)
+        FROM booking_counters c
+        LEFT JOIN bookings b ON b.window_id = c.window_id AND b.booking_date = c.booking_date
+        GROUP BY c.window_id, c.booking_date
+        HAVING c.booked != COUNT(b.booking_id)
+    """)
+    return [
+        {"window_id": window_id, "date": day, "counter": counter, "bookings": bookings}
+        for window_id, day, counter, bookings in cursor.fetchall()
+    ]
+
+
+def reconcile_booking_counters(cursor):
+    """Reset drifted counters to the number of bookings. Run inside a write transaction; returns the rows fixed."""
+    drifted = check_booking_counters(cursor)
+    cursor.executemany(
+        "UPDATE booking_counters SET booked=? WHERE window_id=? AND booking_date=?",
+        [(d["bookings"], d["window_id"], d["date"]) for d in drifted]
+    )
+    return drifted
+
+
+if __name__ == "__main__":
+    from backend.db_table import init_db
+    from backend.db_pool import db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    from backend.db_pool import run_write_transaction
+
+    init_db()
+    with db_connection() as conn:
+        if command == "rebuild":
+            conn.execute("DELETE FROM capacity_horizon")
+            conn.commit()
+            start, end = roll_horizon(conn)
+            print(f"rebuilt window_capacity for {start} .. {end}")
+            fixed = run_write_transaction(conn, reconcile_booking_counters)
+            print(f"reconciled {len(fixed)} booking counters")
+        else:
+            roll_horizon(conn)
+            mismatches = check_capacity(conn.cursor())
+            for m in mismatches[:20]:
+                print(f"MISMATCH test={m['test_id']} date={m['date']}\n  projected={m['projected']}\n  live={m['live']}")
+            print(f"{len(mismatches)} mismatching (test, date) pairs")
+            drifted = check_booking_counters(conn.cursor())
+            for d in drifted[:20]:
+                print(f"COUNTER window={d['window_id']} date={d['date']} counter={d['counter']} bookings={d['bookings']}")
+            print(f"{len(drifted)} drifted booking counters")
+            sys.exit(1 if mismatches or drifted else 0)
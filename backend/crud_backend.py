@@ -1,19 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
+import base64
+import json
 import sqlite3
 import uuid
 from datetime import date, time
 from contextlib import asynccontextmanager
-from utils.schedule_win import generate_windows_for_schedule
+from utils.schedule_win import generate_windows_for_schedule, regenerate_all_windows
 
 from datetime import datetime, timedelta
 from backend.db_table import init_db, DB_PATH
-
-def time_str_to_minutes(t: str):
-    """Convert 'HH:MM' string to total minutes"""
-    h, m = map(int, t.split(":"))
-    return h * 60 + m
+from backend.db_pool import get_db, get_pool, run_write_transaction, DatabaseBusy
+from backend.db_executor import run_db, shutdown_executor
+from backend.availability import (
+    time_str_to_minutes,
+    calculate_adjusted_max,
+    compute_available_slots,
+    iter_availability_range
+)
+from backend.ref_cache import get_ref_cache, bump_generation
+from backend.capacity import (
+    refresh_capacity,
+    refresh_capacity_for_doctor,
+    drop_test_capacity,
+    horizon_for_reads,
+    projected_available_slots,
+    reconcile_booking_counters
+)
 
 def lc(value):
     if value is None:
@@ -23,6 +38,26 @@ def lc(value):
     return value
 
 
+def cached_json(request: Request, conn, name: str, loader, key=None) -> Response:
+    """
+    Serve loader(conn) from the reference cache with an ETag. A matching
+    If-None-Match gets a 304 without loading anything.
+    """
+    cache = get_ref_cache()
+    etag = cache.etag(conn, name, key)
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+        cache.record_not_modified(name)
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    entry = cache.get(conn, name, loader, key)
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={"ETag": entry.etag, "Cache-Control": "no-cache"}
+    )
+
+
 # ===========================
 # Lifespan
 # ===========================
@@ -30,8 +65,15 @@ def lc(value):
 async def lifespan(app: FastAPI):
     # Startup code
     init_db()
+    with get_pool().connection() as conn:
+        horizon_for_reads(conn)   # build / roll the window_capacity projection
+        drifted = run_write_transaction(conn, reconcile_booking_counters)
+        if drifted:
+            print(f"[capacity] reconciled {len(drifted)} booking counters with the bookings table")
     yield
-    # Shutdown code (if any)
+    # Shutdown code
+    shutdown_executor()
+    get_pool().close_all()
 
 # ===========================
 # FastAPI app
@@ -124,13 +166,12 @@ class LabSchedule(BaseModel):
 # Fetch all schedules
 
 @app.get("/lab/schedule")
-def get_all_schedules():
+def get_all_schedules(conn: sqlite3.Connection = Depends(get_db)):
     day_map = {
         0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday",
         4: "Friday", 5: "Saturday", 6: "Sunday"
     }
 
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM lab_schedule ORDER BY day_of_week")
@@ -147,13 +188,11 @@ def get_all_schedules():
             "is_closed": bool(r[4])
         })
 
-    conn.close()
     return schedules
 
 # Update a single day schedule
 @app.put("/lab/schedule/{schedule_id}")
-def update_schedule(schedule_id: str, schedule: LabSchedule):
-    conn = sqlite3.connect(DB_PATH)
+def update_schedule(schedule_id: str, schedule: LabSchedule, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -168,13 +207,12 @@ def update_schedule(schedule_id: str, schedule: LabSchedule):
         schedule_id
     ))
 
+    bump_generation(conn.cursor(), "lab_schedule")
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Schedule not found")
 
-    conn.close()
     return {"success": True, "message": "Schedule updated successfully"}
 
 
@@ -183,6 +221,16 @@ def update_schedule(schedule_id: str, schedule: LabSchedule):
 # ENDPOINTS Holidays
 # ===========================
 
+def validate_date(value: str):
+    """Holiday dates feed the capacity projection: reject anything but YYYY-MM-DD before writing."""
+    try:
+        valid = datetime.strptime(value, "%Y-%m-%d").date().isoformat() == value   # zero-padded too
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+
 class Holiday(BaseModel):
     date: str           # format 'YYYY-MM-DD'
     opens_at: str       # e.g., '09:00'
@@ -191,31 +239,34 @@ class Holiday(BaseModel):
     remarks: Optional[str] = ""  # <-- add this
 
 @app.post("/lab/holidays")
-def create_holiday(holiday: Holiday):
-    conn = sqlite3.connect(DB_PATH)
+def create_holiday(holiday: Holiday, conn: sqlite3.Connection = Depends(get_db)):
+    validate_date(holiday.date)
     cursor = conn.cursor()
 
     holiday_id = str(uuid.uuid4())
-    cursor.execute("""
-        INSERT INTO lab_holidays (holiday_id, date, opens_at, closes_at, is_closed, remarks)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        holiday_id,
-        holiday.date,
-        lc(holiday.opens_at),
-        lc(holiday.closes_at),
-        holiday.is_closed,
-        holiday.remarks
-    ))
+    try:
+        cursor.execute("""
+            INSERT INTO lab_holidays (holiday_id, date, opens_at, closes_at, is_closed, remarks)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            holiday_id,
+            holiday.date,
+            lc(holiday.opens_at),
+            lc(holiday.closes_at),
+            holiday.is_closed,
+            holiday.remarks
+        ))
+    except sqlite3.IntegrityError:
+        # ux_lab_holidays_date: one lab holiday per date
+        raise HTTPException(status_code=400, detail="A lab holiday already exists for this date")
 
+    refresh_capacity(conn.cursor(), dates=[holiday.date])
     conn.commit()
-    conn.close()
     return {"success": True, "message": "Holiday created successfully", "holiday_id": holiday_id}
 
 
 @app.get("/lab/holidays")
-def get_all_holidays():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_holidays(conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM lab_holidays ORDER BY date")
@@ -232,51 +283,58 @@ def get_all_holidays():
         } for r in rows
     ]
 
-    conn.close()
     return holidays
 
 
 @app.put("/lab/holidays/{holiday_id}")
-def update_holiday(holiday_id: str, holiday: Holiday):
-    conn = sqlite3.connect(DB_PATH)
+def update_holiday(holiday_id: str, holiday: Holiday, conn: sqlite3.Connection = Depends(get_db)):
+    validate_date(holiday.date)
     cursor = conn.cursor()
 
-    cursor.execute("""
-        UPDATE lab_holidays
-        SET date=?, opens_at=?, closes_at=?, is_closed=?, remarks=?
-        WHERE holiday_id=?
-    """, (
-        holiday.date,
-        lc(holiday.opens_at),
-        lc(holiday.closes_at),
-        holiday.is_closed,
-        holiday.remarks,
-        holiday_id
-    ))
+    cursor.execute("SELECT date FROM lab_holidays WHERE holiday_id=?", (holiday_id,))
+    old = cursor.fetchone()
 
+    try:
+        cursor.execute("""
+            UPDATE lab_holidays
+            SET date=?, opens_at=?, closes_at=?, is_closed=?, remarks=?
+            WHERE holiday_id=?
+        """, (
+            holiday.date,
+            lc(holiday.opens_at),
+            lc(holiday.closes_at),
+            holiday.is_closed,
+            holiday.remarks,
+            holiday_id
+        ))
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="A lab holiday already exists for this date")
+
+    if old:
+        refresh_capacity(conn.cursor(), dates=[old[0], holiday.date])
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Holiday not found")
 
-    conn.close()
     return {"success": True, "message": "Holiday updated successfully"}
 
 
 @app.delete("/lab/holidays/{holiday_id}")
-def delete_holiday(holiday_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_holiday(holiday_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
+    cursor.execute("SELECT date FROM lab_holidays WHERE holiday_id=?", (holiday_id,))
+    old = cursor.fetchone()
+
     cursor.execute("DELETE FROM lab_holidays WHERE holiday_id=?", (holiday_id,))
+    if old:
+        refresh_capacity(conn.cursor(), dates=[old[0]])
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Holiday not found")
 
-    conn.close()
     return {"success": True, "message": "Holiday deleted successfully"}
 
 # ================================
@@ -294,8 +352,7 @@ class Test(BaseModel):
 
 
 @app.post("/lab/tests")
-def create_test(test: Test):
-    conn = sqlite3.connect(DB_PATH)
+def create_test(test: Test, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
     test_id = str(uuid.uuid4())
@@ -312,19 +369,21 @@ def create_test(test: Test):
         test.duration
     ))
 
+    bump_generation(cursor, "tests")
     conn.commit()
-    conn.close()
     return {"success": True, "message": "Test created successfully", "test_id": test_id}
 
 
 @app.get("/lab/tests")
-def get_all_tests():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_tests(request: Request, conn: sqlite3.Connection = Depends(get_db)):
+    return cached_json(request, conn, "tests", load_tests)
+
+
+def load_tests(conn: sqlite3.Connection):
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM tests ORDER BY test_name")
     rows = cursor.fetchall()
-    conn.close()
 
     return [
         {
@@ -340,8 +399,7 @@ def get_all_tests():
 
 
 @app.put("/lab/tests/{test_id}")
-def update_test(test_id: str, test: Test):
-    conn = sqlite3.connect(DB_PATH)
+def update_test(test_id: str, test: Test, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -358,29 +416,37 @@ def update_test(test_id: str, test: Test):
         test_id
     ))
 
+    # requires_doctor decides whether doctor holidays apply
+    refresh_capacity(conn.cursor(), [test_id])
+    # schedules list shows the test name
+    bump_generation(conn.cursor(), "tests", "schedules")
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
 
-    conn.close()
     return {"success": True, "message": "Test updated successfully"}
 
 
 @app.delete("/lab/tests/{test_id}")
-def delete_test(test_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_test(test_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
+    # foreign_keys is ON and bookings cascade with their test: refuse instead
+    # of silently deleting patients' bookings
+    cursor.execute("SELECT 1 FROM bookings WHERE test_id=? LIMIT 1", (test_id,))
+    if cursor.fetchone():
+        raise HTTPException(status_code=400, detail="Test has existing bookings and cannot be deleted")
+
     cursor.execute("DELETE FROM tests WHERE test_id=?", (test_id,))
+    drop_test_capacity(conn.cursor(), test_id)
+    # schedules, their windows, test holidays and assignments cascade with the test
+    bump_generation(conn.cursor(), "tests", "schedules", "assignments")
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
 
-    conn.close()
     return {"success": True, "message": "Test deleted successfully"}
 
 
@@ -420,16 +486,14 @@ def day_name(day: int) -> str:
 # CREATE TEST SCHEDULE
 # ===========================
 @app.post("/lab/test-schedule")
-def create_test_schedule(schedule: TestSchedule, window_minutes: int):
+def create_test_schedule(schedule: TestSchedule, window_minutes: int, conn: sqlite3.Connection = Depends(get_db)):
     validate_day(schedule.day_of_week)
 
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     # Validate test exists
     cursor.execute("SELECT test_id FROM tests WHERE test_id=?", (schedule.test_id,))
     if not cursor.fetchone():
-        conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
 
     schedule_id = str(uuid.uuid4())
@@ -439,10 +503,12 @@ def create_test_schedule(schedule: TestSchedule, window_minutes: int):
         ) VALUES (?, ?, ?, ?, ?, ?)
     """, (schedule_id, schedule.test_id, schedule.day_of_week,
           schedule.opens_at, schedule.closes_at, schedule.is_closed))
-    conn.commit()
-    conn.close()
 
-    generate_windows_for_schedule(schedule.test_id, schedule_id, window_minutes)
+    # windows, capacity and generation commit together with the schedule
+    generate_windows_for_schedule(schedule.test_id, schedule_id, window_minutes, conn)
+    refresh_capacity(cursor, [schedule.test_id])
+    bump_generation(cursor, "schedules")
+    conn.commit()
 
     return {
         "success": True,
@@ -454,10 +520,9 @@ def create_test_schedule(schedule: TestSchedule, window_minutes: int):
 # UPDATE TEST SCHEDULE
 # ===========================
 @app.put("/lab/test-schedule/{schedule_id}")
-def update_test_schedule(schedule_id: str, schedule: TestSchedule, window_minutes: int):
+def update_test_schedule(schedule_id: str, schedule: TestSchedule, window_minutes: int, conn: sqlite3.Connection = Depends(get_db)):
     validate_day(schedule.day_of_week)
 
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -468,15 +533,15 @@ def update_test_schedule(schedule_id: str, schedule: TestSchedule, window_minute
           schedule.closes_at, schedule.is_closed, schedule_id))
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test schedule not found")
 
     cursor.execute("SELECT test_id FROM test_schedule WHERE schedule_id=?", (schedule_id,))
     test_id = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
 
-    generate_windows_for_schedule(test_id, schedule_id, window_minutes)
+    generate_windows_for_schedule(test_id, schedule_id, window_minutes, conn)
+    refresh_capacity(cursor, [test_id])
+    bump_generation(cursor, "schedules")
+    conn.commit()
 
     return {
         "success": True,
@@ -487,31 +552,73 @@ def update_test_schedule(schedule_id: str, schedule: TestSchedule, window_minute
 # DELETE TEST SCHEDULE
 # ===========================
 @app.delete("/lab/test-schedule/{schedule_id}")
-def delete_test_schedule(schedule_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_test_schedule(schedule_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
+    cursor.execute("SELECT test_id FROM test_schedule WHERE schedule_id=?", (schedule_id,))
+    row = cursor.fetchone()
+
     cursor.execute("DELETE FROM test_schedule_windows WHERE schedule_id=?", (schedule_id,))
     cursor.execute("DELETE FROM test_schedule WHERE schedule_id=?", (schedule_id,))
+    if row:
+        refresh_capacity(conn.cursor(), [row[0]])
+    bump_generation(conn.cursor(), "schedules")
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test schedule not found")
 
-    conn.close()
     return {
         "success": True,
         "message": "Test schedule and associated windows deleted successfully"
     }
 
 
+# ===========================
+# REGENERATE ALL WINDOWS
+# ===========================
+@app.post("/lab/test-schedule/regenerate-windows")
+def regenerate_schedule_windows(
+    window_minutes: Optional[int] = None,
+    test_id: Optional[str] = None,
+    conn: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Re-apply every schedule's hours and capacity to its windows (optionally
+    for one test). Unchanged intervals keep their window_id, so existing
+    bookings stay attached. Without window_minutes each schedule keeps its
+    current window size.
+    """
+    if window_minutes is not None and window_minutes <= 0:
+        raise HTTPException(status_code=400, detail="window_minutes must be positive")
+
+    cursor = conn.cursor()
+    result = regenerate_all_windows(conn, window_minutes, [test_id] if test_id else None)
+    if result["changed_test_ids"]:
+        refresh_capacity(cursor, result["changed_test_ids"])
+        bump_generation(cursor, "schedules")
+    conn.commit()
+
+    return {
+        "success": True,
+        "message": f"Regenerated windows for {result['schedules']} schedules in {result['elapsed_ms']} ms",
+        **result
+    }
+
+
 # ===========================
 # GET SCHEDULES BY TEST
 # ===========================
 @app.get("/lab/test-schedule/{test_id}")
-def get_test_schedule(test_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def get_test_schedule(test_id: str, request: Request, conn: sqlite3.Connection = Depends(get_db)):
+    return cached_json(
+        request, conn, "schedules",
+        lambda c: load_test_schedule(test_id, c),
+        key=test_id
+    )
+
+
+def load_test_schedule(test_id: str, conn: sqlite3.Connection):
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -528,7 +635,6 @@ def get_test_schedule(test_id: str):
     """, (test_id,))
 
     rows = cursor.fetchall()
-    conn.close()
 
     return [
         {
@@ -547,8 +653,11 @@ def get_test_schedule(test_id: str):
 # GET ALL TEST SCHEDULES
 # ===========================
 @app.get("/lab/test-schedule")
-def get_all_test_schedules():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_test_schedules(request: Request, conn: sqlite3.Connection = Depends(get_db)):
+    return cached_json(request, conn, "schedules", load_all_test_schedules)
+
+
+def load_all_test_schedules(conn: sqlite3.Connection):
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -566,7 +675,6 @@ def get_all_test_schedules():
     """)
 
     rows = cursor.fetchall()
-    conn.close()
 
     return [
         {
@@ -599,12 +707,11 @@ class TestScheduleWindow(BaseModel):
 
 
 @app.get("/lab/test-windows/{test_id}", response_model=List[TestScheduleWindow])
-def get_test_windows(test_id: str):
+def get_test_windows(test_id: str, conn: sqlite3.Connection = Depends(get_db)):
     """
     Fetch all windows for a given test_id from test_schedule_windows table.
     Returns schedule_id, window_index, start/end times, max_tests, and test_name.
     """
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -616,7 +723,6 @@ def get_test_windows(test_id: str):
     """, (test_id,))
 
     rows = cursor.fetchall()
-    conn.close()
 
     if not rows:
         raise HTTPException(status_code=404, detail=f"No windows found for test_id '{test_id}'")
@@ -647,12 +753,14 @@ def get_test_windows(test_id: str):
 
 
 @app.get("/lab/doctors", response_model=List[dict])
-def get_all_doctors():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_doctors(request: Request, conn: sqlite3.Connection = Depends(get_db)):
+    return cached_json(request, conn, "doctors", load_doctors)
+
+
+def load_doctors(conn: sqlite3.Connection):
     cursor = conn.cursor()
     cursor.execute("SELECT doctor_id, doctor_name, specialization, contact_info FROM doctors")
     rows = cursor.fetchall()
-    conn.close()
     return [
         {"doctor_id": r[0], "doctor_name": r[1], "specialization": r[2], "contact_info": r[3]}
         for r in rows
@@ -669,8 +777,7 @@ class Doctor(BaseModel):
     contact_info: str | None = None  # optional field
 
 @app.post("/lab/doctors")
-def create_doctor(data: Doctor):
-    conn = sqlite3.connect(DB_PATH)
+def create_doctor(data: Doctor, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     doctor_id = str(uuid.uuid4())
     cursor.execute("""
@@ -682,8 +789,8 @@ def create_doctor(data: Doctor):
         lc(data.specialization),
         lc(data.contact_info)
     ))
+    bump_generation(conn.cursor(), "doctors")
     conn.commit()
-    conn.close()
     return {"doctor_id": doctor_id}
 
 
@@ -691,8 +798,7 @@ def create_doctor(data: Doctor):
 # UPDATE DOCTOR
 # ---------------------------
 @app.put("/lab/doctors/{doctor_id}")
-def update_doctor(doctor_id: str, data: Doctor):
-    conn = sqlite3.connect(DB_PATH)
+def update_doctor(doctor_id: str, data: Doctor, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     cursor.execute("""
         UPDATE doctors
@@ -704,9 +810,9 @@ def update_doctor(doctor_id: str, data: Doctor):
         lc(data.contact_info),
         doctor_id
     ))
+    bump_generation(conn.cursor(), "doctors")
     conn.commit()
     updated = cursor.rowcount
-    conn.close()
     if not updated:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return {"status": "success"}
@@ -716,13 +822,21 @@ def update_doctor(doctor_id: str, data: Doctor):
 # DELETE DOCTOR
 # ---------------------------
 @app.delete("/lab/doctors/{doctor_id}")
-def delete_doctor(doctor_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_doctor(doctor_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM doctors WHERE doctor_id = ?", (doctor_id,))
+
+    # assignments and holidays cascade with the doctor
+    cursor.execute("SELECT DISTINCT test_id FROM test_doctor_assignments WHERE doctor_id=?", (doctor_id,))
+    affected_tests = [r[0] for r in cursor.fetchall()]
+    try:
+        cursor.execute("DELETE FROM doctors WHERE doctor_id = ?", (doctor_id,))
+    except sqlite3.IntegrityError:
+        # foreign_keys is ON: bookings still reference this doctor
+        raise HTTPException(status_code=400, detail="Doctor has existing bookings and cannot be deleted")
+    refresh_capacity(conn.cursor(), affected_tests)
+    bump_generation(conn.cursor(), "doctors", "assignments")
     conn.commit()
     deleted = cursor.rowcount
-    conn.close()
     if not deleted:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return {"status": "deleted"}
@@ -742,14 +856,13 @@ class DoctorHoliday(BaseModel):
 
 # --- 1. Create a new doctor holiday / half-day ---
 @app.post("/lab/doctor-holidays")
-def create_doctor_holiday(holiday: DoctorHoliday):
-    conn = sqlite3.connect(DB_PATH)
+def create_doctor_holiday(holiday: DoctorHoliday, conn: sqlite3.Connection = Depends(get_db)):
+    validate_date(holiday.date)
     cursor = conn.cursor()
 
     cursor.execute("SELECT doctor_name FROM doctors WHERE doctor_id=?", (holiday.doctor_id,))
     result = cursor.fetchone()
     if not result:
-        conn.close()
         raise HTTPException(status_code=404, detail="Doctor not found")
     doctor_name = result[0]
 
@@ -767,19 +880,17 @@ def create_doctor_holiday(holiday: DoctorHoliday):
         holiday.is_closed
     ))
 
+    refresh_capacity_for_doctor(conn.cursor(), holiday.doctor_id, [holiday.date])
     conn.commit()
-    conn.close()
     return {"success": True, "message": "Doctor holiday created successfully", "doctor_holiday_id": doctor_holiday_id}
 
 
 # --- 2. Read / fetch all doctor holidays ---
 @app.get("/lab/doctor-holidays")
-def get_all_doctor_holidays():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_doctor_holidays(conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM doctor_holidays ORDER BY date")
     rows = cursor.fetchall()
-    conn.close()
 
     return [
         {
@@ -796,17 +907,19 @@ def get_all_doctor_holidays():
 
 # --- 3. Update a doctor holiday / half-day ---
 @app.put("/lab/doctor-holidays/{doctor_holiday_id}")
-def update_doctor_holiday(doctor_holiday_id: str, holiday: DoctorHoliday):
-    conn = sqlite3.connect(DB_PATH)
+def update_doctor_holiday(doctor_holiday_id: str, holiday: DoctorHoliday, conn: sqlite3.Connection = Depends(get_db)):
+    validate_date(holiday.date)
     cursor = conn.cursor()
 
     cursor.execute("SELECT doctor_name FROM doctors WHERE doctor_id=?", (holiday.doctor_id,))
     result = cursor.fetchone()
     if not result:
-        conn.close()
         raise HTTPException(status_code=404, detail="Doctor not found")
     doctor_name = result[0]
 
+    cursor.execute("SELECT doctor_id, date FROM doctor_holidays WHERE doctor_holiday_id=?", (doctor_holiday_id,))
+    old = cursor.fetchone()
+
     cursor.execute("""
         UPDATE doctor_holidays
         SET doctor_id=?, doctor_name=?, date=?, opens_at=?, closes_at=?, is_closed=?
@@ -821,26 +934,29 @@ def update_doctor_holiday(doctor_holiday_id: str, holiday: DoctorHoliday):
         doctor_holiday_id
     ))
 
+    if old:
+        refresh_capacity_for_doctor(conn.cursor(), old[0], [old[1]])
+        refresh_capacity_for_doctor(conn.cursor(), holiday.doctor_id, [holiday.date])
     conn.commit()
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Doctor holiday not found")
 
-    conn.close()
     return {"success": True, "message": "Doctor holiday updated successfully"}
 
 
 # --- 4. Delete a doctor holiday / half-day ---
 @app.delete("/lab/doctor-holidays/{doctor_holiday_id}")
-def delete_doctor_holiday(doctor_holiday_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_doctor_holiday(doctor_holiday_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
+    cursor.execute("SELECT doctor_id, date FROM doctor_holidays WHERE doctor_holiday_id=?", (doctor_holiday_id,))
+    old = cursor.fetchone()
+
     cursor.execute("DELETE FROM doctor_holidays WHERE doctor_holiday_id=?", (doctor_holiday_id,))
+    if old:
+        refresh_capacity_for_doctor(conn.cursor(), old[0], [old[1]])
     conn.commit()
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Doctor holiday not found")
-    conn.close()
     return {"success": True, "message": "Doctor holiday deleted successfully"}
 
 
@@ -862,15 +978,14 @@ class TestHoliday(BaseModel):
 
 # --- 1. Create a new test holiday / half-day ---
 @app.post("/lab/test-holidays")
-def create_test_holiday(holiday: TestHoliday):
-    conn = sqlite3.connect(DB_PATH)
+def create_test_holiday(holiday: TestHoliday, conn: sqlite3.Connection = Depends(get_db)):
+    validate_date(holiday.date)
     cursor = conn.cursor()
 
     # Auto-fill test_name from tests table
     cursor.execute("SELECT test_name FROM tests WHERE test_id=?", (holiday.test_id,))
     result = cursor.fetchone()
     if not result:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
     test_name = lc(result[0])  # store lowercase
 
@@ -888,15 +1003,14 @@ def create_test_holiday(holiday: TestHoliday):
         holiday.is_closed
     ))
 
+    refresh_capacity(conn.cursor(), [holiday.test_id], [holiday.date])
     conn.commit()
-    conn.close()
     return {"success": True, "message": "Test holiday created successfully", "test_holiday_id": test_holiday_id}
 
 
 # --- 2. Read / fetch all test holidays ---
 @app.get("/lab/test-holidays")
-def get_all_test_holidays():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_test_holidays(conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM test_holidays ORDER BY date")
@@ -914,24 +1028,25 @@ def get_all_test_holidays():
         } for r in rows
     ]
 
-    conn.close()
     return holidays
 
 
 # --- 3. Update a test holiday / half-day ---
 @app.put("/lab/test-holidays/{test_holiday_id}")
-def update_test_holiday(test_holiday_id: str, holiday: TestHoliday):
-    conn = sqlite3.connect(DB_PATH)
+def update_test_holiday(test_holiday_id: str, holiday: TestHoliday, conn: sqlite3.Connection = Depends(get_db)):
+    validate_date(holiday.date)
     cursor = conn.cursor()
 
     # Auto-fill test_name from tests table
     cursor.execute("SELECT test_name FROM tests WHERE test_id=?", (holiday.test_id,))
     result = cursor.fetchone()
     if not result:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
     test_name = lc(result[0])  # store lowercase
 
+    cursor.execute("SELECT test_id, date FROM test_holidays WHERE test_holiday_id=?", (test_holiday_id,))
+    old = cursor.fetchone()
+
     cursor.execute("""
         UPDATE test_holidays
         SET test_id=?, test_name=?, date=?, opens_at=?, closes_at=?, is_closed=?
@@ -946,29 +1061,32 @@ def update_test_holiday(test_holiday_id: str, holiday: TestHoliday):
         test_holiday_id
     ))
 
+    if old:
+        refresh_capacity(conn.cursor(), [old[0]], [old[1]])
+        refresh_capacity(conn.cursor(), [holiday.test_id], [holiday.date])
     conn.commit()
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test holiday not found")
 
-    conn.close()
     return {"success": True, "message": "Test holiday updated successfully"}
 
 
 # --- 4. Delete a test holiday / half-day ---
 @app.delete("/lab/test-holidays/{test_holiday_id}")
-def delete_test_holiday(test_holiday_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_test_holiday(test_holiday_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
 
+    cursor.execute("SELECT test_id, date FROM test_holidays WHERE test_holiday_id=?", (test_holiday_id,))
+    old = cursor.fetchone()
+
     cursor.execute("DELETE FROM test_holidays WHERE test_holiday_id=?", (test_holiday_id,))
+    if old:
+        refresh_capacity(conn.cursor(), [old[0]], [old[1]])
     conn.commit()
 
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Test holiday not found")
 
-    conn.close()
     return {"success": True, "message": "Test holiday deleted successfully"}
 
 
@@ -985,37 +1103,39 @@ class TestDoctorAssignment(BaseModel):
 
 # --- 1. Create a new test-doctor assignment ---
 @app.post("/lab/test-doctor-assignments")
-def create_test_doctor_assignment(assignment: TestDoctorAssignment):
+def create_test_doctor_assignment(assignment: TestDoctorAssignment, conn: sqlite3.Connection = Depends(get_db)):
     try:
-        with sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False) as conn:
-            cursor = conn.cursor()
-
-            # Fetch test_name
-            cursor.execute("SELECT test_name FROM tests WHERE test_id=?", (assignment.test_id,))
-            t = cursor.fetchone()
-            if not t:
-                raise HTTPException(404, "Test not found")
-            test_name = lc(t[0])  # store lowercase
-
-            # Fetch doctor_name
-            cursor.execute("SELECT doctor_name FROM doctors WHERE doctor_id=?", (assignment.doctor_id,))
-            d = cursor.fetchone()
-            if not d:
-                raise HTTPException(404, "Doctor not found")
-            doctor_name = lc(d[0])  # store lowercase
-
-            # Generate assignment_id
-            assignment_id = str(uuid.uuid4())
-
-            # Insert assignment (will fail if doctor_id + test_id already exists)
-            cursor.execute("""
-                INSERT INTO test_doctor_assignments
-                (assignment_id, test_id, test_name, doctor_id, doctor_name)
-                VALUES (?, ?, ?, ?, ?)
-            """, (assignment_id, assignment.test_id, test_name, assignment.doctor_id, doctor_name))
+        cursor = conn.cursor()
+
+        # Fetch test_name
+        cursor.execute("SELECT test_name FROM tests WHERE test_id=?", (assignment.test_id,))
+        t = cursor.fetchone()
+        if not t:
+            raise HTTPException(404, "Test not found")
+        test_name = lc(t[0])  # store lowercase
+
+        # Fetch doctor_name
+        cursor.execute("SELECT doctor_name FROM doctors WHERE doctor_id=?", (assignment.doctor_id,))
+        d = cursor.fetchone()
+        if not d:
+            raise HTTPException(404, "Doctor not found")
+        doctor_name = lc(d[0])  # store lowercase
+
+        # Generate assignment_id
+        assignment_id = str(uuid.uuid4())
+
+        # Insert assignment (will fail if doctor_id + test_id already exists)
+        cursor.execute("""
+            INSERT INTO test_doctor_assignments
+            (assignment_id, test_id, test_name, doctor_id, doctor_name)
+            VALUES (?, ?, ?, ?, ?)
+        """, (assignment_id, assignment.test_id, test_name, assignment.doctor_id, doctor_name))
 
-            conn.commit()
-            return {"success": True, "assignment_id": assignment_id}
+        # the test's doctor (and so its doctor holidays) may have changed
+        refresh_capacity(conn.cursor(), [assignment.test_id])
+        bump_generation(conn.cursor(), "assignments")
+        conn.commit()
+        return {"success": True, "assignment_id": assignment_id}
 
     except sqlite3.IntegrityError:
         # Raised if UNIQUE constraint violated
@@ -1032,8 +1152,11 @@ def create_test_doctor_assignment(assignment: TestDoctorAssignment):
 
 # --- 2. Read all assignments ---
 @app.get("/lab/test-doctor-assignments")
-def get_all_test_doctor_assignments():
-    conn = sqlite3.connect(DB_PATH)
+def get_all_test_doctor_assignments(request: Request, conn: sqlite3.Connection = Depends(get_db)):
+    return cached_json(request, conn, "assignments", load_test_doctor_assignments)
+
+
+def load_test_doctor_assignments(conn: sqlite3.Connection):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM test_doctor_assignments")
     rows = cursor.fetchall()
@@ -1046,62 +1169,40 @@ def get_all_test_doctor_assignments():
             "doctor_name": r[4]
         } for r in rows
     ]
-    conn.close()
     return assignments
 
 
 # --- 3. Delete an assignment ---
 @app.delete("/lab/test-doctor-assignments/{assignment_id}")
-def delete_test_doctor_assignment(assignment_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_test_doctor_assignment(assignment_id: str, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
+    cursor.execute("SELECT test_id FROM test_doctor_assignments WHERE assignment_id=?", (assignment_id,))
+    old = cursor.fetchone()
+
     cursor.execute("DELETE FROM test_doctor_assignments WHERE assignment_id=?", (assignment_id,))
+    if old:
+        refresh_capacity(conn.cursor(), [old[0]])
+    bump_generation(conn.cursor(), "assignments")
     conn.commit()
     if cursor.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="Assignment not found")
-    conn.close()
     return {"success": True, "message": "Assignment deleted"}
 
 
 
-# ================================
-# BOOKINGS  END POINT
-# ================================
-
-
-def calculate_adjusted_max(window_start, window_end, holiday_start, holiday_end, max_tests):
-    """
-    Reduce max_tests proportionally when availability overlaps partially
-    (lab/test/doctor available only for part of the window).
-    """
-
-    w_start = time_str_to_minutes(window_start)
-    w_end = time_str_to_minutes(window_end)
-    h_start = time_str_to_minutes(holiday_start)
-    h_end = time_str_to_minutes(holiday_end)
-
-    window_minutes = w_end - w_start
-    if window_minutes <= 0:
-        return 0
-
-    # Available time inside the window
-    available_start = max(w_start, h_start)
-    available_end = min(w_end, h_end)
-
-    if available_start >= available_end:
-        return 0  # no availability at all
-
-    available_minutes = available_end - available_start
+# --------------------------
+# REFERENCE CACHE STATS
+# --------------------------
+@app.get("/lab/cache-stats")
+def get_cache_stats():
+    """Hit / miss / 304 counters of the reference-data cache (this process)."""
+    return get_ref_cache().stats()
 
-    # Proportional reduction
-    fraction = available_minutes / window_minutes
-    adjusted = max_tests * fraction
 
-    # Round down safely (never exceed max_tests)
-    adjusted_max = max(0, int(adjusted))
 
-    return adjusted_max
+# ================================
+# BOOKINGS  END POINT
+# ================================
 
 
 class Booking(BaseModel):
@@ -1129,13 +1230,54 @@ class Booking(BaseModel):
     window_end: Optional[time] = None
 
 
+# -----------------------------
+# ATOMIC SLOT ADMISSION
+# -----------------------------
+# booking_counters keeps one row per (window_id, booking_date) with the number
+# of bookings in it. Claiming a slot is a single conditional UPDATE run inside
+# BEGIN IMMEDIATE, so two concurrent requests can never both take the last slot.
+
+def _claim_slot(cursor, window_id: str, booking_date: str, capacity: int) -> bool:
+    """Take one slot if fewer than capacity are booked. Call inside run_write_transaction."""
+    # Seed the counter from existing bookings the first time this window/date is used
+    cursor.execute("""
+        INSERT INTO booking_counters (window_id, booking_date, booked)
+        SELECT ?, ?, (
+            SELECT COUNT(*) FROM bookings WHERE window_id=? AND booking_date=?
+        )
+        WHERE NOT EXISTS (
+            SELECT 1 FROM booking_counters WHERE window_id=? AND booking_date=?
+        )
+    """, (window_id, booking_date, window_id, booking_date, window_id, booking_date))
+
+    cursor.execute("""
+        UPDATE booking_counters
+        SET booked = booked + 1
+        WHERE window_id=? AND booking_date=? AND booked < ?
+    """, (window_id, booking_date, capacity))
+    return cursor.rowcount == 1
+
+
+def _release_slot(cursor, window_id: str, booking_date: str):
+    """Give back one slot (booking deleted or moved away)."""
+    cursor.execute("""
+        UPDATE booking_counters
+        SET booked = booked - 1
+        WHERE window_id=? AND booking_date=? AND booked > 0
+    """, (window_id, booking_date))
+
+
 @app.post("/lab/bookings")
-def create_booking(booking: Booking):
-    return create_booking_internal(booking)
+async def create_booking(booking: Booking):
+    return await run_db(create_booking_internal, booking)
+
 
+def create_booking_internal(booking: Booking, conn: sqlite3.Connection = None) -> dict:
+    if conn is None:
+        # called outside a request (e.g. MCP tools): borrow a pooled connection
+        with get_pool().connection() as conn:
+            return create_booking_internal(booking, conn)
 
-def create_booking_internal(booking: Booking) -> dict:
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     # -----------------------------
@@ -1147,7 +1289,6 @@ def create_booking_internal(booking: Booking) -> dict:
     )
     test = cursor.fetchone()
     if not test:
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Sorry, the selected test is invalid or not found in our system."
@@ -1169,7 +1310,6 @@ def create_booking_internal(booking: Booking) -> dict:
 
     schedule_row = cursor.fetchone()
     if not schedule_row:
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Test is not scheduled for the selected date."
@@ -1177,7 +1317,6 @@ def create_booking_internal(booking: Booking) -> dict:
 
     schedule_id, is_closed = schedule_row
     if is_closed:
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Test is closed on the selected date."
@@ -1194,7 +1333,6 @@ def create_booking_internal(booking: Booking) -> dict:
 
     window_row = cursor.fetchone()
     if not window_row:
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Invalid or unavailable time window for the selected date."
@@ -1224,7 +1362,6 @@ def create_booking_internal(booking: Booking) -> dict:
     if row:
         is_closed, opens_at, closes_at = row
         if is_closed:
-            conn.close()
             raise HTTPException(
                 status_code=400,
                 detail="Lab is closed on the selected date."
@@ -1250,7 +1387,6 @@ def create_booking_internal(booking: Booking) -> dict:
     if row:
         is_closed, opens_at, closes_at = row
         if is_closed:
-            conn.close()
             raise HTTPException(
                 status_code=400,
                 detail="Test is unavailable on the selected date."
@@ -1290,7 +1426,6 @@ def create_booking_internal(booking: Booking) -> dict:
             """, (booking.doctor_id,))
             row = cursor.fetchone()
             if not row:
-                conn.close()
                 raise HTTPException(status_code=400, detail="Doctor not found")
             doctor_name = row[0]
 
@@ -1304,7 +1439,6 @@ def create_booking_internal(booking: Booking) -> dict:
             if row:
                 is_closed, opens_at, closes_at = row
                 if is_closed:
-                    conn.close()
                     raise HTTPException(
                         status_code=400,
                         detail="Doctor unavailable on the selected date."
@@ -1319,51 +1453,43 @@ def create_booking_internal(booking: Booking) -> dict:
                 )
 
     # -----------------------------
-    # Existing bookings
-    # -----------------------------
-    cursor.execute("""
-        SELECT COUNT(*)
-        FROM bookings
-        WHERE window_id=? AND booking_date=?
-    """, (window_id, booking_date_str))
-    booked = cursor.fetchone()[0]
-
-    if adjusted_max - booked <= 0:
-        conn.close()
-        raise HTTPException(
-            status_code=400,
-            detail="Sorry, all slots are fully booked for this time window."
-        )
-
-    # -----------------------------
-    # Insert booking
+    # Claim slot + insert booking (atomic)
     # -----------------------------
     booking_id = str(uuid.uuid4())
 
-    cursor.execute("""
-        INSERT INTO bookings (
-            booking_id, window_id, test_id, doctor_id, doctor_name,
-            patient_name, patient_mobile,
-            booking_date, booking_time,
-            window_start, window_end
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        booking_id,
-        window_id,
-        booking.test_id,
-        booking.doctor_id,
-        doctor_name,
-        booking.patient_name,
-        booking.patient_mobile,
-        booking_date_str,
-        booking_time, 
-        window_start,
-        window_end
-    ))
+    def admit(cursor):
+        if not _claim_slot(cursor, window_id, booking_date_str, adjusted_max):
+            raise HTTPException(
+                status_code=400,
+                detail="Sorry, all slots are fully booked for this time window."
+            )
 
-    conn.commit()
-    conn.close()
+        cursor.execute("""
+            INSERT INTO bookings (
+                booking_id, window_id, test_id, doctor_id, doctor_name,
+                patient_name, patient_mobile,
+                booking_date, booking_time,
+                window_start, window_end
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            booking_id,
+            window_id,
+            booking.test_id,
+            booking.doctor_id,
+            doctor_name,
+            booking.patient_name,
+            booking.patient_mobile,
+            booking_date_str,
+            booking_time, 
+            window_start,
+            window_end
+        ))
+
+    try:
+        run_write_transaction(conn, admit)
+    except DatabaseBusy:
+        raise HTTPException(status_code=503, detail="Booking service is busy, please try again.")
 
     return {
         "success": True,
@@ -1380,8 +1506,15 @@ def create_booking_internal(booking: Booking) -> dict:
 # from datetime import datetime
 
 @app.get("/lab/available-slots/{test_id}/{booking_date}")
-def get_available_slots(test_id: str, booking_date: str):
-    conn = sqlite3.connect(DB_PATH)
+async def get_available_slots(test_id: str, booking_date: str):
+    return await run_db(get_available_slots_internal, test_id, booking_date)
+
+
+def get_available_slots_internal(test_id: str, booking_date: str, conn: sqlite3.Connection = None):
+    if conn is None:
+        with get_pool().connection() as conn:
+            return get_available_slots_internal(test_id, booking_date, conn)
+
     cursor = conn.cursor()
 
     # -----------------------------
@@ -1390,162 +1523,170 @@ def get_available_slots(test_id: str, booking_date: str):
     try:
         booking_date_obj = datetime.strptime(booking_date, "%Y-%m-%d").date()
     except ValueError:
-        conn.close()
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
     day_number = booking_date_obj.weekday()  # Monday=0 ... Sunday=6
 
     # -----------------------------
-    # Get test schedule for the day
+    # Windows + availability
     # -----------------------------
-    cursor.execute("""
-        SELECT schedule_id, is_closed
-        FROM test_schedule
-        WHERE test_id=? AND day_of_week=?
-    """, (test_id, day_number))
-    schedule = cursor.fetchone()
+    # Inside the capacity horizon: one join on the window_capacity projection.
+    # Past dates and dates beyond it: computed live.
+    horizon_start, horizon_end = horizon_for_reads(conn)
+    if horizon_start <= booking_date_obj <= horizon_end:
+        return projected_available_slots(cursor, test_id, booking_date)
 
-    if not schedule:
-        conn.close()
-        return []  # no schedule for this day
+    slots = compute_available_slots(cursor, test_id, booking_date, day_number)
 
-    schedule_id, is_closed = schedule
-
-    if is_closed:
-        conn.close()
-        return []
+    return slots
 
-    # -----------------------------
-    # Fetch ONLY windows for this schedule
-    # -----------------------------
-    cursor.execute("""
-        SELECT window_id, window_start, window_end, max_tests
-        FROM test_schedule_windows
-        WHERE test_id=? AND schedule_id=?
-        ORDER BY window_start
-    """, (test_id, schedule_id))
-    windows = cursor.fetchall()
 
-    if not windows:
-        conn.close()
-        return []
+# -----------------------------
+# AVAILABLE SLOTS FOR A DATE RANGE
+# -----------------------------
+MAX_RANGE_DAYS = 366
 
-    # -----------------------------
-    # Pre-fetch holidays (once)
-    # -----------------------------
-    cursor.execute("""
-        SELECT is_closed, opens_at, closes_at
-        FROM lab_holidays
-        WHERE date=?
-    """, (booking_date,))
-    lab_holiday = cursor.fetchone()
+@app.get("/lab/available-slots-range")
+def get_available_slots_range(
+    start_date: date,
+    end_date: date,
+    test_ids: Optional[List[str]] = Query(None)
+):
+    """
+    Availability for several tests over a date range, streamed as NDJSON:
+    one line per (test, date) -> {"test_id", "date", "slots": [...]}, where
+    "slots" matches GET /lab/available-slots/{test_id}/{booking_date}.
+    Omit test_ids to get every test.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days")
+
+    def stream():
+        # the connection is held for the lifetime of the stream, not the request
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            ids = test_ids
+            if not ids:
+                cursor.execute("SELECT test_id FROM tests ORDER BY test_name")
+                ids = [r[0] for r in cursor.fetchall()]
 
-    cursor.execute("""
-        SELECT is_closed, opens_at, closes_at
-        FROM test_holidays
-        WHERE test_id=? AND date=?
-    """, (test_id, booking_date))
-    test_holiday = cursor.fetchone()
+            for item in iter_availability_range(cursor, ids, start_date, end_date):
+                yield json.dumps(item) + "\n"
 
-    cursor.execute("SELECT requires_doctor FROM tests WHERE test_id=?", (test_id,))
-    requires_doctor = cursor.fetchone()[0]
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
-    doctor_holiday = None
-    if requires_doctor:
-        cursor.execute("""
-            SELECT doctor_id FROM test_doctor_assignments WHERE test_id=?
-        """, (test_id,))
-        row = cursor.fetchone()
-        if row:
-            doctor_id = row[0]
-            cursor.execute("""
-                SELECT is_closed, opens_at, closes_at
-                FROM doctor_holidays
-                WHERE doctor_id=? AND date=?
-            """, (doctor_id, booking_date))
-            doctor_holiday = cursor.fetchone()
 
-    # -----------------------------
-    # Calculate availability per window
-    # -----------------------------
-    available_slots_list = []
+# -----------------------------
+# GET BOOKINGS (filtered, keyset-paginated)
+# -----------------------------
+# Pages are ordered by (booking_date, booking_time, booking_id). The cursor is
+# the last row of the previous page, so every page is an index range read no
+# matter how deep into the history it is.
+BOOKINGS_PAGE_SIZE = 50
+BOOKINGS_MAX_PAGE_SIZE = 500
 
-    for window_id, window_start, window_end, max_tests in windows:
-        adjusted_max = max_tests
 
-        # Lab holiday
-        if lab_holiday:
-            is_closed, opens_at, closes_at = lab_holiday
-            if is_closed:
-                continue
-            adjusted_max = min(
-                adjusted_max,
-                calculate_adjusted_max(
-                    window_start, window_end,
-                    opens_at, closes_at,
-                    max_tests
-                )
-            )
+def encode_booking_cursor(booking_date: str, booking_time: str, booking_id: str) -> str:
+    raw = json.dumps([booking_date, booking_time, booking_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-        # Test holiday
-        if test_holiday:
-            is_closed, opens_at, closes_at = test_holiday
-            if is_closed:
-                continue
-            adjusted_max = min(
-                adjusted_max,
-                calculate_adjusted_max(
-                    window_start, window_end,
-                    opens_at, closes_at,
-                    max_tests
-                )
-            )
 
-        # Doctor holiday
-        if doctor_holiday:
-            is_closed, opens_at, closes_at = doctor_holiday
-            if is_closed:
-                continue
-            adjusted_max = min(
-                adjusted_max,
-                calculate_adjusted_max(
-                    window_start, window_end,
-                    opens_at, closes_at,
-                    max_tests
-                )
-            )
+def decode_booking_cursor(value: str):
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        booking_date, booking_time, booking_id = json.loads(raw)
+        return str(booking_date), str(booking_time), str(booking_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-        # Existing bookings
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM bookings
-            WHERE window_id=? AND booking_date=?
-        """, (window_id, booking_date))
-        booked = cursor.fetchone()[0]
-
-        available = max(0, adjusted_max - booked)
-
-        available_slots_list.append({
-            "window_id": window_id,
-            "window_start": window_start,
-            "window_end": window_end,
-            "available_slots": available
-        })
 
-    conn.close()
-    return available_slots_list
+@app.get("/lab/bookings")
+async def get_bookings(
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    test_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    patient: Optional[str] = Query(None, description="Patient name prefix (case-insensitive)"),
+    limit: int = Query(BOOKINGS_PAGE_SIZE, ge=1, le=BOOKINGS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """
+    One page of bookings. Headers: X-Total-Count (matching the filters) and
+    X-Next-Cursor (pass back as ?cursor= for the next page; absent on the last).
+    """
+    after = decode_booking_cursor(cursor) if cursor else None
+    bookings, total, next_cursor = await run_db(
+        get_bookings_internal,
+        start_date=start_date,
+        end_date=end_date,
+        test_id=test_id,
+        doctor_id=doctor_id,
+        patient=patient,
+        limit=limit,
+        after=after
+    )
 
+    response.headers["X-Total-Count"] = str(total)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return bookings
+
+
+def get_bookings_internal(
+    conn: sqlite3.Connection,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    test_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    patient: Optional[str] = None,
+    limit: int = BOOKINGS_PAGE_SIZE,
+    after: Optional[tuple] = None
+):
+    """Returns (bookings, total_count, next_cursor)."""
+    cursor = conn.cursor()
 
-# -----------------------------
-# GET ALL BOOKINGS
-# -----------------------------
+    # -----------------------------
+    # Filters (shared by page and count)
+    # -----------------------------
+    where = []
+    params = {}
+    if start_date:
+        where.append("b.booking_date >= :start_date")
+        params["start_date"] = start_date.isoformat()
+    if end_date:
+        where.append("b.booking_date <= :end_date")
+        params["end_date"] = end_date.isoformat()
+    if test_id:
+        where.append("b.test_id = :test_id")
+        params["test_id"] = test_id
+    if doctor_id:
+        where.append("b.doctor_id = :doctor_id")
+        params["doctor_id"] = doctor_id
+    if patient and patient.strip():
+        # prefix range on the lower(patient_name) index instead of LIKE
+        prefix = patient.strip().lower()
+        where.append("lower(b.patient_name) >= :patient_lo AND lower(b.patient_name) < :patient_hi")
+        params["patient_lo"] = prefix
+        params["patient_hi"] = prefix + "\U0010ffff"
+
+    filters = " AND ".join(where) or "1"
+
+    cursor.execute(f"SELECT COUNT(*) FROM bookings b WHERE {filters}", params)
+    total = cursor.fetchone()[0]
 
-@app.get("/lab/bookings")
-def get_bookings():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # -----------------------------
+    # Page after the cursor
+    # -----------------------------
+    page_filters = filters
+    if after:
+        page_filters += " AND (b.booking_date, b.booking_time, b.booking_id) > (:after_date, :after_time, :after_id)"
+        params["after_date"], params["after_time"], params["after_id"] = after
+    params["limit"] = limit + 1   # one extra row tells us whether there is a next page
 
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT
             b.booking_id,
             b.window_id,
@@ -1560,13 +1701,19 @@ def get_bookings():
             b.doctor_name
         FROM bookings b
         LEFT JOIN tests t ON t.test_id = b.test_id
-        ORDER BY b.booking_date, b.booking_time
-    """)
+        WHERE {page_filters}
+        ORDER BY b.booking_date, b.booking_time, b.booking_id
+        LIMIT :limit
+    """, params)
 
     rows = cursor.fetchall()
-    conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_booking_cursor(last[6], last[7], last[0])
 
-    return [
+    bookings = [
         {
             "booking_id": r[0],
             "window_id": r[1],
@@ -1582,6 +1729,7 @@ def get_bookings():
         }
         for r in rows
     ]
+    return bookings, total, next_cursor
 
 
 
@@ -1589,143 +1737,148 @@ def get_bookings():
 # UPDATE BOOKING
 # -----------------------------
 @app.put("/lab/bookings/{booking_id}")
-def update_booking(booking_id: str, booking: Booking):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # -----------------------------
-    # Check if booking exists
-    # -----------------------------
-    cursor.execute("SELECT window_id, booking_date FROM bookings WHERE booking_id=?", (booking_id,))
-    existing = cursor.fetchone()
-    if not existing:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Booking not found")
-
-    current_window_id, current_booking_date = existing
-
-    # -----------------------------
-    # Validate test
-    # -----------------------------
-    cursor.execute("SELECT test_name, requires_doctor FROM tests WHERE test_id=?", (booking.test_id,))
-    test = cursor.fetchone()
-    if not test:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Invalid test")
-    test_name, requires_doctor = test
-
-    # -----------------------------
-    # Validate window
-    # -----------------------------
-    cursor.execute("""
-        SELECT window_id, window_start, window_end, max_tests
-        FROM test_schedule_windows
-        WHERE window_id=? AND test_id=?
-    """, (booking.window_id, booking.test_id))
-    window_row = cursor.fetchone()
-    if not window_row:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Invalid window")
-    window_id, window_start, window_end, max_tests_schedule = window_row
-
-    booking_date_str = booking.booking_date.isoformat()
-    adjusted_max = max_tests_schedule
-
-    # -----------------------------
-    # Lab holiday / half-day
-    # -----------------------------
-    cursor.execute("SELECT is_closed, opens_at, closes_at FROM lab_holidays WHERE date=?", (booking_date_str,))
-    lab_holiday = cursor.fetchone()
-    if lab_holiday:
-        is_closed, opens_at, closes_at = lab_holiday
-        if is_closed:
-            conn.close()
-            raise HTTPException(status_code=400, detail="Lab is closed on this date")
-        adjusted_max = min(adjusted_max, calculate_adjusted_max(window_start, window_end, opens_at, closes_at, max_tests_schedule))
-
-    # -----------------------------
-    # Test holiday / half-day
-    # -----------------------------
-    cursor.execute("SELECT is_closed, opens_at, closes_at FROM test_holidays WHERE test_id=? AND date=?", (booking.test_id, booking_date_str))
-    test_holiday = cursor.fetchone()
-    if test_holiday:
-        is_closed, opens_at, closes_at = test_holiday
-        if is_closed:
-            conn.close()
-            raise HTTPException(status_code=400, detail="Test is unavailable on this date")
-        adjusted_max = min(adjusted_max, calculate_adjusted_max(window_start, window_end, opens_at, closes_at, max_tests_schedule))
-
-    # -----------------------------
-    # Doctor assignment & holiday
-    # -----------------------------
-    doctor_name = None
-    doctor_id = booking.doctor_id  # Use provided doctor_id if any
-
-    if requires_doctor:
-        # If doctor_id not provided, fetch from test_doctor_assignments
-        if not doctor_id:
-            cursor.execute("""
-                SELECT doctor_id FROM test_doctor_assignments
-                WHERE test_id=?
-            """, (booking.test_id,))
-            row = cursor.fetchone()
-            doctor_id = row[0] if row else None
-
-        if doctor_id:
-            # Fetch doctor_name
-            cursor.execute("SELECT doctor_name FROM doctors WHERE doctor_id=?", (doctor_id,))
-            row = cursor.fetchone()
-            doctor_name = row[0] if row else None
-
-            # Doctor holiday check
-            cursor.execute("SELECT is_closed, opens_at, closes_at FROM doctor_holidays WHERE doctor_id=? AND date=?", (doctor_id, booking_date_str))
-            doc_holiday = cursor.fetchone()
-            if doc_holiday:
-                is_closed, opens_at, closes_at = doc_holiday
-                if is_closed:
-                    conn.close()
-                    raise HTTPException(status_code=400, detail="Doctor is unavailable on this date")
-                adjusted_max = min(adjusted_max, calculate_adjusted_max(window_start, window_end, opens_at, closes_at, max_tests_schedule))
-
-    # -----------------------------
-    # Existing bookings
-    # -----------------------------
-    cursor.execute("SELECT COUNT(*) FROM bookings WHERE window_id=? AND booking_date=?", (booking.window_id, booking_date_str))
-    booked = cursor.fetchone()[0]
-
-    # Include current booking if window/date is unchanged
-    if current_window_id == booking.window_id and current_booking_date == booking_date_str:
-        booked -= 1
-
-    if adjusted_max - booked <= 0:
-        conn.close()
-        raise HTTPException(status_code=400, detail="No available slots for the selected window/date")
+async def update_booking(booking_id: str, booking: Booking):
+    return await run_db(update_booking_internal, booking_id, booking)
+
+
+def update_booking_internal(booking_id: str, booking: Booking, conn: sqlite3.Connection):
+    # Everything runs inside BEGIN IMMEDIATE: the booking's current window/date
+    # (the slot given back) and the holiday-adjusted capacity of the new one
+    # are read under the write lock, so a concurrent move or delete of the
+    # same booking cannot make this release a slot twice.
+    def apply(cursor):
+        # -----------------------------
+        # Check if booking exists
+        # -----------------------------
+        cursor.execute("SELECT window_id, booking_date FROM bookings WHERE booking_id=?", (booking_id,))
+        existing = cursor.fetchone()
+        if not existing:
+            raise HTTPException(status_code=404, detail="Booking not found")
+
+        current_window_id, current_booking_date = existing
+
+        # -----------------------------
+        # Validate test
+        # -----------------------------
+        cursor.execute("SELECT test_name, requires_doctor FROM tests WHERE test_id=?", (booking.test_id,))
+        test = cursor.fetchone()
+        if not test:
+            raise HTTPException(status_code=400, detail="Invalid test")
+        test_name, requires_doctor = test
+
+        # -----------------------------
+        # Validate window
+        # -----------------------------
+        cursor.execute("""
+            SELECT window_id, window_start, window_end, max_tests
+            FROM test_schedule_windows
+            WHERE window_id=? AND test_id=?
+        """, (booking.window_id, booking.test_id))
+        window_row = cursor.fetchone()
+        if not window_row:
+            raise HTTPException(status_code=400, detail="Invalid window")
+        window_id, window_start, window_end, max_tests_schedule = window_row
+
+        booking_date_str = booking.booking_date.isoformat()
+        adjusted_max = max_tests_schedule
+
+        # -----------------------------
+        # Lab holiday / half-day
+        # -----------------------------
+        cursor.execute("SELECT is_closed, opens_at, closes_at FROM lab_holidays WHERE date=?", (booking_date_str,))
+        lab_holiday = cursor.fetchone()
+        if lab_holiday:
+            is_closed, opens_at, closes_at = lab_holiday
+            if is_closed:
+                raise HTTPException(status_code=400, detail="Lab is closed on this date")
+            adjusted_max = min(adjusted_max, calculate_adjusted_max(window_start, window_end, opens_at, closes_at, max_tests_schedule))
+
+        # -----------------------------
+        # Test holiday / half-day
+        # -----------------------------
+        cursor.execute("SELECT is_closed, opens_at, closes_at FROM test_holidays WHERE test_id=? AND date=?", (booking.test_id, booking_date_str))
+        test_holiday = cursor.fetchone()
+        if test_holiday:
+            is_closed, opens_at, closes_at = test_holiday
+            if is_closed:
+                raise HTTPException(status_code=400, detail="Test is unavailable on this date")
+            adjusted_max = min(adjusted_max, calculate_adjusted_max(window_start, window_end, opens_at, closes_at, max_tests_schedule))
+
+        # -----------------------------
+        # Doctor assignment & holiday
+        # -----------------------------
+        doctor_name = None
+        doctor_id = booking.doctor_id  # Use provided doctor_id if any
+
+        if requires_doctor:
+            # If doctor_id not provided, fetch from test_doctor_assignments
+            if not doctor_id:
+                cursor.execute("""
+                    SELECT doctor_id FROM test_doctor_assignments
+                    WHERE test_id=?
+                """, (booking.test_id,))
+                row = cursor.fetchone()
+                doctor_id = row[0] if row else None
+
+            if doctor_id:
+                # Fetch doctor_name
+                cursor.execute("SELECT doctor_name FROM doctors WHERE doctor_id=?", (doctor_id,))
+                row = cursor.fetchone()
+                doctor_name = row[0] if row else None
+
+                # Doctor holiday check
+                cursor.execute("SELECT is_closed, opens_at, closes_at FROM doctor_holidays WHERE doctor_id=? AND date=?", (doctor_id, booking_date_str))
+                doc_holiday = cursor.fetchone()
+                if doc_holiday:
+                    is_closed, opens_at, closes_at = doc_holiday
+                    if is_closed:
+                        raise HTTPException(status_code=400, detail="Doctor is unavailable on this date")
+                    adjusted_max = min(adjusted_max, calculate_adjusted_max(window_start, window_end, opens_at, closes_at, max_tests_schedule))
+
+        # -----------------------------
+        # Capacity check + update booking
+        # -----------------------------
+        moved = not (current_window_id == booking.window_id and current_booking_date == booking_date_str)
+        if moved:
+            # Claim a slot in the new window/date, give back the old one
+            if not _claim_slot(cursor, booking.window_id, booking_date_str, adjusted_max):
+                raise HTTPException(status_code=400, detail="No available slots for the selected window/date")
+            _release_slot(cursor, current_window_id, current_booking_date)
+        else:
+            # Same window/date: only fail if capacity shrank below the other bookings
+            cursor.execute("SELECT COUNT(*) FROM bookings WHERE window_id=? AND booking_date=?", (booking.window_id, booking_date_str))
+            booked = cursor.fetchone()[0] - 1
+            if adjusted_max - booked <= 0:
+                raise HTTPException(status_code=400, detail="No available slots for the selected window/date")
 
-    # -----------------------------
-    # Update booking
-    # -----------------------------
-    cursor.execute("""
-        UPDATE bookings
-        SET test_id=?, window_id=?, doctor_id=?, doctor_name=?,
-            patient_name=?, patient_mobile=?, booking_date=?, booking_time=?,
-            window_start=?, window_end=?
-        WHERE booking_id=?
-    """, (
-        booking.test_id,
-        booking.window_id,
-        doctor_id,
-        doctor_name,
-        booking.patient_name,
-        booking.patient_mobile,
-        booking_date_str,
-        booking.booking_time.strftime("%H:%M"),
-        window_start,
-        window_end,
-        booking_id
-    ))
+        cursor.execute("""
+            UPDATE bookings
+            SET test_id=?, window_id=?, doctor_id=?, doctor_name=?,
+                patient_name=?, patient_mobile=?, booking_date=?, booking_time=?,
+                window_start=?, window_end=?
+            WHERE booking_id=?
+        """, (
+            booking.test_id,
+            booking.window_id,
+            doctor_id,
+            doctor_name,
+            booking.patient_name,
+            booking.patient_mobile,
+            booking_date_str,
+            booking.booking_time.strftime("%H:%M"),
+            window_start,
+            window_end,
+            booking_id
+        ))
+        if cursor.rowcount == 0:
+            # deleted since it was read: roll back the claim and the release
+            raise HTTPException(status_code=404, detail="Booking not found")
+        return test_name, doctor_name
 
-    conn.commit()
-    conn.close()
+    try:
+        test_name, doctor_name = run_write_transaction(conn, apply)
+    except DatabaseBusy:
+        raise HTTPException(status_code=503, detail="Booking service is busy, please try again.")
 
     return {
         "message": "Booking updated successfully",
@@ -1740,18 +1893,24 @@ def update_booking(booking_id: str, booking: Booking):
 # DELETE BOOKING
 # -----------------------------
 @app.delete("/lab/bookings/{booking_id}")
-def delete_booking(booking_id: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+async def delete_booking(booking_id: str):
+    return await run_db(delete_booking_internal, booking_id)
 
-    cursor.execute("SELECT booking_id FROM bookings WHERE booking_id=?", (booking_id,))
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Booking not found")
 
-    cursor.execute("DELETE FROM bookings WHERE booking_id=?", (booking_id,))
-    conn.commit()
-    conn.close()
+def delete_booking_internal(booking_id: str, conn: sqlite3.Connection):
+    def remove(cursor):
+        cursor.execute("SELECT window_id, booking_date FROM bookings WHERE booking_id=?", (booking_id,))
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Booking not found")
+
+        cursor.execute("DELETE FROM bookings WHERE booking_id=?", (booking_id,))
+        _release_slot(cursor, row[0], row[1])
+
+    try:
+        run_write_transaction(conn, remove)
+    except DatabaseBusy:
+        raise HTTPException(status_code=503, detail="Booking service is busy, please try again.")
     return {"message": "Booking deleted successfully"}
 
 
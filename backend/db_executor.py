@@ -0,0 +1,98 @@
+# ===========================
+# DB EXECUTOR
+# ===========================
+# Async routes hand their blocking sqlite3 work to a small dedicated thread
+# pool instead of FastAPI's shared default threadpool (40 threads). The
+# executor owns a connection pool of its own with one connection per
+# worker, so a job never waits for a connection: the shared pool (sync
+# Depends(get_db) routes, the range stream, the MCP context store) cannot
+# starve it. A bounded number of jobs may queue behind the workers; beyond
+# that the request is rejected with 503 right away instead of piling up
+# latency.
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from backend import db_table
+from backend.db_pool import POOL_SIZE, ConnectionPool
+
+DB_WORKERS = POOL_SIZE      # and as many connections, separate from the shared pool
+DB_MAX_PENDING = 512        # jobs allowed to wait for a worker
+
+
+class BoundedExecutor:
+    """Thread pool that rejects work (503) instead of queueing without limit."""
+
+    def __init__(self, workers, max_pending, name):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        # running + queued jobs; released when the job finishes in its thread
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please try again.",
+                headers={"Retry-After": "1"}
+            )
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class DBExecutor(BoundedExecutor):
+    def __init__(self, workers=DB_WORKERS, max_pending=DB_MAX_PENDING):
+        super().__init__(workers, max_pending, "lab-db")
+        self._pool = ConnectionPool(db_table.DB_PATH, max_size=workers)
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, conn=<connection of this executor>, **kwargs) on a DB worker."""
+        return super().submit(self._with_connection, fn, args, kwargs)
+
+    def _with_connection(self, fn, args, kwargs):
+        with self._pool.connection() as conn:
+            return fn(*args, conn=conn, **kwargs)
+
+    def shutdown(self):
+        super().shutdown()
+        self._pool.close_all()
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor() -> DBExecutor:
+    """Process-wide DB executor (created on first use)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = DBExecutor()
+    return _EXECUTOR
+
+
+def shutdown_executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown()
+            _EXECUTOR = None
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Await fn(*args, conn=conn, **kwargs) on the DB executor.
+    Exceptions raised by fn (including HTTPException) propagate unchanged.
+    """
+    return await asyncio.wrap_future(get_executor().submit(fn, *args, **kwargs))
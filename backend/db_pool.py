@@ -0,0 +1,180 @@
+# ===========================
+# CONNECTION POOL
+# ===========================
+# One pool of SQLite connections per process. Every connection is set up
+# once (WAL, busy_timeout, foreign_keys, statement cache) and always goes
+# back to the pool, rolled back if a request left a transaction open.
+
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from backend import db_table
+
+POOL_SIZE = 8
+POOL_TIMEOUT = 10.0          # seconds to wait for a free connection
+BUSY_TIMEOUT_MS = 5000       # how long SQLite waits on a locked database
+STATEMENT_CACHE_SIZE = 256   # prepared statements cached per connection
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    """No connection became free within POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    def __init__(self, db_path, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,   # handed between FastAPI worker threads
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted("Database connection pool exhausted")
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # connection is broken, drop it and let the pool create a new one
+            with self._lock:
+                self._created -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool for db_table.DB_PATH (created on first use)."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(db_table.DB_PATH)
+    return _POOL
+
+
+def db_connection():
+    """Context manager: `with db_connection() as conn:` borrows a pooled connection."""
+    return get_pool().connection()
+
+
+def get_db():
+    """FastAPI dependency yielding a pooled connection for the request."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+# ===========================
+# WRITE TRANSACTIONS
+# ===========================
+WRITE_RETRIES = 8
+WRITE_RETRY_BASE_DELAY = 0.01   # seconds, doubled per attempt (+ jitter)
+
+
+class DatabaseBusy(sqlite3.OperationalError):
+    """The write lock could not be taken after WRITE_RETRIES attempts."""
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def run_write_transaction(conn, work, retries=WRITE_RETRIES):
+    """
+    Run work(cursor) inside BEGIN IMMEDIATE and commit.
+
+    BEGIN IMMEDIATE takes SQLite's write lock up front, so reads done by
+    work() cannot be invalidated by another writer before the commit.
+    If the lock is busy (beyond busy_timeout) the whole transaction is
+    retried with exponential backoff. Any exception raised by work() rolls
+    back and propagates unchanged.
+    """
+    delay = WRITE_RETRY_BASE_DELAY
+    for attempt in range(retries):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e):
+                raise
+            if attempt == retries - 1:
+                raise DatabaseBusy(str(e))
+            time.sleep(delay + random.uniform(0, delay))
+            delay *= 2
+            continue
+
+        try:
+            result = work(conn.cursor())
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
@@ -1,10 +1,11 @@
+import os
 import sqlite3
 import uuid
 
 # ===========================
 # DATABASE
 # ===========================
-DB_PATH = "lab_system.db"
+DB_PATH = os.getenv("LAB_DB_PATH", "lab_system.db")
 
 def init_db():
     conn = sqlite3.connect(DB_PATH)
@@ -187,10 +188,202 @@ def init_db():
         """)
 
 
+    # ---------- booking_counters ----------
+    # Bookings per (window, date); updated atomically on every admission
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS booking_counters (
+            window_id TEXT NOT NULL,
+            booking_date TEXT NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (window_id, booking_date)
+        )
+        """)
+
+
     cursor.execute("""
         CREATE UNIQUE INDEX IF NOT EXISTS ux_test_doctor_unique
         ON test_doctor_assignments (doctor_id, test_id)
     """)
 
     conn.commit()
-    conn.close()
\ No newline at end of file
+    migrate(conn)
+    conn.close()
+
+
+# ===========================
+# SCHEMA MIGRATIONS
+# ===========================
+# Each migration runs once, in order, and bumps PRAGMA user_version.
+# Append new steps to MIGRATIONS; never edit one that has shipped.
+
+def _migration_1_lookup_indexes(cursor):
+    """Indexes for the availability / booking lookups."""
+
+    # One lab holiday per date. Older databases may hold several rows for a
+    # date; which one is right is the admin's call, so stop and list them
+    # rather than dropping any (the whole migration rolls back).
+    cursor.execute("""
+        SELECT date, GROUP_CONCAT(holiday_id, ', ')
+        FROM lab_holidays
+        GROUP BY date
+        HAVING COUNT(*) > 1
+        ORDER BY date
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        listing = "; ".join(f"{day}: {ids}" for day, ids in duplicates)
+        raise RuntimeError(
+            "Cannot add the unique index on lab_holidays.date: several holidays share a date "
+            f"({listing}). Delete the extra rows from {DB_PATH} "
+            "(DELETE FROM lab_holidays WHERE holiday_id = '...') and start the backend again."
+        )
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_lab_holidays_date
+        ON lab_holidays (date)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_test_holidays_test_date
+        ON test_holidays (test_id, date)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_doctor_holidays_doctor_date
+        ON doctor_holidays (doctor_id, date)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_test_schedule_test_day
+        ON test_schedule (test_id, day_of_week)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_windows_test_schedule
+        ON test_schedule_windows (test_id, schedule_id, window_start)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_bookings_window_date
+        ON bookings (window_id, booking_date)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_bookings_test_date
+        ON bookings (test_id, booking_date)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_test_doctor_test
+        ON test_doctor_assignments (test_id)
+    """)
+
+
+def _migration_2_booking_list_indexes(cursor):
+    """Indexes for the filtered, keyset-paginated bookings list."""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_bookings_date_time_id
+        ON bookings (booking_date, booking_time, booking_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_bookings_doctor_date
+        ON bookings (doctor_id, booking_date)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_bookings_patient_lower
+        ON bookings (lower(patient_name))
+    """)
+
+
+def _migration_3_window_capacity(cursor):
+    """Projection of effective window capacity per date (see backend/capacity.py)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS window_capacity (
+            window_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            test_id TEXT NOT NULL,
+            effective_max INTEGER NOT NULL,
+            PRIMARY KEY (window_id, date)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_window_capacity_test_date
+        ON window_capacity (test_id, date)
+    """)
+    # Single row: the date range window_capacity currently covers
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS capacity_horizon (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL
+        )
+    """)
+
+
+def _migration_4_ref_generations(cursor):
+    """Change counters for cached reference data (see backend/ref_cache.py)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ref_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # start from the creation time, so a re-created database never hands out
+    # an ETag that a client still holds from the previous one
+    cursor.executemany(
+        "INSERT OR IGNORE INTO ref_generations (name, generation) "
+        "VALUES (?, CAST(strftime('%s', 'now') AS INTEGER))",
+        [("tests",), ("doctors",), ("assignments",), ("schedules",)]
+    )
+
+
+def _migration_5_booking_contexts(cursor):
+    """Chatbot booking flows shared by MCP workers (see utils/context_store.py)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS booking_contexts (
+            context_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_booking_contexts_expires
+        ON booking_contexts (expires_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_booking_contexts_last_used
+        ON booking_contexts (last_used)
+    """)
+
+
+def _migration_6_lab_schedule_generation(cursor):
+    """Change counter for lab_schedule (indexed by the lab_info retriever, utils/hybrid_retriever.py)."""
+    cursor.execute(
+        "INSERT OR IGNORE INTO ref_generations (name, generation) "
+        "VALUES ('lab_schedule', CAST(strftime('%s', 'now') AS INTEGER))"
+    )
+
+
+MIGRATIONS = [
+    (1, _migration_1_lookup_indexes),
+    (2, _migration_2_booking_list_indexes),
+    (3, _migration_3_window_capacity),
+    (4, _migration_4_ref_generations),
+    (5, _migration_5_booking_contexts),
+    (6, _migration_6_lab_schedule_generation),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Apply pending migrations, each in its own transaction."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            step(cursor)
+            # PRAGMA does not accept bound parameters
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return conn.execute("PRAGMA user_version").fetchone()[0]
@@ -0,0 +1,143 @@
+# ===========================
+# REFERENCE DATA CACHE
+# ===========================
+# Tests, doctors, assignments and schedules are read on almost every page
+# render and chatbot turn but change rarely. Each of them has a generation
+# counter in ref_generations; every write bumps it in the same transaction
+# (bump_generation), so all processes sharing the database see the change.
+# lab_schedule has a counter too, used by the lab_info keyword index
+# (utils/hybrid_retriever.py) to re-index only the tables that changed.
+#
+# Readers keep the loaded value per (name, key) together with the generation
+# it was loaded at. The generation itself is re-read from the database at
+# most every CACHE_TTL seconds, so a hit usually costs no query at all.
+# The ETag of a list is its generation, so an unchanged list costs a 304.
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+REF_TABLES = ("tests", "doctors", "assignments", "schedules")
+CACHE_TTL = 1.0            # seconds a generation read from the DB is trusted
+CACHE_MAX_ENTRIES = 256    # (name, key) entries kept, least recently used evicted
+
+
+class CacheEntry:
+    __slots__ = ("generation", "value", "body", "etag")
+
+    def __init__(self, generation, value, etag):
+        self.generation = generation
+        self.value = value          # shared: callers must not mutate it
+        self.body = json.dumps(value).encode()
+        self.etag = etag
+
+
+class RefCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}      # name -> (generation, checked_at)
+        self._dirty_until = {}      # name -> time until which the TTL is not trusted
+        self._stats = {name: {"hits": 0, "misses": 0, "not_modified": 0} for name in REF_TABLES}
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Generations
+    # -----------------------------
+    def generation(self, conn, name):
+        now = time.monotonic()
+        with self._lock:
+            known = self._generations.get(name)
+            trusted = known and now - known[1] < self.ttl and now >= self._dirty_until.get(name, 0)
+            if trusted:
+                return known[0]
+
+        row = conn.execute("SELECT generation FROM ref_generations WHERE name=?", (name,)).fetchone()
+        generation = row[0] if row else 0
+        with self._lock:
+            self._generations[name] = (generation, now)
+        return generation
+
+    def etag(self, conn, name, key=None):
+        return _etag(name, self.generation(conn, name), key)
+
+    def invalidate(self, *names):
+        """
+        Called by writers in this process. Until the writer has committed, a
+        read could still see the old generation, so for one TTL every read
+        goes back to the database instead of trusting what it saw.
+        """
+        until = time.monotonic() + self.ttl
+        with self._lock:
+            for name in names:
+                self._generations.pop(name, None)
+                self._dirty_until[name] = until
+
+    # -----------------------------
+    # Values
+    # -----------------------------
+    def get(self, conn, name, loader, key=None) -> CacheEntry:
+        """Cached loader(conn) for (name, key), reloaded when the generation moves."""
+        # generation first, then data: a racing write can only cause an extra reload
+        generation = self.generation(conn, name)
+        cache_key = (name, key)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry.generation == generation:
+                self._entries.move_to_end(cache_key)
+                self._stats[name]["hits"] += 1
+                return entry
+            self._stats[name]["misses"] += 1
+
+        entry = CacheEntry(generation, loader(conn), _etag(name, generation, key))
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def record_not_modified(self, name):
+        with self._lock:
+            self._stats[name]["not_modified"] += 1
+
+    def stats(self):
+        with self._lock:
+            tables = {}
+            for name, counters in self._stats.items():
+                lookups = counters["hits"] + counters["misses"]
+                tables[name] = {
+                    **counters,
+                    "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+                    "generation": self._generations.get(name, (None,))[0],
+                }
+            return {
+                "ttl_seconds": self.ttl,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "tables": tables,
+            }
+
+
+def _etag(name, generation, key=None):
+    return f'"{name}-{generation}"' if key is None else f'"{name}-{generation}-{key}"'
+
+
+_CACHE = RefCache()
+
+
+def get_ref_cache() -> RefCache:
+    return _CACHE
+
+
+def bump_generation(cursor, *names):
+    """Mark reference tables as changed. Runs in the writer's transaction."""
+    cursor.execute(
+        "UPDATE ref_generations SET generation = generation + 1 "
+        "WHERE name IN (SELECT value FROM json_each(?))",
+        (json.dumps(names),)
+    )
+    _CACHE.invalidate(*names)
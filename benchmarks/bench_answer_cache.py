@@ -0,0 +1,155 @@
+# -----------------------------
+# BENCHMARK: rag_retrieval_tool answer cache
+# -----------------------------
+# Replays a stream of general lab questions with a skewed popularity
+# (a few questions asked very often) and surface variations (case,
+# punctuation, filler words) against lab_info.pdf and a fresh lab DB.
+# The LLM is a stub that counts calls. For each semantic threshold it
+# reports:
+#   - exact / semantic hit ratios and LLM calls made
+#   - wrong reuses: hits that returned the answer of a different
+#     question ("open on Sunday" answered with the Saturday answer)
+# once with the semantic key check (same chunks and key terms, see
+# utils/answer_cache.py) and once without it (embedding similarity only),
+# plus the latency of a hit vs a miss at --llm-ms per LLM call.
+#
+#   python -m benchmarks.bench_answer_cache
+#   python -m benchmarks.bench_answer_cache --questions 5000 --thresholds 0.8 0.85 0.9
+
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.seed import temp_db_path
+from utils.answer_cache import AnswerCache, CachedAnswer, answer_with_cache, normalize_question
+from utils.hybrid_retriever import HybridRetriever
+from utils.rag_index import VectorIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "lab_info.pdf")
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TESTS = ["CBC", "Lipid Profile", "Vitamin D Test", "Thyroid Function Test", "Blood Sugar", "Urine Culture"]
+DOCTORS = ["Dr. Sarah Khan", "Dr. Ahmed Ali", "Dr. Fatima Noor", "Dr. Bilal Shah", "Dr. Ayesha Iqbal"]
+
+# intent -> phrasings; every phrasing of an intent has the same right answer
+INTENTS = {"timings": ["what are your timings", "what are the lab timings", "lab timings"]}
+INTENTS["address"] = ["where is the lab located", "what is the lab address", "lab address"]
+INTENTS["holidays"] = ["what are the lab holidays", "which holidays is the lab closed on"]
+for day in DAYS:
+    INTENTS[f"open {day}"] = [f"is the lab open on {day}", f"what are the lab timings on {day}"]
+for test in TESTS:
+    INTENTS[f"doctor {test}"] = [f"which doctor is in charge of the {test}", f"who handles the {test}"]
+for doctor in DOCTORS:
+    INTENTS[f"specialization {doctor}"] = [f"what is the specialization of {doctor}", f"what does {doctor} specialize in"]
+
+FILLERS = ["", "", "please ", "can you tell me ", "hi, "]
+
+
+def question_stream(count, seed=3):
+    rnd = random.Random(seed)
+    intents = list(INTENTS)
+    weights = [1 / (rank + 1) for rank in range(len(intents))]      # Zipf-like popularity
+    for _ in range(count):
+        intent = rnd.choices(intents, weights)[0]
+        text = rnd.choice(FILLERS) + rnd.choice(INTENTS[intent])
+        text = text.capitalize() if rnd.random() < 0.5 else text
+        yield intent, text + rnd.choice(["?", "", " ?", "."])
+
+
+def run(retriever, questions, threshold, key_check):
+    cache = AnswerCache(threshold=threshold)
+    answers = {}        # answer text -> intent it was generated for
+    llm_calls = 0
+    wrong = 0
+
+    def generate(question, chunks):
+        nonlocal llm_calls
+        llm_calls += 1
+        answer = f"answer #{llm_calls}"
+        answers[answer] = current
+        return answer
+
+    for current, question in questions:
+        if key_check:
+            result = answer_with_cache(question, retriever, generate, cache=cache)
+        else:
+            result = answer_without_key_check(question, retriever, generate, cache)
+        wrong += answers[result["answer"]] != current
+    stats = cache.stats()
+    return stats, llm_calls, wrong
+
+
+def answer_without_key_check(question, retriever, generate, cache):
+    """answer_with_cache with every answer filed under one key: similarity only."""
+    version = cache.check_version(retriever.version())
+    normalized = normalize_question(question)
+    entry = cache.get_exact(normalized)
+    if entry is not None:
+        return {"answer": entry.answer}
+    vectors = retriever.vector_index.embeddings.embed_array([question])
+    chunks = [doc["text"] for doc in retriever.search_many([question], k=2, vectors=vectors)[0]]
+    entry = cache.get_similar(vectors[0], "")
+    answer = entry.answer if entry is not None else generate(question, chunks)
+    cache.put(normalized, CachedAnswer(answer, chunks, vectors[0], ""), version)
+    return {"answer": answer}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.75, 0.85, 0.95])
+    parser.add_argument("--llm-ms", type=float, default=800, help="assumed latency of one LLM answer")
+    args = parser.parse_args()
+
+    from backend import db_table
+
+    db_path = temp_db_path()
+    db_table.DB_PATH = db_path
+    db_table.init_db()
+    work = tempfile.mkdtemp(prefix="lab_answers_")
+    index = VectorIndex(os.path.join(work, "rag_index"))
+    index.sync([PDF])
+    retriever = HybridRetriever(index, connection=lambda: contextlib.closing(sqlite3.connect(db_path)))
+
+    questions = list(question_stream(args.questions))
+    print(f"{len(questions)} questions, {len(INTENTS)} intents, "
+          f"{len({normalize_question(q) for _, q in questions})} distinct after normalization")
+    print(f"{'threshold':>9} {'key check':>9} {'exact':>7} {'semantic':>9} {'LLM calls':>10} {'wrong':>6}")
+    for threshold in args.thresholds:
+        for key_check in (True, False):
+            stats, llm_calls, wrong = run(retriever, questions, threshold, key_check)
+            print(f"{threshold:>9.2f} {'yes' if key_check else 'no':>9} "
+                  f"{stats['exact_hit_ratio']:>7.1%} {stats['semantic_hit_ratio']:>9.1%} "
+                  f"{llm_calls:>10} {wrong:>6}")
+    print(f"{'no cache':>9} {'':>9} {'':>7} {'':>9} {len(questions):>10} {0:>6}")
+
+    cache = AnswerCache()
+    generate = lambda question, chunks: time.sleep(args.llm_ms / 1000) or "answer"
+    timings = {}
+    for question in ("what are the lab timings?", "What are the lab timings", "what is the lab address"):
+        t0 = time.perf_counter()
+        result = answer_with_cache(question, retriever, generate, cache=cache)
+        timings.setdefault(result["cache"], []).append((time.perf_counter() - t0) * 1000)
+    for kind, values in timings.items():
+        print(f"{kind:>9} : {sum(values) / len(values):>8.2f} ms  (LLM stub {args.llm_ms:.0f} ms)")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE ref_generations SET generation = generation + 1 WHERE name = 'lab_schedule'")
+    conn.commit()
+    conn.close()
+    retriever.refresh(force=True)
+    result = answer_with_cache("what are the lab timings?", retriever, lambda q, c: "new answer", cache=cache)
+    print(f"after lab_schedule changed: {result['cache']} ({cache.stats()['invalidations']} invalidation)")
+
+    shutil.rmtree(work, ignore_errors=True)
+    shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# -----------------------------
+# BENCHMARK: async vs sync availability / booking routes
+# -----------------------------
+# Drives the real app in-process through httpx's ASGI transport with 10,
+# 100 and 1000 concurrent clients and compares it with the previous sync
+# routes (def + Depends(get_db), run on FastAPI's default threadpool).
+# Each client loops GET /lab/available-slots with a POST /lab/bookings
+# every BOOKING_EVERY requests.
+#
+#   python -m benchmarks.bench_async_routes
+#   python -m benchmarks.bench_async_routes --requests 5000 --clients 10 100 1000
+
+import argparse
+import asyncio
+import random
+import sqlite3
+import time
+from datetime import timedelta
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from benchmarks.seed import temp_db_path, seed_database
+
+BOOKING_EVERY = 10
+
+
+def build_sync_app():
+    """The routes as they were before the DB executor (sync def + pooled conn)."""
+    from backend.db_pool import get_db
+    from backend.crud_backend import Booking, create_booking_internal, get_available_slots_internal
+
+    legacy = FastAPI()
+
+    @legacy.get("/lab/available-slots/{test_id}/{booking_date}")
+    def get_available_slots(test_id: str, booking_date: str, conn: sqlite3.Connection = Depends(get_db)):
+        return get_available_slots_internal(test_id, booking_date, conn)
+
+    @legacy.post("/lab/bookings")
+    def create_booking(booking: Booking, conn: sqlite3.Connection = Depends(get_db)):
+        return create_booking_internal(booking, conn)
+
+    return legacy
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def drive(app, targets, clients, total_requests):
+    per_client = max(1, total_requests // clients)
+    latencies = []
+    statuses = {}
+
+    # app errors (e.g. PoolExhausted on the sync routes) count as 500s
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://lab", timeout=None) as client:
+
+        async def one_client(seed):
+            rnd = random.Random(seed)
+            for i in range(per_client):
+                test_id, day, window_id = rnd.choice(targets)
+                t0 = time.perf_counter()
+                if i % BOOKING_EVERY == BOOKING_EVERY - 1:
+                    r = await client.post("/lab/bookings", json={
+                        "test_id": test_id,
+                        "window_id": window_id,
+                        "patient_name": "bench",
+                        "patient_mobile": "03000000000",
+                        "booking_date": day,
+                    })
+                else:
+                    r = await client.get(f"/lab/available-slots/{test_id}/{day}")
+                latencies.append((time.perf_counter() - t0) * 1000)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_client(c) for c in range(clients)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "statuses": statuses,
+    }
+
+
+def build_targets(db_path, data, days=14):
+    """(test_id, date, window_id) triples with a schedule on that date."""
+    conn = sqlite3.connect(db_path)
+    targets = []
+    for test_id in data["test_ids"]:
+        for offset in range(days):
+            day = data["start"] + timedelta(days=offset)
+            row = conn.execute("""
+                SELECT w.window_id FROM test_schedule_windows w
+                JOIN test_schedule ts ON ts.schedule_id = w.schedule_id
+                WHERE ts.test_id=? AND ts.day_of_week=? AND ts.is_closed=0
+                ORDER BY w.window_start LIMIT 1
+            """, (test_id, day.weekday())).fetchone()
+            if row:
+                targets.append((test_id, day.isoformat(), row[0]))
+    conn.close()
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--pool-timeout", type=float, default=1.0,
+                        help="seconds a request waits for a pooled connection (app default: 10)")
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    data = seed_database(db_path, tests=4, windows_per_day=50, max_tests=1000, days_with_bookings=14)
+    targets = build_targets(db_path, data)
+
+    from backend.crud_backend import app
+    from backend.db_pool import get_pool
+
+    # The sync routes can starve the default threadpool waiting for connections;
+    # a short pool timeout keeps those runs bounded (they fail with 500 instead)
+    get_pool().timeout = args.pool_timeout
+    apps = (("sync", build_sync_app()), ("async", app))
+
+    print(f"{'clients':>7} | {'routes':>6} | {'req':>6} | {'req/s':>8} | {'p50 ms':>8} | {'p99 ms':>8} | statuses")
+    print("-" * 78)
+    for clients in args.clients:
+        for name, target_app in apps:
+            r = asyncio.run(drive(target_app, targets, clients, args.requests))
+            print(
+                f"{clients:>7} | {name:>6} | {r['requests']:>6} | {r['rps']:>8.0f} | "
+                f"{r['p50']:>8.2f} | {r['p99']:>8.2f} | {dict(sorted(r['statuses'].items()))}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -----------------------------
+# BENCHMARK: get_available_slots
+# -----------------------------
+# Compares the batched availability engine and the window_capacity
+# projection against the previous per-window COUNT(*) implementation on
+# schedules with 50+ windows.
+#
+#   python -m benchmarks.bench_availability
+
+import sqlite3
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from benchmarks.seed import temp_db_path, seed_database, QueryCounter
+from backend.availability import (
+    calculate_adjusted_max,
+    compute_available_slots,
+    iter_availability_range
+)
+from backend.capacity import roll_horizon, projected_available_slots
+
+
+def legacy_available_slots(cursor, test_id, booking_date, day_number):
+    """Previous implementation: one COUNT(*) per window plus 5-6 lookups."""
+    cursor.execute("""
+        SELECT schedule_id, is_closed
+        FROM test_schedule
+        WHERE test_id=? AND day_of_week=?
+    """, (test_id, day_number))
+    schedule = cursor.fetchone()
+    if not schedule:
+        return []
+    schedule_id, is_closed = schedule
+    if is_closed:
+        return []
+
+    cursor.execute("""
+        SELECT window_id, window_start, window_end, max_tests
+        FROM test_schedule_windows
+        WHERE test_id=? AND schedule_id=?
+        ORDER BY window_start
+    """, (test_id, schedule_id))
+    windows = cursor.fetchall()
+    if not windows:
+        return []
+
+    cursor.execute("SELECT is_closed, opens_at, closes_at FROM lab_holidays WHERE date=?", (booking_date,))
+    lab_holiday = cursor.fetchone()
+    cursor.execute("SELECT is_closed, opens_at, closes_at FROM test_holidays WHERE test_id=? AND date=?",
+                   (test_id, booking_date))
+    test_holiday = cursor.fetchone()
+    cursor.execute("SELECT requires_doctor FROM tests WHERE test_id=?", (test_id,))
+    requires_doctor = cursor.fetchone()[0]
+
+    doctor_holiday = None
+    if requires_doctor:
+        cursor.execute("SELECT doctor_id FROM test_doctor_assignments WHERE test_id=?", (test_id,))
+        row = cursor.fetchone()
+        if row:
+            cursor.execute("SELECT is_closed, opens_at, closes_at FROM doctor_holidays WHERE doctor_id=? AND date=?",
+                           (row[0], booking_date))
+            doctor_holiday = cursor.fetchone()
+
+    result = []
+    for window_id, window_start, window_end, max_tests in windows:
+        adjusted_max = max_tests
+        skip = False
+        for holiday in (lab_holiday, test_holiday, doctor_holiday):
+            if holiday:
+                is_closed, opens_at, closes_at = holiday
+                if is_closed:
+                    skip = True
+                    break
+                adjusted_max = min(adjusted_max, calculate_adjusted_max(
+                    window_start, window_end, opens_at, closes_at, max_tests))
+        if skip:
+            continue
+        cursor.execute("SELECT COUNT(*) FROM bookings WHERE window_id=? AND booking_date=?",
+                       (window_id, booking_date))
+        booked = cursor.fetchone()[0]
+        result.append({
+            "window_id": window_id,
+            "window_start": window_start,
+            "window_end": window_end,
+            "available_slots": max(0, adjusted_max - booked)
+        })
+    return result
+
+
+def run(fn, conn, test_id, dates, repeat):
+    cursor = conn.cursor()
+    counter = QueryCounter(conn)
+    timings = []
+    queries = []
+    results = {}
+    for _ in range(repeat):
+        for d in dates:
+            counter.reset()
+            t0 = time.perf_counter()
+            results[d] = fn(cursor, test_id, d.isoformat(), d.weekday())
+            timings.append((time.perf_counter() - t0) * 1000)
+            queries.append(counter.count)
+    conn.set_trace_callback(None)
+    return timings, queries, results
+
+
+def main(window_counts=(50, 100, 200), repeat=20):
+    print(f"{'windows':>8} | {'impl':>9} | {'queries':>7} | {'p50 ms':>8} | {'p95 ms':>8}")
+    print("-" * 53)
+    for windows in window_counts:
+        db_path = temp_db_path()
+        data = seed_database(db_path, tests=1, windows_per_day=windows, days_with_bookings=14)
+        test_id = data["test_ids"][0]
+        dates = [data["start"] + timedelta(days=i) for i in range(7)]
+
+        conn = sqlite3.connect(db_path)
+        roll_horizon(conn, data["start"])
+        rows = {}
+        for name, fn in (
+            ("legacy", legacy_available_slots),
+            ("batched", compute_available_slots),
+            ("projected", lambda cursor, t, d, _: projected_available_slots(cursor, t, d)),
+        ):
+            timings, queries, results = run(fn, conn, test_id, dates, repeat)
+            rows[name] = results
+            timings.sort()
+            print(
+                f"{windows:>8} | {name:>9} | {max(queries):>7} | "
+                f"{statistics.median(timings):>8.3f} | {timings[int(len(timings) * 0.95) - 1]:>8.3f}"
+            )
+        conn.close()
+
+        assert rows["legacy"] == rows["batched"], "engine output differs from legacy implementation"
+        assert rows["legacy"] == rows["projected"], "window_capacity projection differs from legacy implementation"
+
+
+def main_range(tests=20, windows=50, days=92):
+    """Quarter-long range for every test: query count and peak Python memory."""
+    db_path = temp_db_path()
+    data = seed_database(db_path, tests=tests, windows_per_day=windows, days_with_bookings=days)
+    start = data["start"]
+    end = start + timedelta(days=days - 1)
+
+    conn = sqlite3.connect(db_path)
+    counter = QueryCounter(conn)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    items = 0
+    for _ in iter_availability_range(conn.cursor(), data["test_ids"], start, end):
+        items += 1
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.close()
+
+    print(
+        f"\nrange: {tests} tests x {days} days x {windows} windows -> {items} items, "
+        f"{counter.count} queries, {elapsed * 1000:.1f} ms, peak {peak / 1024:.0f} KiB "
+        f"(per-date endpoint: {items} requests, ~{items * (windows + 6)} queries)"
+    )
+
+
+if __name__ == "__main__":
+    main()
+    main_range()
@@ -0,0 +1,86 @@
+# -----------------------------
+# BENCHMARK: chatbot.db compaction
+# -----------------------------
+# Seeds chatbot.db with long conversations, measures state loads (latest
+# checkpoint of a thread, as on every chat turn), per-thread history
+# listing and file size, runs utils.chat_compaction and measures again.
+# Also checks that a compacted thread still resumes with its full message
+# list.
+#
+#   python -m benchmarks.bench_checkpoint_compaction
+#   python -m benchmarks.bench_checkpoint_compaction --threads 2000 --turns 12 --keep 5
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import aiosqlite
+
+from benchmarks.seed import temp_db_path, seed_chat_history
+from utils.chat_compaction import compact_chat_db
+from utils.thread_registry import ThreadRegistrySaver
+
+
+def percentiles(values):
+    values = sorted(values)
+    return statistics.median(values), values[int(len(values) * 0.95) - 1]
+
+
+async def measure(db_path, thread_ids, samples):
+    rnd = random.Random(7)
+    picks = [rnd.choice(thread_ids) for _ in range(samples)]
+    async with aiosqlite.connect(db_path) as conn:
+        saver = ThreadRegistrySaver(conn)
+        await saver.setup()
+        loads, histories, messages = [], [], 0
+        for thread_id in picks:
+            config = {"configurable": {"thread_id": thread_id}}
+            t0 = time.perf_counter()
+            state = await saver.aget_tuple(config)
+            loads.append((time.perf_counter() - t0) * 1000)
+            messages += len(state.checkpoint["channel_values"]["messages"])
+
+            t0 = time.perf_counter()
+            async for _ in saver.alist(config):
+                pass
+            histories.append((time.perf_counter() - t0) * 1000)
+    return percentiles(loads), percentiles(histories), messages
+
+
+def file_bytes(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--keep", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    db_path = temp_db_path("chatbot.db")
+    thread_ids = seed_chat_history(db_path, threads=args.threads, turns=args.turns)
+
+    before = await measure(db_path, thread_ids, args.samples)
+    size_before = file_bytes(db_path)
+    report = compact_chat_db(db_path, keep=args.keep)
+    after = await measure(db_path, thread_ids, args.samples)
+    size_after = file_bytes(db_path)
+
+    assert before[2] == after[2], "compaction changed the restored conversations"
+
+    print(f"{args.threads} threads x {args.turns} turns, keep {args.keep} checkpoints per thread")
+    print(f"compaction: {report['checkpoints_deleted']} checkpoints, {report['writes_deleted']} writes deleted, "
+          f"{report['bytes_reclaimed'] / 1e6:.1f} MB reclaimed ({report['vacuum']} vacuum) in {report['elapsed_ms']:.0f} ms")
+    print(f"{'':>8} | {'file MB':>8} | {'load p50':>8} | {'load p95':>8} | {'hist p50':>8} | {'hist p95':>8}")
+    print("-" * 62)
+    for label, (load, history, _), size in (("before", before, size_before), ("after", after, size_after)):
+        print(f"{label:>8} | {size / 1e6:>8.1f} | {load[0]:>8.2f} | {load[1]:>8.2f} | {history[0]:>8.2f} | {history[1]:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+# -----------------------------
+# BENCHMARK: prompt size per turn, full history vs windowed
+# -----------------------------
+# Simulates a long chat thread (questions and complete booking flows with
+# tool calls and tool results, shaped like the MCP tools' output) and
+# reports, per user turn, the estimated prompt tokens of the old chat_node
+# (system prompt + every message) and of build_prompt(), plus the time
+# build_prompt takes. No LLM calls.
+#
+#   python -m benchmarks.bench_context_window
+#   python -m benchmarks.bench_context_window --turns 200 --budget 2000
+
+import argparse
+import json
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from langgraph_mcp_backend import SYSTEM_PROMPT_TEXT
+from utils.chat_context import build_prompt
+
+WINDOWS = [
+    {"window_no": i + 1, "time": f"{8 + i // 2:02d}:{30 * (i % 2):02d} - {8 + (i + 1) // 2:02d}:{30 * ((i + 1) % 2):02d}",
+     "available": 5}
+    for i in range(16)
+]
+
+
+def tool_exchange(name, args, result):
+    call_id = str(uuid.uuid4())
+    return [
+        AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}]),
+        ToolMessage(content=json.dumps(result), tool_call_id=call_id, name=name),
+    ]
+
+
+def user_turns():
+    """Endless sequence of user turns (lists of messages), cycling question / booking flow."""
+    n = 0
+    while True:
+        n += 1
+        yield [HumanMessage(content=f"What are the fasting requirements for the lipid profile test? (question {n})"),
+               AIMessage(content="For a lipid profile you should fast for 9-12 hours; water is fine. " * 2)]
+
+        context_id = str(uuid.uuid4())
+        query = f"book cbc test on 2026-11-{n % 28 + 1:02d} for Ali 03001234567"
+        yield [HumanMessage(content=query),
+               *tool_exchange("start_booking_tool", {"query": query},
+                              {"status": "awaiting_window_selection", "context_id": context_id, "windows": WINDOWS}),
+               AIMessage(content="These windows are available: " + ", ".join(w["time"] for w in WINDOWS) + ". Which one?")]
+
+        args = {"context_id": context_id, "window_selection": "3", "patient_name": "Ali", "patient_mobile": "03001234567"}
+        yield [HumanMessage(content="the third one"),
+               *tool_exchange("create_booking_tool", {**args, "confirm": False},
+                              {"status": "awaiting_confirmation", "message": "Confirm booking:\n• Test: CBC\n• Window: 09:00 - 09:30"}),
+               AIMessage(content="Please confirm: CBC, 09:00 - 09:30, patient Ali.")]
+
+        yield [HumanMessage(content="yes confirm"),
+               *tool_exchange("create_booking_tool", {**args, "confirm": True},
+                              {"status": "success", "booking_id": str(uuid.uuid4()), "message": "Booking created successfully"}),
+               AIMessage(content="Your booking is confirmed.")]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=120)
+    parser.add_argument("--budget", type=int, default=None)
+    args = parser.parse_args()
+
+    report_at = {1, 2, 4, 8, 16, 32, 64, 120, args.turns}
+    print(f"{'turn':>5} | {'messages':>8} | {'full tokens':>11} | {'sent tokens':>11} | {'sent msgs':>9} | {'build ms':>8}")
+    print("-" * 68)
+
+    history, turns = [], user_turns()
+    for turn in range(1, args.turns + 1):
+        messages = next(turns)
+        history.append(messages[0])                 # chat_node sees the user message first
+        t0 = time.perf_counter()
+        _, report = build_prompt(SYSTEM_PROMPT_TEXT, history, budget=args.budget)
+        build_ms = (time.perf_counter() - t0) * 1000
+        history.extend(messages[1:])
+        if turn in report_at:
+            print(f"{turn:>5} | {report['messages_in']:>8} | {report['tokens_full']:>11} | "
+                  f"{report['tokens_sent']:>11} | {report['messages_sent']:>9} | {build_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -----------------------------
+# BENCHMARK: switching to a conversation in the sidebar
+# -----------------------------
+# For threads of growing length, compares reading the full state and
+# converting every message (aget_state + to_display) with load_history():
+# first visit (decode once), switching back to an unchanged thread
+# (cache hit) and loading an older page.
+#
+#   python -m benchmarks.bench_history_loading
+#   python -m benchmarks.bench_history_loading --turns 10 100 400
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiosqlite
+
+from benchmarks.seed import temp_db_path, seed_chat_history
+from utils import chat_history
+from utils.chat_history import load_history, to_display, HistoryCache
+from utils.thread_registry import ThreadRegistrySaver
+
+
+async def timed(coro_fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = await coro_fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings), result
+
+
+async def run(turns, repeat):
+    db_path = temp_db_path("chatbot.db")
+    thread_id = seed_chat_history(db_path, threads=1, turns=turns)[0]
+    async with aiosqlite.connect(db_path) as conn:
+        saver = ThreadRegistrySaver(conn)
+        await saver.setup()
+        config = {"configurable": {"thread_id": thread_id}}
+
+        async def full_state():
+            state = await saver.aget_tuple(config)
+            return to_display(state.checkpoint["channel_values"]["messages"])
+
+        async def cold():
+            chat_history._CACHE = HistoryCache()
+            return await load_history(saver, thread_id)
+
+        full_ms, full = await timed(full_state, repeat)
+        cold_ms, page = await timed(cold, repeat)
+        warm_ms, _ = await timed(lambda: load_history(saver, thread_id), repeat)
+        older_ms, _ = await timed(lambda: load_history(saver, thread_id, before=page["before"]), repeat)
+        assert page["messages"] == full[-len(page["messages"]):]
+        return len(full), full_ms, cold_ms, warm_ms, older_ms
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'turns':>5} | {'messages':>8} | {'full state':>10} | {'first load':>10} | {'switch back':>11} | {'older page':>10}")
+    print("-" * 70)
+    for turns in args.turns:
+        messages, full_ms, cold_ms, warm_ms, older_ms = await run(turns, args.repeat)
+        print(f"{turns:>5} | {messages:>8} | {full_ms:>8.2f}ms | {cold_ms:>8.2f}ms | {warm_ms:>9.3f}ms | {older_ms:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
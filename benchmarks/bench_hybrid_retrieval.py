@@ -0,0 +1,175 @@
+# -----------------------------
+# BENCHMARK: hybrid (BM25 + vector) retrieval for lab questions
+# -----------------------------
+# Indexes lab_info.pdf and a throw-away lab DB with --tests tests, --doctors
+# doctors and the weekly lab_schedule, then asks entity questions (a test's
+# price, a doctor's specialization, the timings of a day) and span
+# questions about the PDF. Reports hit@1 / hit@2 (lab_info asks for k=2) for:
+#   - pdf vectors      what lab_info searched before (PDF chunks only)
+#   - vectors          PDF chunks and table rows, cosine ranking only
+#   - hybrid           the same documents, BM25 and cosine fused with RRF
+# and the cost of keeping the keyword index current: one test updated
+# (incremental refresh) vs indexing everything again.
+#
+#   python -m benchmarks.bench_hybrid_retrieval
+#   python -m benchmarks.bench_hybrid_retrieval --tests 5000 --doctors 500
+
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from benchmarks.seed import temp_db_path
+from utils.hybrid_retriever import HybridRetriever
+from utils.rag_index import VectorIndex, WORD_RE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "lab_info.pdf")
+
+ANALYTES = [
+    "glucose", "cholesterol", "triglycerides", "creatinine", "urea", "bilirubin", "albumin",
+    "calcium", "sodium", "potassium", "ferritin", "vitamin d", "vitamin b12", "tsh", "t3", "t4",
+    "hba1c", "crp", "esr", "alt", "ast", "uric acid", "magnesium", "phosphorus", "iron",
+]
+PANELS = ["serum", "plasma", "urine", "fasting", "random", "panel", "profile", "screen"]
+FIRST = ["sarah", "ahmed", "fatima", "bilal", "ayesha", "usman", "hina", "omar", "zainab", "hamza"]
+LAST = ["khan", "ali", "noor", "shah", "iqbal", "malik", "raza", "butt", "qureshi", "sheikh"]
+SPECIALIZATIONS = ["pathology", "radiology", "biochemistry", "microbiology", "hematology", "cardiology"]
+
+
+def seed_lab_db(db_path, tests, doctors, seed=7):
+    from backend import db_table
+
+    db_table.DB_PATH = db_path
+    db_table.init_db()
+    rnd = random.Random(seed)
+    names = [f"{a} {p} {n}" for n in range(1, tests + 1) for a in ANALYTES for p in PANELS][:tests]
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO tests (test_id, test_name, price, duration) VALUES (?, ?, ?, ?)",
+        [(str(uuid.uuid4()), name, rnd.randrange(500, 9000, 50), f"{rnd.choice([10, 15, 30])} min") for name in names]
+    )
+    conn.executemany(
+        "INSERT INTO doctors (doctor_id, doctor_name, specialization) VALUES (?, ?, ?)",
+        [
+            (str(uuid.uuid4()), f"dr {rnd.choice(FIRST)} {rnd.choice(LAST)} {i}", rnd.choice(SPECIALIZATIONS))
+            for i in range(doctors)
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+def questions(db_path, pdf_chunks, count, seed=11):
+    """(question, expected document text) pairs."""
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    tests = conn.execute("SELECT test_name FROM tests").fetchall()
+    doctors = conn.execute("SELECT doctor_name FROM doctors").fetchall()
+    conn.close()
+    pairs = []
+    for (name,) in rnd.sample(tests, min(count, len(tests))):
+        pairs.append(("tests", f"what is the price of the {name} test", name))
+    for (name,) in rnd.sample(doctors, min(count, len(doctors))):
+        pairs.append(("doctors", f"what is the specialization of {name}", name))
+    for day in ("Monday", "Wednesday", "Saturday", "Sunday"):
+        pairs.append(("lab_schedule", f"what are the lab timings on {day}", f"timings {day}"))
+    for chunk in pdf_chunks:
+        words = WORD_RE.findall(chunk["text"].lower())
+        if len(words) >= 6:
+            start = rnd.randrange(len(words) - 5)
+            pairs.append(("pdf", " ".join(words[start:start + 6]), chunk["text"]))
+    return pairs
+
+
+def is_hit(kind, expected, doc):
+    if kind == "pdf":
+        return doc["text"] == expected
+    return doc["source"] == f"db:{kind}" and expected.lower() in doc["text"].lower()
+
+
+def dense_only(retriever, queries, k):
+    """Cosine ranking over PDF chunks and rows, no keyword index."""
+    vectors = retriever.vector_index.embeddings.embed_array(queries)
+    pdf_hits = retriever.vector_index.search_vectors(vectors, k)
+    engine, keys = retriever._rows
+    indices, scores = engine.top_k(vectors, k)
+    results = []
+    for i in range(len(queries)):
+        hits = [(h["score"], h) for h in pdf_hits[i]]
+        hits += [(float(s), retriever.documents[keys[j]]) for j, s in zip(indices[i], scores[i])]
+        hits.sort(key=lambda item: item[0], reverse=True)
+        results.append([doc for _, doc in hits[:k]])
+    return results
+
+
+def report(name, pairs, results):
+    by_kind = {}
+    for (kind, _, expected), docs in zip(pairs, results):
+        counts = by_kind.setdefault(kind, [0, 0, 0])
+        counts[0] += bool(docs) and is_hit(kind, expected, docs[0])
+        counts[1] += any(is_hit(kind, expected, doc) for doc in docs[:2])
+        counts[2] += 1
+    cells = "  ".join(f"{kind} {h1 / n:>4.0%}/{h2 / n:>4.0%}" for kind, (h1, h2, n) in by_kind.items())
+    print(f"{name:>12} : {cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=2000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=100, help="per table")
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    seed_lab_db(db_path, args.tests, args.doctors)
+    connect = lambda: contextlib.closing(sqlite3.connect(db_path))
+
+    work = tempfile.mkdtemp(prefix="lab_hybrid_")
+    index = VectorIndex(os.path.join(work, "rag_index"))
+    index.sync([PDF])
+    retriever = HybridRetriever(index, connection=connect)
+
+    t0 = time.perf_counter()
+    first = retriever.refresh(force=True)
+    full_ms = (time.perf_counter() - t0) * 1000
+    print(f"index build   : {full_ms:>8.1f} ms  ({first['chunks_indexed']} chunks, {first['rows_indexed']} rows)")
+
+    pairs = questions(db_path, index.chunks, args.questions)
+    queries = [q for _, q, _ in pairs]
+    print(f"questions     : {len(pairs)}  (hit@1/hit@2)")
+    report("pdf vectors", pairs, index.search_many(queries, k=2))
+    report("vectors", pairs, dense_only(retriever, queries, k=2))
+
+    t0 = time.perf_counter()
+    hybrid = [retriever.search(q, k=2) for q in queries]
+    per_query_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    report("hybrid", pairs, hybrid)
+    print(f"hybrid query  : {per_query_ms:>8.2f} ms per question")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE tests SET price = price + 100 WHERE rowid = 1")
+    conn.execute("UPDATE ref_generations SET generation = generation + 1 WHERE name = 'tests'")
+    conn.commit()
+    conn.close()
+    t0 = time.perf_counter()
+    update = retriever.refresh(force=True)
+    incremental_ms = (time.perf_counter() - t0) * 1000
+    print(f"1 test edited : {incremental_ms:>8.1f} ms  ({update['rows_indexed']} row re-indexed, "
+          f"tables re-read: {', '.join(update['tables'])})")
+
+    t0 = time.perf_counter()
+    HybridRetriever(index, connection=connect).refresh(force=True)
+    print(f"full re-index : {(time.perf_counter() - t0) * 1000:>8.1f} ms")
+
+    shutil.rmtree(work, ignore_errors=True)
+    shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# -----------------------------
+# BENCHMARK: PDF ingestion, load-everything vs streaming pipeline
+# -----------------------------
+# Generates text PDFs of --pages pages and ingests each one:
+#   - load all    what lab_info did before: PDFPlumberLoader.load() (every
+#                 page), split everything, embed everything in one call
+#   - stream      utils/pdf_ingest.py: page by page, batches of
+#                 EMBED_BATCH_SIZE, checkpoint after every batch
+#   - stream+pool the same with --workers extraction processes
+# Every mode runs in its own process and reports wall time and peak RSS.
+# Then an ingest is interrupted halfway and resumed: reports where it
+# resumed, the time of the remainder and that the result is identical to
+# an uninterrupted run.
+#
+#   python -m benchmarks.bench_pdf_ingest
+#   python -m benchmarks.bench_pdf_ingest --pages 100 400 --workers 4
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+WORDS = (
+    "sample blood test fasting report doctor pathology serum plasma urine glucose cholesterol "
+    "vitamin thyroid hemoglobin platelet culture result normal range collection centre patient "
+    "appointment timing holiday laboratory specimen analysis reference method interval value"
+).split()
+
+
+def write_text_pdf(path, pages, lines_per_page=48, seed=1):
+    """Minimal PDF (Helvetica text lines), enough for pdfplumber."""
+    rnd = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1} section {i}: " + " ".join(rnd.choices(WORDS, k=10)) for i in range(lines_per_page)]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+# -----------------------------
+# One mode (child process)
+# -----------------------------
+def run_child(mode, pdf, out, workers):
+    from utils.rag_index import HashingEmbeddings
+
+    embeddings = HashingEmbeddings()
+    t0 = time.perf_counter()
+    if mode == "load all":
+        from langchain_community.document_loaders import PDFPlumberLoader
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from utils.pdf_ingest import CHUNK_OVERLAP, CHUNK_SIZE
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        chunks = splitter.split_documents(PDFPlumberLoader(pdf).load())
+        matrix = embeddings.embed_array([c.page_content for c in chunks])
+        np.save(os.path.join(out, "all.npy"), matrix)
+        count = len(chunks)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        from utils.pdf_ingest import ingest_pdf
+
+        pool = ProcessPoolExecutor(workers) if mode == "stream+pool" else None
+        try:
+            count = ingest_pdf(pdf, os.path.join(out, "s.npy"), os.path.join(out, "s.json"), embeddings, pool)["chunks"]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    elapsed = (time.perf_counter() - t0) * 1000
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    worker_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({"ms": elapsed, "peak_mb": peak_kb / 1024, "worker_mb": worker_kb / 1024, "chunks": count}))
+
+
+def child(mode, pdf, workers):
+    out = tempfile.mkdtemp(prefix="lab_ingest_")
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pdf_ingest", "--child", mode, "--pdf", pdf,
+             "--out", out, "--workers", str(workers)],
+            capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+
+
+# -----------------------------
+# Interrupt + resume
+# -----------------------------
+class Interrupted(Exception):
+    pass
+
+
+class FailingEmbeddings:
+    """Raises after `batches` embed calls, like a crash halfway through."""
+
+    def __init__(self, base, batches):
+        self.base = base
+        self.batches = batches
+
+    def embed_array(self, texts):
+        if self.batches == 0:
+            raise Interrupted()
+        self.batches -= 1
+        return self.base.embed_array(texts)
+
+
+def resume_check(pdf):
+    """Crash halfway through the batches, resume. Returns (chunks before the crash, report, ms, identical)."""
+    from utils.pdf_ingest import EMBED_BATCH_SIZE, ingest_pdf
+    from utils.rag_index import HashingEmbeddings
+
+    work = tempfile.mkdtemp(prefix="lab_resume_")
+    embeddings = HashingEmbeddings()
+    try:
+        full = os.path.join(work, "full")
+        total = ingest_pdf(pdf, full + ".npy", full + ".json", embeddings)["chunks"]
+        batches_before_crash = max(1, total // EMBED_BATCH_SIZE // 2)
+
+        part = os.path.join(work, "part")
+        try:
+            ingest_pdf(pdf, part + ".npy", part + ".json", FailingEmbeddings(embeddings, batches_before_crash))
+        except Interrupted:
+            pass
+        t0 = time.perf_counter()
+        report = ingest_pdf(pdf, part + ".npy", part + ".json", embeddings)
+        resumed_ms = (time.perf_counter() - t0) * 1000
+
+        with open(full + ".json") as a, open(part + ".json") as b:
+            same_chunks = json.load(a) == json.load(b)
+        same_vectors = np.array_equal(np.load(full + ".npy"), np.load(part + ".npy"))
+        return batches_before_crash * EMBED_BATCH_SIZE, report, resumed_ms, same_chunks and same_vectors
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[25, 100])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--child")
+    parser.add_argument("--pdf")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.pdf, args.out, args.workers)
+        return
+
+    work = tempfile.mkdtemp(prefix="lab_pdfs_")
+    try:
+        print(f"{'pages':>6} {'mode':>12} {'chunks':>7} {'time':>10} {'peak RSS':>10} {'worker RSS':>11}")
+        for pages in args.pages:
+            pdf = os.path.join(work, f"lab_{pages}.pdf")
+            write_text_pdf(pdf, pages)
+            for mode in ("load all", "stream", "stream+pool"):
+                r = child(mode, pdf, args.workers)
+                worker = f"{r['worker_mb']:>9.0f}MB" if r["worker_mb"] else f"{'-':>11}"
+                print(f"{pages:>6} {mode:>12} {r['chunks']:>7} {r['ms']:>8.0f}ms {r['peak_mb']:>8.0f}MB {worker}")
+
+        pdf = os.path.join(work, f"lab_{args.pages[0]}.pdf")
+        written, report, resumed_ms, identical = resume_check(pdf)
+        print(f"interrupted after {written} chunks of {report['chunks']}: "
+              f"resumed at page {report['resumed_at_page']}, remainder {resumed_ms:.0f} ms, "
+              f"identical to an uninterrupted run: {identical}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -----------------------------
+# BENCHMARK: get_test_info parsing
+# -----------------------------
+# Runs a generated corpus of labelled booking queries (typos, date styles,
+# with / without name and mobile, queries that need the LLM) through the
+# local parser and reports how many it answers on its own (hit rate), how
+# accurate those answers are and how long it takes. With --llm (and a
+# GOOGLE_API_KEY) a sample also goes through the Gemini path for comparison.
+#
+#   python -m benchmarks.bench_query_parser
+#   python -m benchmarks.bench_query_parser --queries 2000 --llm 20
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from utils.booking_parser import parse_booking_query
+
+TEST_NAMES = [
+    "CBC", "Lipid Profile", "Liver Function Test", "Renal Function Test", "Thyroid Profile",
+    "Blood Sugar Fasting", "Blood Sugar Random", "HbA1c", "Urine Routine", "Vitamin D",
+    "X-Ray Chest", "Ultrasound Abdomen", "ECG", "Serum Electrolytes", "Dengue NS1",
+]
+PATIENTS = ["Ali", "Sara Khan", "Ahmed Raza", "Fatima", "Bilal Ahmed", "Zainab", "Usman Tariq", "Ayesha Malik"]
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+TEMPLATES = [
+    "{test} on {date} for {name} {mobile}",
+    "book {test} {date} for {name}, mobile {mobile}",
+    "I want a {test} {date}, my name is {name} {mobile}",
+    "{test} {date} patient: {name} {mobile}",
+    "please book {test} for {name} on {date}",
+    "{test} {date}",
+    "can I get {test} done {date}? this is {name}",
+]
+# need the LLM: no test name, or no date
+HARD_TEMPLATES = [
+    "I need a blood test {date} for {name}",
+    "book {test} for {name} {mobile}",
+    "something for my sugar levels {date}",
+]
+
+
+def typo(word, rnd):
+    if len(word) < 5 or rnd.random() < 0.6:
+        return word
+    i = rnd.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]          # drop one letter
+
+
+def date_phrase(today, rnd):
+    """(phrase, expected YYYY-MM-DD)."""
+    offset = rnd.randint(0, 40)
+    day = today + timedelta(days=offset)
+    style = rnd.randrange(6)
+    if style == 0:
+        return day.isoformat(), day.isoformat()
+    if style == 1:
+        return day.strftime("%d/%m/%Y"), day.isoformat()
+    if style == 2:
+        return f"on {day.day} {day.strftime('%B')}", day.isoformat()
+    if style == 3:
+        return day.strftime("%b %d, %Y"), day.isoformat()
+    if style == 4:
+        phrase, days = rnd.choice([("today", 0), ("tomorrow", 1), ("day after tomorrow", 2), ("in 5 days", 5)])
+        return phrase, (today + timedelta(days=days)).isoformat()
+    weekday = rnd.randrange(7)
+    ahead = (weekday - today.weekday()) % 7
+    return f"next {WEEKDAYS[weekday]}", (today + timedelta(days=ahead or 7)).isoformat()
+
+
+def build_corpus(size, today, seed=7):
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        hard = i % 10 == 9                  # ~10% of queries the local parser should pass on
+        template = rnd.choice(HARD_TEMPLATES if hard else TEMPLATES)
+        test = rnd.choice(TEST_NAMES)
+        name = rnd.choice(PATIENTS)
+        mobile = rnd.choice(["0300", "0321", "0333", "+92 345 "]) + f"{rnd.randrange(10 ** 7):07d}"
+        phrase, expected_date = date_phrase(today, rnd)
+        query = template.format(
+            test=" ".join(typo(w, rnd) for w in test.split()) if rnd.random() < 0.5 else test.lower(),
+            date=phrase, name=name, mobile=mobile
+        )
+        corpus.append({
+            "query": query,
+            "test_name": test if "{test}" in template else None,
+            "date_str": expected_date if "{date}" in template else None,
+            "patient_name": name if "{name}" in template else None,
+            "patient_mobile": "".join(c for c in mobile if c.isdigit()) if "{mobile}" in template else None,
+        })
+    return corpus
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def run_local(corpus, today):
+    latencies, hits, correct = [], 0, {"test_name": 0, "date_str": 0, "patient_name": 0, "patient_mobile": 0}
+    wrong_hits = 0
+    for item in corpus:
+        t0 = time.perf_counter()
+        parsed = parse_booking_query(item["query"], TEST_NAMES, today)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if not parsed["confident"]:
+            continue
+        hits += 1
+        ok = True
+        for field in correct:
+            if parsed[field] == item[field]:
+                correct[field] += 1
+            elif field in ("test_name", "date_str"):
+                ok = False
+        wrong_hits += not ok
+    return latencies, hits, correct, wrong_hits
+
+
+def run_llm(corpus):
+    from utils.helper_booking import llm_parse_query
+
+    latencies, correct = [], 0
+    for item in corpus:
+        t0 = time.perf_counter()
+        parsed = llm_parse_query(item["query"], TEST_NAMES)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        correct += parsed["test_name"] == item["test_name"] and parsed["date_str"] == item["date_str"]
+    return latencies, correct
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--llm", type=int, default=0, help="also send this many queries to Gemini")
+    args = parser.parse_args()
+
+    today = date.today()
+    corpus = build_corpus(args.queries, today)
+    parse_booking_query("warm up tomorrow", TEST_NAMES, today)
+
+    latencies, hits, correct, wrong_hits = run_local(corpus, today)
+    print(f"corpus: {len(corpus)} queries, {len(TEST_NAMES)} tests")
+    print(f"local : hit rate {hits / len(corpus):.1%} ({hits}), wrong test/date on hits: {wrong_hits}")
+    print("        field accuracy on hits: " + ", ".join(f"{k} {v / max(hits, 1):.1%}" for k, v in correct.items()))
+    print(f"        p50 {statistics.median(latencies):.3f} ms | p95 {percentile(latencies, 0.95):.3f} ms | "
+          f"max {max(latencies):.3f} ms")
+
+    if not args.llm:
+        print("llm   : skipped (pass --llm N with GOOGLE_API_KEY set)")
+        return
+
+    sample = random.Random(1).sample(corpus, min(args.llm, len(corpus)))
+    llm_latencies, llm_correct = run_llm(sample)
+    llm_p50 = statistics.median(llm_latencies)
+    print(f"llm   : {len(sample)} queries, test+date correct {llm_correct / len(sample):.1%}")
+    print(f"        p50 {llm_p50:.0f} ms | p95 {percentile(llm_latencies, 0.95):.0f} ms")
+    miss = 1 - hits / len(corpus)
+    print(f"mixed : expected per-query latency ~{statistics.median(latencies) + miss * llm_p50:.0f} ms "
+          f"(LLM only: {llm_p50:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -----------------------------
+# BENCHMARK: RAG index build / restart / change, retrieval quality
+# -----------------------------
+# Indexes copies of lab_info.pdf into a temporary rag_index/ and reports:
+#   - first build (parse + chunk + embed + write)
+#   - restart (manifest + mmap, nothing re-embedded)
+#   - restart after one PDF changed (only that one re-embedded)
+# and retrieval hit rate: each chunk is searched for with a span of its
+# own words; hit@1 / hit@3 for the hashing embeddings vs the random
+# vectors lab_info used before.
+#
+#   python -m benchmarks.bench_rag_index
+#   python -m benchmarks.bench_rag_index --copies 20
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from utils.rag_index import HashingEmbeddings, VectorIndex, WORD_RE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "lab_info.pdf")
+
+
+class RandomEmbeddings:
+    """What lab_info used before: a random vector per text."""
+
+    signature = "random"
+
+    def embed_array(self, texts):
+        matrix = np.random.rand(len(texts), 1536).astype(np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - t0) * 1000, result
+
+
+def hit_rates(index, span=6, seed=5):
+    rnd = random.Random(seed)
+    hits1 = hits3 = total = 0
+    for document in index.documents.values():
+        for chunk in document["chunks"]:
+            words = WORD_RE.findall(chunk["text"].lower())
+            if len(words) < span:
+                continue
+            start = rnd.randrange(len(words) - span + 1)
+            found = [r["text"] for r in index.search(" ".join(words[start:start + span]), k=3)]
+            hits1 += found[:1] == [chunk["text"]]
+            hits3 += chunk["text"] in found
+            total += 1
+    return hits1 / total, hits3 / total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=10)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="lab_rag_")
+    sources = []
+    for i in range(args.copies):
+        path = os.path.join(work, f"lab_info_{i}.pdf")
+        shutil.copy(PDF, path)
+        with open(path, "ab") as f:
+            f.write(f"\n% copy {i}\n".encode())      # distinct content hash per copy
+        sources.append(path)
+    index_dir = os.path.join(work, "rag_index")
+
+    build_ms, report = timed(lambda: VectorIndex(index_dir).sync(sources))
+    print(f"first build   : {build_ms:>8.1f} ms  ({len(report['embedded'])} PDFs embedded, {report['chunks']} chunks)")
+
+    restart_ms, report = timed(lambda: VectorIndex(index_dir).sync(sources))
+    print(f"restart       : {restart_ms:>8.1f} ms  ({len(report['loaded'])} loaded, {len(report['embedded'])} embedded)")
+
+    with open(sources[0], "ab") as f:
+        f.write(b"% changed\n")
+    changed_ms, report = timed(lambda: VectorIndex(index_dir).sync(sources))
+    print(f"1 PDF changed : {changed_ms:>8.1f} ms  ({len(report['loaded'])} loaded, {len(report['embedded'])} embedded)")
+
+    single = VectorIndex(os.path.join(work, "quality"), HashingEmbeddings())
+    single.sync([PDF])
+    baseline = VectorIndex(os.path.join(work, "baseline"), RandomEmbeddings())
+    baseline.sync([PDF])
+    for name, index in (("hashing", single), ("random (old)", baseline)):
+        h1, h3 = hit_rates(index)
+        print(f"{name:>13} : hit@1 {h1:.0%}  hit@3 {h3:.0%}")
+
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
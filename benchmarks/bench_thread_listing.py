@@ -0,0 +1,100 @@
+# -----------------------------
+# BENCHMARK: sidebar thread listing
+# -----------------------------
+# Seeds chatbot.db with N conversations and compares the old
+# retrieve_all_threads (walk every checkpoint with alist(None) and collect
+# distinct thread ids) with the thread registry (one indexed page, most
+# recent first). Also reports the one-off registry backfill on an existing
+# database and the extra cost of keeping the registry up to date per turn.
+#
+#   python -m benchmarks.bench_thread_listing
+#   python -m benchmarks.bench_thread_listing --threads 50000 --turns 1
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Annotated, TypedDict
+
+import aiosqlite
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+
+from benchmarks.seed import temp_db_path, seed_chat_history
+from utils.thread_registry import ThreadRegistrySaver
+
+
+async def old_listing(db_path):
+    async with aiosqlite.connect(db_path) as conn:
+        saver = AsyncSqliteSaver(conn)
+        t0 = time.perf_counter()
+        threads = set()
+        async for checkpoint in saver.alist(None):
+            threads.add(checkpoint.config["configurable"]["thread_id"])
+        return (time.perf_counter() - t0) * 1000, len(threads)
+
+
+async def registry_listing(db_path, pages):
+    async with aiosqlite.connect(db_path) as conn:
+        saver = ThreadRegistrySaver(conn)
+        t0 = time.perf_counter()
+        await saver.setup()
+        backfill_ms = (time.perf_counter() - t0) * 1000
+
+        timings, cursor = [], None
+        for _ in range(pages):
+            t0 = time.perf_counter()
+            page, cursor = await saver.alist_threads(50, cursor)
+            timings.append((time.perf_counter() - t0) * 1000)
+        total = await saver.acount_threads()
+        return backfill_ms, timings, total
+
+
+async def turn_cost(db_path, saver_class, turns):
+    class ChatState(TypedDict):
+        messages: Annotated[list, add_messages]
+
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", lambda state: {"messages": [AIMessage(content="ok")]})
+    graph.add_edge(START, "chat_node")
+    graph.add_edge("chat_node", END)
+
+    async with aiosqlite.connect(db_path) as conn:
+        app = graph.compile(checkpointer=saver_class(conn))
+        timings = []
+        for i in range(turns):
+            config = {"configurable": {"thread_id": f"{saver_class.__name__}-{i % 20}"}}
+            t0 = time.perf_counter()
+            await app.ainvoke({"messages": [HumanMessage(content=f"turn {i}")]}, config)
+            timings.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = temp_db_path("chatbot.db")
+    t0 = time.perf_counter()
+    seed_chat_history(db_path, threads=args.threads, turns=args.turns)
+    print(f"seeded {args.threads} threads x {args.turns} turns in {time.perf_counter() - t0:.1f}s")
+
+    old_ms, old_count = await old_listing(db_path)
+    backfill_ms, pages, total = await registry_listing(db_path, args.pages)
+    print(f"old  alist(None) walk : {old_ms:>9.1f} ms  ({old_count} threads)")
+    print(f"registry backfill     : {backfill_ms:>9.1f} ms  (once, {total} threads)")
+    print(f"registry first page   : {pages[0]:>9.2f} ms")
+    print(f"registry page p50     : {statistics.median(pages):>9.2f} ms  ({args.pages} pages of 50)")
+
+    plain = await turn_cost(temp_db_path("chatbot.db"), AsyncSqliteSaver, 200)
+    registry = await turn_cost(temp_db_path("chatbot.db"), ThreadRegistrySaver, 200)
+    print(f"turn p50 plain / registry saver: {plain:.2f} / {registry:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
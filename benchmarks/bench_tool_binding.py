@@ -0,0 +1,137 @@
+# -----------------------------
+# BENCHMARK: MCP over HTTP vs in-process tool binding
+# -----------------------------
+# Calls the booking tools the way the graph's ToolNode does (tool.ainvoke
+# with a tool call) in both LAB_TOOL_MODE settings and reports end-to-end
+# latency per call. The MCP mode talks to server.py started on a seeded
+# database; the local mode runs the same tools in this process.
+#
+#   python -m benchmarks.bench_tool_binding
+#   python -m benchmarks.bench_tool_binding --calls 500
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from benchmarks.seed import temp_db_path, seed_database
+from benchmarks.load_mcp_sessions import free_port, start_server
+
+
+def tool_call(tool, args):
+    return tool.ainvoke({"type": "tool_call", "id": str(uuid.uuid4()), "name": tool.name, "args": args})
+
+
+async def run_calls(tools, queries, calls):
+    by_name = {t.name: t for t in tools}
+    start_tool, create_tool = by_name["start_booking_tool"], by_name["create_booking_tool"]
+    timings = {"start_booking_tool": [], "create_booking_tool": []}
+    for i in range(calls):
+        t0 = time.perf_counter()
+        message = await tool_call(start_tool, {"query": queries[i % len(queries)]})
+        timings["start_booking_tool"].append((time.perf_counter() - t0) * 1000)
+
+        started = message.artifact if isinstance(message.artifact, dict) else None
+        if not started or "context_id" not in started:
+            continue
+        t0 = time.perf_counter()
+        await tool_call(create_tool, {
+            "context_id": started["context_id"],
+            "window_selection": "1",
+            "patient_name": "bench",
+            "patient_mobile": "03000000000",
+            "confirm": False,
+        })
+        timings["create_booking_tool"].append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+async def run_http_calls(url, queries, calls):
+    """
+    Fallback when langchain_mcp_adapters cannot be imported: the same HTTP
+    round trips with fastmcp's client, one MCP session per call like the
+    adapter's tools (no persistent session).
+    """
+    from fastmcp import Client
+
+    async def call(name, arguments):
+        async with Client(url) as client:
+            return await client.call_tool(name, arguments)
+
+    timings = {"start_booking_tool": [], "create_booking_tool": []}
+    for i in range(calls):
+        t0 = time.perf_counter()
+        result = await call("start_booking_tool", {"query": queries[i % len(queries)]})
+        timings["start_booking_tool"].append((time.perf_counter() - t0) * 1000)
+
+        started = result.structured_content or {}
+        if "context_id" not in started:
+            continue
+        t0 = time.perf_counter()
+        await call("create_booking_tool", {
+            "context_id": started["context_id"],
+            "window_selection": "1",
+            "patient_name": "bench",
+            "patient_mobile": "03000000000",
+            "confirm": False,
+        })
+        timings["create_booking_tool"].append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def report(mode, timings):
+    for name, values in timings.items():
+        if not values:
+            continue
+        values.sort()
+        print(f"{mode:>6} | {name:>20} | {len(values):>5} | {statistics.median(values):>8.2f} | "
+              f"{values[int(len(values) * 0.95) - 1]:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    data = seed_database(db_path, tests=4, windows_per_day=20, max_tests=10000, days_with_bookings=0)
+    queries = [
+        f"bench test {t} on {(data['start'] + timedelta(days=d)).isoformat()} for Ali 03001234567"
+        for t in range(4) for d in range(1, 8)
+    ]
+    port = free_port()
+
+    os.environ.update({
+        "LAB_DB_PATH": db_path,
+        "LAB_TOOL_MODE": "local",
+        "MCP_URL": f"http://127.0.0.1:{port}/mcp",
+    })
+    os.environ.setdefault("GOOGLE_API_KEY", "unused-by-this-benchmark")
+    os.chdir(tempfile.mkdtemp(prefix="lab_bench_"))    # chatbot.db checkpointer
+
+    import langgraph_mcp_backend as backend
+
+    print(f"{'mode':>6} | {'tool':>20} | {'calls':>5} | {'p50 ms':>8} | {'p95 ms':>8}")
+    print("-" * 60)
+    report("local", backend.run_async(run_calls(backend.load_local_tools(), queries, args.calls)))
+
+    server = start_server(db_path, 1, port)
+    try:
+        try:
+            mcp_tools = backend.load_mcp_tools()
+        except ImportError as e:
+            print(f"(langchain_mcp_adapters not importable: {e}; mcp* = fastmcp client)")
+            report("mcp*", asyncio.run(run_http_calls(os.environ["MCP_URL"], queries, args.calls)))
+            return
+        report("mcp", backend.run_async(run_calls(mcp_tools, queries, args.calls)))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -----------------------------
+# BENCHMARK: top-k search, DenseMatrix vs InMemoryVectorStore
+# -----------------------------
+# Random unit vectors at 1k / 100k / 1M chunks. For each size reports the
+# resident memory of the index, single-query latency and per-query latency
+# of a batch, for utils.vector_search.DenseMatrix (float32 matrix,
+# argpartition) and for LangChain's InMemoryVectorStore (python lists,
+# what lab_info used before). The old store is skipped above
+# --baseline-max chunks (about 1.2 GB per 100k x 384 vectors).
+#
+#   python -m benchmarks.bench_vector_search
+#   python -m benchmarks.bench_vector_search --sizes 1000 100000 --dim 1024
+
+import argparse
+import gc
+import os
+import statistics
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from utils.vector_search import DenseMatrix
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PrecomputedEmbeddings(Embeddings):
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(t)].tolist() for t in texts]
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+def p50(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def bench_engine(vectors, queries, k):
+    gc.collect()
+    before = rss_bytes()
+    engine = DenseMatrix(vectors)
+    memory = rss_bytes() - before
+    single = p50(lambda: engine.top_k(queries[0], k), 20)
+    batch = p50(lambda: engine.top_k(queries, k), 5) / len(queries)
+    del engine
+    return memory, single, batch
+
+
+def bench_store(vectors, queries, k):
+    gc.collect()
+    before = rss_bytes()
+    store = InMemoryVectorStore(embedding=PrecomputedEmbeddings(vectors))
+    store.add_texts([str(i) for i in range(len(vectors))])
+    memory = rss_bytes() - before
+    repeat = 10 if len(vectors) <= 10000 else 3
+    single = p50(lambda: store.similarity_search_by_vector(queries[0].tolist(), k=k), repeat)
+    del store
+    gc.collect()
+    return memory, single
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--baseline-max", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim {args.dim}, k {args.k}, batch of {args.queries} queries")
+    print(f"{'chunks':>8} | {'dense MB':>8} | {'1 query ms':>10} | {'batch ms/q':>10} | {'store MB':>8} | {'store 1 query ms':>16}")
+    print("-" * 75)
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        memory, single, batch = bench_engine(vectors, queries, args.k)
+        if size <= args.baseline_max:
+            store_memory, store_single = bench_store(vectors, queries, args.k)
+            store = f"{store_memory / 1e6:>8.0f} | {store_single:>16.2f}"
+        else:
+            store = f"{'skipped':>8} | {'':>16}"
+        print(f"{size:>8} | {memory / 1e6:>8.0f} | {single:>10.3f} | {batch:>10.3f} | {store}")
+        del vectors
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
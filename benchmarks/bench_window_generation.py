@@ -0,0 +1,93 @@
+# -----------------------------
+# BENCHMARK: window regeneration
+# -----------------------------
+# Regenerates the windows of every schedule of every test with the previous
+# implementation (delete all, re-insert one execute at a time with fresh
+# UUIDs, commit per schedule) and with the diff engine (regenerate_all_windows,
+# one transaction). Also reports how many bookings lose their window_id.
+#
+#   python -m benchmarks.bench_window_generation
+#   python -m benchmarks.bench_window_generation --tests 50 --windows 100
+
+import argparse
+import sqlite3
+import time
+import uuid
+
+from benchmarks.seed import temp_db_path, seed_database, QueryCounter
+from utils.schedule_win import plan_windows, regenerate_all_windows
+
+WINDOW_MINUTES = 10     # seed_database lays out 10-minute windows
+
+
+def legacy_regenerate_all(conn, window_minutes):
+    """Previous behaviour, once per schedule: delete + per-row insert + commit."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT ts.test_id, ts.schedule_id, ts.opens_at, ts.closes_at, t.duration
+        FROM test_schedule ts JOIN tests t ON t.test_id = ts.test_id
+    """)
+    for test_id, schedule_id, opens_at, closes_at, duration in cursor.fetchall():
+        planned = plan_windows(opens_at, closes_at, window_minutes, duration)
+        if not planned:
+            continue
+        cursor.execute("DELETE FROM test_schedule_windows WHERE schedule_id=?", (schedule_id,))
+        for index, start, end, max_tests in planned:
+            cursor.execute("""
+                INSERT INTO test_schedule_windows
+                (window_id, test_id, schedule_id, window_index, window_start, window_end, max_tests)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (str(uuid.uuid4()), test_id, schedule_id, index, start, end, max_tests))
+        conn.commit()
+
+
+def orphaned_bookings(conn):
+    return conn.execute("""
+        SELECT COUNT(*) FROM bookings b
+        WHERE NOT EXISTS (SELECT 1 FROM test_schedule_windows w WHERE w.window_id = b.window_id)
+    """).fetchone()[0]
+
+
+def timed(conn, fn):
+    counter = QueryCounter(conn)
+    t0 = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - t0) * 1000
+    conn.set_trace_callback(None)
+    return elapsed, counter.count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=20)
+    parser.add_argument("--windows", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.tests} tests x 7 schedules x {args.windows} windows")
+    print(f"{'run':>28} | {'impl':>6} | {'ms':>9} | {'statements':>10} | {'orphaned bookings':>17}")
+    print("-" * 82)
+
+    for impl in ("legacy", "diff"):
+        db_path = temp_db_path()
+        seed_database(db_path, tests=args.tests, windows_per_day=args.windows, days_with_bookings=7)
+        conn = sqlite3.connect(db_path)
+
+        runs = (
+            ("same layout (capacity only)", WINDOW_MINUTES),
+            ("same layout again", WINDOW_MINUTES),
+            ("window size 10 -> 20 min", 20),
+        )
+        for label, minutes in runs:
+            if impl == "legacy":
+                elapsed, statements = timed(conn, lambda: legacy_regenerate_all(conn, minutes))
+            else:
+                def diff_run():
+                    regenerate_all_windows(conn, minutes)
+                    conn.commit()
+                elapsed, statements = timed(conn, diff_run)
+            print(f"{label:>28} | {impl:>6} | {elapsed:>9.1f} | {statements:>10} | {orphaned_bookings(conn):>17}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
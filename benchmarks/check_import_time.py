@@ -0,0 +1,82 @@
+# -----------------------------
+# IMPORT TIME CHECK: langgraph_mcp_backend
+# -----------------------------
+# Imports the chat backend in a fresh interpreter (python -X importtime)
+# and exits non-zero if the cold import takes longer than the budget or
+# pulls in a heavy dependency that should only load on first use (LLM
+# client, LangGraph, MCP adapters, checkpointer). The best of --runs is
+# compared, so one slow run on a busy machine does not fail the check.
+#
+#   python -m benchmarks.check_import_time
+#   python -m benchmarks.check_import_time --budget-ms 300 --runs 5
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULE = "langgraph_mcp_backend"
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "500"))
+LAZY_MODULES = (
+    "langgraph",
+    "langchain_core",
+    "langchain_google_genai",
+    "langchain_openai",
+    "langchain_mcp_adapters",
+    "google.genai",
+    "mcp",
+    "aiosqlite",
+    "server",
+)
+
+PROBE = f"""
+import sys
+import {MODULE}
+loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]
+print("LOADED=" + ",".join(loaded))
+"""
+
+
+def cold_import():
+    """(cumulative import ms of MODULE, heavy modules it loaded)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    total_ms = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == MODULE:
+            total_ms = int(parts[1]) / 1000
+    loaded = result.stdout.split("LOADED=", 1)[1].strip()
+    return total_ms, [m for m in loaded.split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [cold_import() for _ in range(args.runs)]
+    best_ms = min(ms for ms, _ in runs)
+    loaded = sorted({m for _, modules in runs for m in modules})
+
+    print(f"{MODULE}: cold import {best_ms:.0f} ms (best of {args.runs}), budget {args.budget_ms:.0f} ms")
+    failed = False
+    if best_ms > args.budget_ms:
+        print(f"FAIL: over budget by {best_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if loaded:
+        print(f"FAIL: imported at module load: {', '.join(loaded)}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# -----------------------------
+# QUERY PLAN REGRESSION CHECK
+# -----------------------------
+# Runs the hot paths (availability, range availability, bookings list,
+# create / move / delete booking) against a seeded database, records every
+# statement they execute and runs EXPLAIN QUERY PLAN on it. Exits non-zero
+# if any of them falls back to a full table scan, e.g. after an index was
+# dropped or a query was rewritten so it no longer matches one.
+#
+#   python -m benchmarks.check_query_plans
+
+import sqlite3
+import sys
+from datetime import timedelta
+
+from benchmarks.seed import temp_db_path, seed_database
+from backend.capacity import roll_horizon
+
+# Plan steps that are not table scans (json_each is an in-memory list of ids)
+ALLOWED_SCANS = ("SCAN json_each", "SCAN CONSTANT ROW")
+
+
+def record_statements(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+
+def hot_paths(conn, data):
+    from backend.availability import compute_available_slots, iter_availability_range
+    from backend.capacity import (
+        refresh_capacity,
+        refresh_capacity_for_doctor,
+        projected_available_slots
+    )
+    from backend.crud_backend import (
+        Booking,
+        create_booking_internal,
+        get_bookings_internal,
+        update_booking_internal,
+        delete_booking_internal
+    )
+
+    test_id = data["test_ids"][0]
+    day = data["start"] + timedelta(days=60)   # past the seeded bookings
+    cursor = conn.cursor()
+
+    slots = compute_available_slots(cursor, test_id, day.isoformat(), day.weekday())
+
+    # window_capacity projection (built in main): single-date refresh, projected read
+    refresh_capacity(cursor, [test_id], [day])
+    refresh_capacity_for_doctor(cursor, data["doctor_id"], [day])
+    conn.commit()
+    projected_available_slots(cursor, test_id, day.isoformat())
+    list(iter_availability_range(cursor, data["test_ids"], data["start"], day))
+
+    booking = create_booking_internal(Booking(
+        test_id=test_id,
+        window_id=slots[0]["window_id"],
+        patient_name="plan check",
+        patient_mobile="03000000000",
+        booking_date=day.isoformat(),
+    ), conn=conn)
+    update_booking_internal(booking["booking_id"], Booking(
+        test_id=test_id,
+        window_id=slots[1]["window_id"],
+        patient_name="plan check",
+        patient_mobile="03000000000",
+        booking_date=day.isoformat(),
+        booking_time=slots[1]["window_start"],
+    ), conn=conn)
+    delete_booking_internal(booking["booking_id"], conn=conn)
+
+    # bookings list: each filter on its own
+    get_bookings_internal(conn, start_date=data["start"], end_date=day)
+    get_bookings_internal(conn, test_id=test_id)
+    get_bookings_internal(conn, doctor_id=data["doctor_id"])
+    get_bookings_internal(conn, patient="pat")
+
+
+def index_walks(conn, data):
+    """
+    Unfiltered bookings list: walking ix_bookings_date_time_id in order (cut
+    off by LIMIT) and counting over an index are expected here. Plain table
+    scans are not.
+    """
+    from backend.crud_backend import get_bookings_internal, decode_booking_cursor
+
+    _, _, next_cursor = get_bookings_internal(conn, limit=20)
+    get_bookings_internal(conn, limit=20, after=decode_booking_cursor(next_cursor))
+
+
+def plan_of(conn, sql):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+
+
+def main():
+    db_path = temp_db_path()
+    data = seed_database(db_path, tests=4, windows_per_day=50, days_with_bookings=30)
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    roll_horizon(conn, data["start"])   # full projection build reads every test by design
+    checks = []
+    for run, allow_index_walk in ((hot_paths, False), (index_walks, True)):
+        statements = record_statements(conn)
+        run(conn, data)
+        conn.set_trace_callback(None)
+        checks.extend((sql, allow_index_walk) for sql in statements)
+
+    seen = set()
+    failures = []
+    for sql, allow_index_walk in checks:
+        sql = sql.strip()
+        if sql in seen or not sql.split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            continue
+        seen.add(sql)
+        scans = [
+            step for step in plan_of(conn, sql)
+            if step.startswith("SCAN ") and not step.startswith(ALLOWED_SCANS)
+            and not (allow_index_walk and " USING " in step and "INDEX" in step)
+        ]
+        if scans:
+            failures.append((sql, scans))
+
+    conn.close()
+
+    print(f"checked {len(seen)} distinct statements")
+    for sql, scans in failures:
+        print("\nFULL SCAN:", "; ".join(scans))
+        print("  " + " ".join(sql.split())[:300])
+
+    if failures:
+        sys.exit(1)
+    print("no full table scans")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# -----------------------------
+# LOAD TEST: concurrent booking admission
+# -----------------------------
+# Fires thousands of parallel bookings (processes x threads) at ONE window
+# and checks that no more than its capacity were admitted.
+#
+#   python -m benchmarks.load_booking_admission --attempts 4000 --capacity 500
+#   python -m benchmarks.load_booking_admission --legacy   # old COUNT-then-INSERT path
+
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.seed import temp_db_path, seed_database
+
+
+def legacy_admit(db_path, window_id, test_id, booking_date, capacity):
+    """Previous behaviour: COUNT(*) and INSERT as separate statements."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM bookings WHERE window_id=? AND booking_date=?",
+            (window_id, booking_date)
+        )
+        if capacity - cursor.fetchone()[0] <= 0:
+            return "full"
+        cursor.execute("""
+            INSERT INTO bookings (booking_id, window_id, test_id, patient_name, patient_mobile,
+                                  booking_date, booking_time, window_start, window_end)
+            VALUES (?, ?, ?, 'load', '0300', ?, '06:00', '06:00', '06:10')
+        """, (str(uuid.uuid4()), window_id, test_id, booking_date))
+        conn.commit()
+        return "ok"
+    finally:
+        conn.close()
+
+
+def worker(args):
+    db_path, window_id, test_id, booking_date, capacity, attempts, threads, legacy = args
+    os.environ["LAB_DB_PATH"] = db_path
+
+    from fastapi import HTTPException
+    from backend.crud_backend import create_booking_internal, Booking
+
+    def one(i):
+        try:
+            if legacy:
+                return legacy_admit(db_path, window_id, test_id, booking_date, capacity)
+            create_booking_internal(Booking(
+                test_id=test_id,
+                window_id=window_id,
+                patient_name=f"load {os.getpid()}-{i}",
+                patient_mobile="03000000000",
+                booking_date=booking_date,
+            ))
+            return "ok"
+        except HTTPException as e:
+            return "full" if e.status_code == 400 else f"http_{e.status_code}"
+        except sqlite3.OperationalError:
+            return "busy"
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(attempts)))
+    return {k: results.count(k) for k in set(results)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, default=4000)
+    parser.add_argument("--capacity", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    data = seed_database(db_path, tests=1, windows_per_day=1, max_tests=args.capacity,
+                         days_with_bookings=0)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    test_id = data["test_ids"][0]
+    booking_date = data["start"].isoformat()
+    window_id = conn.execute("""
+        SELECT w.window_id FROM test_schedule_windows w
+        JOIN test_schedule ts ON ts.schedule_id = w.schedule_id
+        WHERE ts.test_id=? AND ts.day_of_week=?
+    """, (test_id, data["start"].weekday())).fetchone()[0]
+
+    per_process = args.attempts // args.processes
+    jobs = [
+        (db_path, window_id, test_id, booking_date, args.capacity, per_process, args.threads, args.legacy)
+        for _ in range(args.processes)
+    ]
+
+    t0 = time.perf_counter()
+    with mp.get_context("spawn").Pool(args.processes) as pool:
+        outcomes = pool.map(worker, jobs)
+    elapsed = time.perf_counter() - t0
+
+    totals = {}
+    for outcome in outcomes:
+        for k, v in outcome.items():
+            totals[k] = totals.get(k, 0) + v
+
+    booked = conn.execute(
+        "SELECT COUNT(*) FROM bookings WHERE window_id=? AND booking_date=?",
+        (window_id, booking_date)
+    ).fetchone()[0]
+    counter = conn.execute(
+        "SELECT booked FROM booking_counters WHERE window_id=? AND booking_date=?",
+        (window_id, booking_date)
+    ).fetchone()
+    conn.close()
+
+    attempts = per_process * args.processes
+    print(f"mode         : {'legacy' if args.legacy else 'atomic'}")
+    print(f"attempts     : {attempts} ({args.processes} processes x {args.threads} threads)")
+    print(f"capacity     : {args.capacity}")
+    print(f"outcomes     : {totals}")
+    print(f"rows booked  : {booked}  counter: {counter[0] if counter else '-'}")
+    print(f"overbooked   : {max(0, booked - args.capacity)}")
+    print(f"elapsed      : {elapsed:.2f} s  ->  {attempts / elapsed:.0f} attempts/s")
+
+    if not args.legacy:
+        assert booked <= args.capacity, "overbooking detected"
+        assert booked == totals.get("ok", 0), "admitted count does not match rows"
+        assert counter and counter[0] == booked, "counter row out of sync"
+
+
+if __name__ == "__main__":
+    main()
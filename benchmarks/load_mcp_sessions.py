@@ -0,0 +1,131 @@
+# -----------------------------
+# LOAD TEST: MCP tool server, single vs multi worker
+# -----------------------------
+# Starts server.py against a seeded database with 1..N worker processes and
+# runs concurrent simulated chat sessions against it over streamable HTTP.
+# Each session is one booking flow: start_booking_tool with a query the
+# local parser understands (no LLM key needed), then create_booking_tool
+# asking for confirmation, then confirming.
+#
+#   python -m benchmarks.load_mcp_sessions
+#   python -m benchmarks.load_mcp_sessions --workers 1 2 4 --sessions 400 --concurrency 50
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+import httpx
+from fastmcp import Client
+
+from benchmarks.seed import temp_db_path, seed_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path, workers, port):
+    env = {**os.environ, "LAB_DB_PATH": db_path, "BOOKING_CONTEXT_STORE": "sqlite"}
+    process = subprocess.Popen(
+        [sys.executable, "server.py", "--workers", str(workers), "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/mcp", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.3)
+    process.kill()
+    raise RuntimeError("MCP server did not start")
+
+
+def tool_data(result):
+    return result.structured_content or result.data
+
+
+async def one_session(url, query, rnd):
+    t0 = time.perf_counter()
+    async with Client(url) as client:
+        started = tool_data(await client.call_tool("start_booking_tool", {"query": query}))
+        open_windows = [w["window_no"] for w in started.get("windows", []) if w["available"] > 0]
+        if not open_windows:
+            return time.perf_counter() - t0, "no window"   # closed day / holiday in the seed
+        args = {
+            "context_id": started["context_id"],
+            "window_selection": str(rnd.choice(open_windows)),
+            "patient_name": "load test",
+            "patient_mobile": "03000000000",
+        }
+        await client.call_tool("create_booking_tool", {**args, "confirm": False})
+        done = tool_data(await client.call_tool("create_booking_tool", {**args, "confirm": True}))
+    return time.perf_counter() - t0, "booked" if done.get("status") == "success" else "failed"
+
+
+async def run_sessions(url, queries, sessions, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    rnd = random.Random(3)
+
+    async def limited(i):
+        async with gate:
+            return await one_session(url, queries[i % len(queries)], rnd)
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(limited(i) for i in range(sessions)), return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+    latencies = sorted(r[0] * 1000 for r in results if not isinstance(r, BaseException))
+    outcomes = [r[1] if not isinstance(r, BaseException) else "failed" for r in results]
+    return {
+        "sessions_per_s": sessions / elapsed,
+        "booked": outcomes.count("booked"),
+        "no_window": outcomes.count("no window"),
+        "failed": outcomes.count("failed"),
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=25)
+    args = parser.parse_args()
+
+    print(f"cpu cores: {os.cpu_count()}, {args.sessions} sessions, {args.concurrency} concurrent")
+    print(f"{'workers':>7} | {'sessions/s':>10} | {'p50 ms':>8} | {'p95 ms':>8} | {'booked':>6} | {'no window':>9} | {'failed':>6}")
+    print("-" * 72)
+    for workers in args.workers:
+        db_path = temp_db_path()
+        data = seed_database(db_path, tests=4, windows_per_day=20, max_tests=10000, days_with_bookings=0)
+        queries = [
+            f"bench test {t} on {(data['start'] + timedelta(days=d)).isoformat()} for Ali 03001234567"
+            for t in range(4) for d in range(1, 8)
+        ]
+        port = free_port()
+        server = start_server(db_path, workers, port)
+        try:
+            r = asyncio.run(run_sessions(f"http://127.0.0.1:{port}/mcp", queries, args.sessions, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        print(
+            f"{workers:>7} | {r['sessions_per_s']:>10.1f} | {r['p50']:>8.1f} | {r['p95']:>8.1f} | "
+            f"{r['booked']:>6} | {r['no_window']:>9} | {r['failed']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
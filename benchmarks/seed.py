@@ -0,0 +1,277 @@
+# -----------------------------
+# BENCHMARK FIXTURES
+# -----------------------------
+# Builds a throw-away lab_system.db with synthetic tests, schedules,
+# windows, holidays and bookings. Benchmarks must set LAB_DB_PATH before
+# importing anything from backend/ so the app points at this file.
+
+import os
+import random
+import sqlite3
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+
+def temp_db_path(name="bench_lab_system.db"):
+    return os.path.join(tempfile.mkdtemp(prefix="lab_bench_"), name)
+
+
+def minutes_to_str(m):
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+
+def seed_database(
+    db_path,
+    tests=1,
+    windows_per_day=50,
+    max_tests=20,
+    days_with_bookings=30,
+    bookings_per_window=5,
+    start=None,
+    seed=42,
+):
+    """
+    Create schema (via init_db) and fill it with synthetic data.
+    Returns {"test_ids": [...], "doctor_id": ..., "start": date}.
+    """
+    from backend import db_table
+
+    db_table.DB_PATH = db_path
+    db_table.init_db()
+
+    rnd = random.Random(seed)
+    start = start or date.today()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    doctor_id = str(uuid.uuid4())
+    cursor.execute(
+        "INSERT INTO doctors (doctor_id, doctor_name, specialization) VALUES (?, ?, ?)",
+        (doctor_id, "dr bench", "pathology")
+    )
+
+    # windows of 10 minutes starting 06:00 so 50+ fit into a day
+    window_len = 10
+    day_open = 6 * 60
+    day_close = day_open + windows_per_day * window_len
+
+    test_ids = []
+    for t in range(tests):
+        test_id = str(uuid.uuid4())
+        test_ids.append(test_id)
+        requires_doctor = 1 if t % 2 == 0 else 0
+        cursor.execute("""
+            INSERT INTO tests (test_id, test_name, requires_doctor, duration)
+            VALUES (?, ?, ?, ?)
+        """, (test_id, f"bench test {t}", requires_doctor, "10"))
+
+        if requires_doctor:
+            cursor.execute("""
+                INSERT INTO test_doctor_assignments
+                (assignment_id, test_id, test_name, doctor_id, doctor_name)
+                VALUES (?, ?, ?, ?, ?)
+            """, (str(uuid.uuid4()), test_id, f"bench test {t}", doctor_id, "dr bench"))
+
+        for day in range(7):
+            schedule_id = str(uuid.uuid4())
+            cursor.execute("""
+                INSERT INTO test_schedule
+                (schedule_id, test_id, day_of_week, opens_at, closes_at, is_closed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (schedule_id, test_id, day,
+                  minutes_to_str(day_open), minutes_to_str(day_close), 0))
+
+            cursor.executemany("""
+                INSERT INTO test_schedule_windows
+                (window_id, test_id, schedule_id, window_index, window_start, window_end, max_tests)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (str(uuid.uuid4()), test_id, schedule_id, i,
+                 minutes_to_str(day_open + i * window_len),
+                 minutes_to_str(day_open + (i + 1) * window_len),
+                 max_tests)
+                for i in range(windows_per_day)
+            ])
+
+    # bookings over the first N days
+    cursor.execute("""
+        SELECT w.window_id, w.test_id, ts.day_of_week, w.window_start, w.window_end
+        FROM test_schedule_windows w
+        JOIN test_schedule ts ON ts.schedule_id = w.schedule_id
+    """)
+    windows_by_day = {}
+    for window_id, test_id, dow, w_start, w_end in cursor.fetchall():
+        windows_by_day.setdefault(dow, []).append((window_id, test_id, w_start, w_end))
+
+    rows = []
+    for offset in range(days_with_bookings):
+        d = start + timedelta(days=offset)
+        for window_id, test_id, w_start, w_end in windows_by_day.get(d.weekday(), []):
+            for _ in range(rnd.randint(0, bookings_per_window)):
+                rows.append((
+                    str(uuid.uuid4()), window_id, test_id, None,
+                    f"patient {rnd.randint(1, 10**6)}", "03000000000",
+                    d.isoformat(), w_start, w_start, w_end, None
+                ))
+    cursor.executemany("""
+        INSERT INTO bookings (
+            booking_id, window_id, test_id, doctor_id,
+            patient_name, patient_mobile,
+            booking_date, booking_time, window_start, window_end, doctor_name
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+    # a partial lab day, a partial test day and a partial doctor day
+    cursor.execute("""
+        INSERT INTO lab_holidays (holiday_id, date, opens_at, closes_at, is_closed, remarks)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (str(uuid.uuid4()), (start + timedelta(days=1)).isoformat(), "08:00", "12:00", 0, "bench"))
+    cursor.execute("""
+        INSERT INTO test_holidays (test_holiday_id, test_id, test_name, date, opens_at, closes_at, is_closed)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (str(uuid.uuid4()), test_ids[0], "bench test 0",
+          (start + timedelta(days=2)).isoformat(), "07:00", "09:30", 0))
+    cursor.execute("""
+        INSERT INTO doctor_holidays (doctor_holiday_id, doctor_id, doctor_name, date, opens_at, closes_at, is_closed)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (str(uuid.uuid4()), doctor_id, "dr bench",
+          (start + timedelta(days=3)).isoformat(), "10:00", "14:00", 0))
+
+    conn.commit()
+    conn.close()
+
+    return {"test_ids": test_ids, "doctor_id": doctor_id, "start": start}
+
+
+class QueryCounter:
+    """Counts statements executed on a connection (sqlite3 trace callback)."""
+
+    def __init__(self, conn):
+        self.count = 0
+        conn.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+# -----------------------------
+# Chat history (chatbot.db)
+# -----------------------------
+def _uuid6_at(unix_time, rnd):
+    """Time-ordered (v6) id like LangGraph's checkpoint ids, for a given time."""
+    ticks = int(unix_time * 1e7) + 0x01B21DD213814000
+    value = (
+        (ticks >> 12) << 80
+        | 0x6 << 76
+        | (ticks & 0x0FFF) << 64
+        | 0x8 << 60
+        | rnd.getrandbits(60)
+    )
+    return str(uuid.UUID(int=value))
+
+
+def _template_conversation(turns):
+    """Checkpoint and write rows of one real conversation of `turns` turns."""
+    from typing import Annotated, TypedDict
+
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from langgraph.graph import StateGraph, START, END
+    from langgraph.graph.message import add_messages
+
+    class ChatState(TypedDict):
+        messages: Annotated[list, add_messages]
+
+    def chat_node(state):
+        return {"messages": [AIMessage(content="Available windows: 1) 09:00-09:30 2) 09:30-10:00. " * 3)]}
+
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_edge(START, "chat_node")
+    graph.add_edge("chat_node", END)
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    app = graph.compile(checkpointer=SqliteSaver(conn))
+    config = {"configurable": {"thread_id": "template"}}
+    for turn in range(turns):
+        app.invoke({"messages": [HumanMessage(content=f"book blood test {turn} tomorrow for Ali 03001234567")]}, config)
+
+    checkpoints = conn.execute("""
+        SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata
+        FROM checkpoints ORDER BY checkpoint_id
+    """).fetchall()
+    writes = conn.execute("""
+        SELECT checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, value
+        FROM writes
+    """).fetchall()
+    conn.close()
+    return checkpoints, writes
+
+
+def seed_chat_history(db_path, threads=1000, turns=3, days=90, seed=42):
+    """
+    chatbot.db with `threads` conversations of `turns` turns each, spread
+    over the last `days` days. Rows are copies of one real conversation with
+    new thread and checkpoint ids (time-ordered, like LangGraph's), written
+    by the stock AsyncSqliteSaver schema into a file set up like the chat
+    backend's (auto_vacuum=INCREMENTAL). Returns the thread ids.
+    """
+    import time
+
+    rnd = random.Random(seed)
+    checkpoints, writes = _template_conversation(turns)
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        PRAGMA auto_vacuum=INCREMENTAL;
+        PRAGMA journal_mode=WAL;
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            thread_id TEXT NOT NULL,
+            checkpoint_ns TEXT NOT NULL DEFAULT '',
+            checkpoint_id TEXT NOT NULL,
+            parent_checkpoint_id TEXT,
+            type TEXT,
+            checkpoint BLOB,
+            metadata BLOB,
+            PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+        );
+        CREATE TABLE IF NOT EXISTS writes (
+            thread_id TEXT NOT NULL,
+            checkpoint_ns TEXT NOT NULL DEFAULT '',
+            checkpoint_id TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            task_path TEXT NOT NULL DEFAULT '',
+            idx INTEGER NOT NULL,
+            channel TEXT NOT NULL,
+            type TEXT,
+            value BLOB,
+            PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+        );
+    """)
+
+    now = time.time()
+    thread_ids = []
+    for _ in range(threads):
+        thread_id = str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+        thread_ids.append(thread_id)
+        started = now - rnd.uniform(0, days * 86400)
+        ids = {
+            old_id: _uuid6_at(started + i * 0.05, rnd)
+            for i, (_, old_id, *_rest) in enumerate(checkpoints)
+        }
+        conn.executemany("INSERT INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (thread_id, ns, ids[cid], ids.get(parent), type_, blob, metadata)
+            for ns, cid, parent, type_, blob, metadata in checkpoints
+        ])
+        conn.executemany("INSERT INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (thread_id, ns, ids[cid], task_id, task_path, idx, channel, type_, value)
+            for ns, cid, task_id, task_path, idx, channel, type_, value in writes
+        ])
+    conn.commit()
+    conn.close()
+    return thread_ids
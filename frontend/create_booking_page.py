@@ -1,5 +1,7 @@
 from .frontend_common import *
 
+BOOKINGS_PAGE_SIZE = 50
+
 
 
 # ---------------------------------
@@ -35,20 +37,58 @@ def render_create_booking():
     # Show already booked tests
     # =============================
     if st.session_state["show_booked_tests"]:
-        bookings = api_get(f"{API_BASE}/lab/bookings") or []
-
-        booking_search = st.text_input(
-            "Filter Booked Tests by Patient or Test Name",
-            key="booking_search"
+        # Filters are applied by the backend; pages are fetched one at a time
+        f1, f2, f3 = st.columns([3, 3, 2])
+        booking_search = f1.text_input(
+            "Filter Booked Tests by Patient Name (starts with)",
+            key="booking_search",
+            help="Matches the beginning of the patient name only; use the Test filter to narrow by test."
+        )
+        test_names = {t["test_id"]: t["test_name"] for t in tests}
+        filter_test = f2.selectbox(
+            "Test",
+            [None] + list(test_names),
+            format_func=lambda tid: "All tests" if tid is None else format_display(test_names[tid]),
+            key="booking_filter_test"
         )
+        filter_dates = f3.date_input("Date range", value=(), key="booking_filter_dates")
 
-        filtered_bookings = bookings
+        params = {"limit": BOOKINGS_PAGE_SIZE}
         if booking_search:
-            filtered_bookings = [
-                b for b in bookings
-                if booking_search.lower() in b.get("patient_name", "").lower()
-                or booking_search.lower() in b.get("test_name", "").lower()
-            ]
+            params["patient"] = booking_search
+        if filter_test:
+            params["test_id"] = filter_test
+        if len(filter_dates) == 2:
+            params["start_date"], params["end_date"] = filter_dates[0].isoformat(), filter_dates[1].isoformat()
+
+        # restart from the first page whenever the filters change
+        filter_key = repr(sorted(params.items()))
+        if st.session_state.get("booking_filter_key") != filter_key:
+            st.session_state["booking_filter_key"] = filter_key
+            st.session_state["booking_cursors"] = [None]
+        cursors = st.session_state["booking_cursors"]
+
+        if cursors[-1]:
+            params["cursor"] = cursors[-1]
+
+        filtered_bookings, total, next_cursor, loaded = [], 0, None, False
+        try:
+            r = requests.get(f"{API_BASE}/lab/bookings", params=params, headers=auth_headers())
+            if r.status_code == 200:
+                filtered_bookings = r.json()
+                total = int(r.headers.get("X-Total-Count", len(filtered_bookings)))
+                next_cursor = r.headers.get("X-Next-Cursor")
+                loaded = True
+            else:
+                st.error(r.text)
+        except Exception as e:
+            st.error(str(e))
+
+        # every row of a later page was deleted: step back instead of showing
+        # an empty page without a "Previous" button
+        if loaded and not filtered_bookings and len(cursors) > 1:
+            cursors.pop()
+            st.rerun()
 
         if filtered_bookings:
             header = st.columns([3, 3, 2, 2, 2, 3])
@@ -83,6 +123,17 @@ def render_create_booking():
                     else:
                         st.error(r.json().get("detail", "Failed to delete"))
 
+            page = len(cursors)
+            start = (page - 1) * BOOKINGS_PAGE_SIZE + 1
+            p1, p2, p3 = st.columns([2, 4, 2])
+            if page > 1 and p1.button("◀ Previous", key="bookings_prev"):
+                cursors.pop()
+                st.rerun()
+            p2.caption(f"Showing {start}–{start + len(filtered_bookings) - 1} of {total}")
+            if next_cursor and p3.button("Next ▶", key="bookings_next"):
+                cursors.append(next_cursor)
+                st.rerun()
+
         else:
             st.info("No booked tests to display.")
 
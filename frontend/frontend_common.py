@@ -2,6 +2,7 @@
 import streamlit as st
 import requests
 import re
+from collections import OrderedDict
 from datetime import datetime
 
 API_BASE = "http://127.0.0.1:8000"
@@ -19,11 +20,38 @@ def auth_headers():
 # ---------------------------------
 # SIMPLE GET WRAPPER
 # ---------------------------------
+# (token, url) -> (etag, data) for endpoints that send an ETag (reference
+# lists); unchanged lists come back as 304 with no body. Kept per browser
+# session (st.session_state), least recently used dropped past
+# ETAG_CACHE_MAX_ENTRIES.
+ETAG_CACHE_MAX_ENTRIES = 64
+
+def _etag_cache():
+    if "etag_cache" not in st.session_state:
+        st.session_state["etag_cache"] = OrderedDict()
+    return st.session_state["etag_cache"]
+
 def api_get(url):
     try:
-        r = requests.get(url, headers=auth_headers())
+        headers = auth_headers()
+        cache = _etag_cache()
+        key = (st.session_state.get("admin_token"), url)
+        cached = cache.get(key)
+        if cached:
+            cache.move_to_end(key)
+            headers["If-None-Match"] = cached[0]
+
+        r = requests.get(url, headers=headers)
+        if r.status_code == 304 and cached:
+            return cached[1]
         if r.status_code == 200:
-            return r.json()
+            data = r.json()
+            if r.headers.get("ETag"):
+                cache[key] = (r.headers["ETag"], data)
+                cache.move_to_end(key)
+                while len(cache) > ETAG_CACHE_MAX_ENTRIES:
+                    cache.popitem(last=False)
+            return data
         st.error(r.text)
     except Exception as e:
         st.error(str(e))
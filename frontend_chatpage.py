@@ -1,7 +1,7 @@
 # chat_page.py
 import queue
 import streamlit as st
-from langgraph_mcp_backend import chatbot, submit_async_task
+from langgraph_mcp_backend import get_chatbot, load_history, submit_async_task
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
 
@@ -27,6 +27,7 @@ def render_chat_page():
     Renders the chat interface. Expects session state keys:
       - message_history (list of dicts: {'role': 'user'|'assistant', 'content': str})
       - thread_id
+      - history_before (cursor of older messages not loaded yet, or None)
     """
     st.header("💬 Chat with Lab Bot")
     st.subheader("➡ Ask questions")
@@ -37,6 +38,13 @@ def render_chat_page():
 
 
 
+    # Older messages of a long thread are loaded a page at a time
+    if st.session_state.get("history_before") and st.button("⬆ Load earlier messages"):
+        page = load_history(st.session_state.get("thread_id"), before=st.session_state["history_before"])
+        st.session_state["message_history"] = page["messages"] + st.session_state["message_history"]
+        st.session_state["history_before"] = page["before"]
+        st.rerun()
+
     # Render chat history
     for message in st.session_state.get("message_history", []):
         with st.chat_message(message["role"]):
@@ -64,6 +72,7 @@ def render_chat_page():
 
         def ai_only_stream():
             event_queue: queue.Queue = queue.Queue()
+            chatbot = get_chatbot()     # built on the first message, not at import
 
             async def run_stream():
                 try:
@@ -1,7 +1,7 @@
 # run.py
 import uuid
 import streamlit as st
-from langgraph_mcp_backend import retrieve_all_threads
+from langgraph_mcp_backend import list_threads, load_history
 
 from frontend_chatpage import render_chat_page
 from frontend.frontend_main import render_admin_panel
@@ -15,6 +15,7 @@ def reset_chat():
     st.session_state["thread_id"] = thread_id
     add_thread(thread_id)
     st.session_state["message_history"] = []
+    st.session_state["history_before"] = None
 
 def add_thread(thread_id):
     if "chat_threads" not in st.session_state:
@@ -23,7 +24,21 @@ def add_thread(thread_id):
         st.session_state["chat_threads"].append(thread_id)
 
 def load_conversation(thread_id):
-    return st.session_state.get("message_history", [])
+    """Latest page of the thread's messages; older pages are loaded by the chat page."""
+    page = load_history(thread_id)
+    st.session_state["history_before"] = page["before"]
+    return page["messages"]
+
+def load_thread_page():
+    """Next (older) page of conversations from the thread registry."""
+    threads, cursor = list_threads(cursor=st.session_state.get("threads_cursor"))
+    known = st.session_state.get("chat_threads", [])
+    older = [t["thread_id"] for t in threads[::-1] if t["thread_id"] not in known]  # chat_threads is oldest first
+    st.session_state["chat_threads"] = older + known
+    st.session_state.setdefault("thread_titles", {}).update(
+        {t["thread_id"]: t["title"] for t in threads if t["title"]}
+    )
+    st.session_state["threads_cursor"] = cursor
 
 # ---------------------- Session Initialization ----------------------
 if "message_history" not in st.session_state:
@@ -34,9 +49,10 @@ if "thread_id" not in st.session_state:
 
 if "chat_threads" not in st.session_state:
     try:
-        st.session_state["chat_threads"] = retrieve_all_threads()
+        load_thread_page()
     except Exception:
         st.session_state["chat_threads"] = []
+        st.session_state["threads_cursor"] = None
 
 add_thread(st.session_state["thread_id"])
 
@@ -51,11 +67,16 @@ if page == "Chat":
 
     st.sidebar.header("My Conversations")
 
+    titles = st.session_state.get("thread_titles", {})
     for thread_id in st.session_state["chat_threads"][::-1]:
-        if st.sidebar.button(str(thread_id)):
+        if st.sidebar.button(titles.get(str(thread_id)) or str(thread_id), key=f"thread_{thread_id}"):
             st.session_state["thread_id"] = thread_id
             st.session_state["message_history"] = load_conversation(thread_id)
 
+    if st.session_state.get("threads_cursor") and st.sidebar.button("Load older"):
+        load_thread_page()
+        st.rerun()
+
 # --------------------------- PAGE ROUTING ---------------------------
 if page == "Chat":
     render_chat_page()
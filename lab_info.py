@@ -1,26 +1,13 @@
 import os
+from typing import Dict, List, Union
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.embeddings.base import Embeddings
-import numpy as np
 
-# ==============================
-# Fake Embeddings for local testing
-# ==============================
-class FakeEmbeddings(Embeddings):
-    """Fake embeddings for local RAG testing."""
-    
-    def embed_documents(self, texts):
-        # Generate a random vector for each document
-        return [np.random.rand(1536).tolist() for _ in texts]
-
-    def embed_query(self, text):
-        # Generate a random vector for the query
-        return np.random.rand(1536).tolist()
+from backend.db_pool import db_connection
+from utils.answer_cache import answer_with_cache
+from utils.hybrid_retriever import HybridRetriever
+from utils.llm_registry import get_chat_model
+from utils.rag_index import VectorIndex
 
 # ==============================
 # Load environment variables
@@ -31,20 +18,18 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 # ==============================
 # Models
 # ==============================
-LLM = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0
-)
-
-# Use FakeEmbeddings for local testing
-EMBEDDINGS = FakeEmbeddings()
-# For real embeddings, uncomment the line below
-# EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+LLM = get_chat_model(temperature=0)
 
 # ==============================
-# In-Memory Vector Store
+# Vector Index (on disk, see utils/rag_index.py)
 # ==============================
-VECTOR_STORE = InMemoryVectorStore(embedding=EMBEDDINGS)
+# Offline hashing embeddings by default (RAG_EMBEDDINGS=google for Gemini
+# embeddings). Unchanged PDFs are loaded from rag_index/ on restart.
+VECTOR_INDEX = VectorIndex()
+
+# BM25 + vector search fused by rank (see utils/hybrid_retriever.py), over
+# the PDF chunks and the live tests, doctors and lab_schedule rows.
+RETRIEVER = HybridRetriever(VECTOR_INDEX, connection=db_connection)
 
 # ==============================
 # Prompt
@@ -69,19 +54,10 @@ PROMPT = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
 # Functions
 # ==============================
 def load_and_index_pdf(pdf_path: str):
-    print("Loading PDF...")
-    loader = PDFPlumberLoader(pdf_path)
-    documents = loader.load()
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100
-    )
-
-    chunks = splitter.split_documents(documents)
-    VECTOR_STORE.add_documents(chunks)
-
-    print(f"Indexed {len(chunks)} chunks into memory.")
+    """Index a PDF or a directory of PDFs (streamed in, resumes an interrupted ingest)."""
+    report = VECTOR_INDEX.sync([pdf_path])
+    action = "Embedded" if report["embedded"] else "Loaded"
+    print(f"{action} {report['chunks']} chunks from {pdf_path} in {report['elapsed_ms']:.0f} ms.")
 
 
 # def ask_question(question: str):
@@ -104,20 +80,40 @@ def load_and_index_pdf(pdf_path: str):
 
 #     return response.content
 
-def ask_question(question: str):
+def ask_question(question: Union[str, List[str]]):
     """
     Retrieve relevant document chunks for a query.
     No LLM call. No prints.
+    A list of queries is searched in one batch and returns one list per query.
     """
-    docs = VECTOR_STORE.similarity_search(question, k=2)
+    if isinstance(question, str):
+        return [doc["text"] for doc in RETRIEVER.search(question, k=2)]
+
+    return [[doc["text"] for doc in docs] for docs in RETRIEVER.search_many(question, k=2)]
+
+
+def _generate_answer(question: str, chunks: List[str]) -> str:
+    chain = PROMPT | LLM
+    response = chain.invoke({
+        "question": question,
+        "context": "\n\n".join(chunks)
+    })
+    return response.text
 
-    return [doc.page_content for doc in docs]
+
+def answer_question(question: str) -> Dict:
+    """
+    Answer a general lab question from the retrieved chunks with one LLM
+    call, cached (exact and near-duplicate questions, see utils/answer_cache.py).
+    Returns {answer, chunks, cache}.
+    """
+    return answer_with_cache(question, RETRIEVER, _generate_answer, k=2)
 
 
 # ==============================
 # PDF Loading - moved outside __main__
 # ==============================
-pdf_path = "lab_info.pdf"  # directly use the PDF
+pdf_path = os.getenv("LAB_INFO_PATH", "lab_info.pdf")  # a PDF or a directory of PDFs
 load_and_index_pdf(pdf_path)
 
 # ==============================
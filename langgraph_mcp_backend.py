@@ -1,23 +1,26 @@
-from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_core.tools import tool, BaseTool
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
-import aiosqlite
-import requests
 import asyncio
+import os
 import threading
+import time
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
 
 load_dotenv()
 
+# Everything heavy (LLM client, MCP tools, checkpointer, compiled graph) is
+# built on first use, so importing this module stays cheap for Streamlit:
+#   get_chatbot()          graph with LLM + tools + checkpointer
+#   get_checkpointer()     checkpointer only
+#   list_threads()         sidebar page of conversations (checkpointer only)
+#   load_history()         page of one conversation's messages (checkpointer only)
+#   readiness()            which components are initialized
+# `chatbot`, `checkpointer`, `llm` and `tools` still work as module
+# attributes (built on access).
+
 # Dedicated async loop for backend tasks
 _ASYNC_LOOP = asyncio.new_event_loop()
 _ASYNC_THREAD = threading.Thread(target=_ASYNC_LOOP.run_forever, daemon=True)
@@ -37,42 +40,148 @@ def submit_async_task(coro):
     return _submit_async(coro)
 
 
+_INIT_LOCK = threading.RLock()
+_COMPONENTS = {"llm": None, "tools": None, "checkpointer": None, "chatbot": None}
+
+
 # -------------------
 # 1. LLM
 # -------------------
-# llm = ChatOpenAI()
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
-# llm = ChatOpenAI(model="gpt-3.5-turbo")
-
+# shared, instrumented client (utils/llm_registry.py); model from LLM_MODEL
 # gemini-2.5-pro
 # gemini-2.5-flash
+# gpt-3.5-turbo
+def get_llm():
+    if _COMPONENTS["llm"] is None:
+        from utils.llm_registry import get_chat_model
 
-client = MultiServerMCPClient({
-        "LocalLabTools": {"url": "http://127.0.0.1:8005/mcp", "transport": "streamable_http"}
+        with _INIT_LOCK:
+            if _COMPONENTS["llm"] is None:
+                _COMPONENTS["llm"] = get_chat_model()
+    return _COMPONENTS["llm"]
+
+
+# -------------------
+# 2. Tools
+# -------------------
+# LAB_TOOL_MODE=mcp    tools from the MCP server over streamable HTTP (default)
+# LAB_TOOL_MODE=local  the same tools called in this process (single-box
+#                      deployments): same names, descriptions, input schemas
+#                      and JSON output, no HTTP hop and no second process
+TOOL_MODE = os.getenv("LAB_TOOL_MODE", "mcp")
+MCP_URL = os.getenv("MCP_URL", "http://127.0.0.1:8005/mcp")
+
+# Discovery is retried with exponential backoff. If the server is still
+# down, the chat runs without tools. The first use after TOOL_RETRY_INTERVAL
+# seconds starts another discovery round in a background thread; chat turns
+# keep running on the tool-less graph meanwhile, and the graph is rebuilt
+# with the tools once the round succeeds.
+TOOL_DISCOVERY_ATTEMPTS = int(os.getenv("TOOL_DISCOVERY_ATTEMPTS", "3"))
+TOOL_DISCOVERY_BACKOFF = float(os.getenv("TOOL_DISCOVERY_BACKOFF", "0.5"))
+TOOL_RETRY_INTERVAL = float(os.getenv("TOOL_RETRY_INTERVAL", "30"))
+
+_DISCOVERY = {"attempts": 0, "last_error": None, "retry_at": 0.0, "retrying": False}
+
+
+def load_mcp_tools() -> list["BaseTool"]:
+    """Tools from the MCP server. Raises when it cannot be reached."""
+    from langchain_mcp_adapters.client import MultiServerMCPClient
+
+    client = MultiServerMCPClient({
+        "LocalLabTools": {"url": MCP_URL, "transport": "streamable_http"}
     })
+    return run_async(client.get_tools())
+
+
+def _local_tool(mcp_tool) -> "BaseTool":
+    """LangChain tool running an MCP server tool in-process (fastmcp validation + serialization)."""
+    from langchain_core.tools import StructuredTool
+
+    async def call(**arguments):
+        result = await mcp_tool.run(arguments)
+        text = "\n".join(block.text for block in result.content if getattr(block, "text", None) is not None)
+        return text, result.structured_content
+
+    return StructuredTool(
+        name=mcp_tool.name,
+        description=mcp_tool.description or "",
+        args_schema=mcp_tool.parameters,
+        coroutine=call,
+        response_format="content_and_artifact",
+    )
+
+
+def load_local_tools() -> list["BaseTool"]:
+    from backend.db_table import init_db
+    from server import mcp as lab_mcp
+
+    init_db()
+    return [_local_tool(t) for t in run_async(lab_mcp.list_tools())]
+
+
+def load_tools() -> list["BaseTool"]:
+    if TOOL_MODE == "local":
+        return load_local_tools()
+    return load_mcp_tools()
 
-def load_mcp_tools() -> list[BaseTool]:
-    try:
-        return run_async(client.get_tools())
-    except Exception:
-        return []
 
+def _discovery_round() -> list["BaseTool"]:
+    """TOOL_DISCOVERY_ATTEMPTS tries with exponential backoff; [] when all fail."""
+    delay = TOOL_DISCOVERY_BACKOFF
+    for attempt in range(TOOL_DISCOVERY_ATTEMPTS):
+        _DISCOVERY["attempts"] += 1
+        try:
+            tools = load_tools()
+            _DISCOVERY["last_error"] = None if tools else "server returned no tools"
+            if tools:
+                return tools
+        except Exception as e:
+            _DISCOVERY["last_error"] = f"{type(e).__name__}: {e}"
+        if attempt < TOOL_DISCOVERY_ATTEMPTS - 1:
+            time.sleep(delay)
+            delay *= 2
 
-mcp_tools = load_mcp_tools()
+    _DISCOVERY["retry_at"] = time.time() + TOOL_RETRY_INTERVAL
+    print(f"[backend] no tools from {TOOL_MODE} ({_DISCOVERY['last_error']}); "
+          f"retrying after {TOOL_RETRY_INTERVAL:g}s")
+    return []
+
+
+def _retry_discovery():
+    """Background discovery round (outside _INIT_LOCK); swaps in a graph with the tools on success."""
+    try:
+        tools = _discovery_round()
+        if tools:
+            with _INIT_LOCK:
+                _COMPONENTS["tools"] = tools
+                if _COMPONENTS["chatbot"] is not None:
+                    _COMPONENTS["chatbot"] = _build_graph(get_llm(), tools, get_checkpointer())
+    finally:
+        _DISCOVERY["retrying"] = False
+
+
+def discover_tools() -> list["BaseTool"]:
+    """
+    Cached tool list. The first call discovers (and waits for it). An empty
+    result is not cached for good: the first call after TOOL_RETRY_INTERVAL
+    starts a retry in the background and returns the empty list right away.
+    """
+    if _COMPONENTS["tools"]:
+        return _COMPONENTS["tools"]
+    with _INIT_LOCK:
+        if _COMPONENTS["tools"] is None:
+            _COMPONENTS["tools"] = _discovery_round()
+        elif (not _COMPONENTS["tools"] and not _DISCOVERY["retrying"]
+              and time.time() >= _DISCOVERY["retry_at"]):
+            _DISCOVERY["retrying"] = True
+            threading.Thread(target=_retry_discovery, name="tool-discovery", daemon=True).start()
+        return _COMPONENTS["tools"]
 
-# tools = [search_tool, get_stock_price, *mcp_tools]
-tools = [*mcp_tools]
-llm_with_tools = llm.bind_tools(tools) if tools else llm
 
 # -------------------
 # 3. State
 # -------------------
-class ChatState(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
-
-
-SYSTEM_PROMPT = SystemMessage(
-    content="""
+SYSTEM_PROMPT_TEXT = """
 You are a lab booking assistant.
 
 CRITICAL RULES:
@@ -85,62 +194,161 @@ CRITICAL RULES:
 - DO NOT call start_booking_tool until all required information is present.
 - Combine information across multiple user messages.
 - start_booking_tool should be called only once per booking flow.
+- For general questions about the lab (timings, holidays, tests, doctors),
+  call rag_retrieval_tool and reply with its answer (or from its chunks
+  when the answer is empty).
 """
-)
-
 
 
 # -------------------
-# 4. Nodes
+# 4. Checkpointer
 # -------------------
-async def chat_node(state: ChatState):
-    """LLM node that may answer or request a tool call."""
-    # messages = state["messages"]
-    messages = [SYSTEM_PROMPT] + state["messages"]
-
-    response = await llm_with_tools.ainvoke(messages)
-    return {"messages": [response]}
+# ThreadRegistrySaver = AsyncSqliteSaver + the threads table used by the
+# sidebar (utils/thread_registry.py). Old checkpoints are trimmed in the
+# background (utils/chat_compaction.py, CHAT_COMPACTION_INTERVAL).
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "chatbot.db")
 
 
-tool_node = ToolNode(tools) if tools else None
+async def _init_checkpointer():
+    import aiosqlite
+    from utils.thread_registry import ThreadRegistrySaver
 
-# -------------------
-# 5. Checkpointer
-# -------------------
+    conn = await aiosqlite.connect(database=CHAT_DB_PATH)
+    # only takes effect on a new file; convert an existing one offline with
+    # python -m utils.chat_compaction --convert (a full VACUUM)
+    await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    return ThreadRegistrySaver(conn)
 
 
-async def _init_checkpointer():
-    conn = await aiosqlite.connect(database="chatbot.db")
-    return AsyncSqliteSaver(conn)
+def get_checkpointer():
+    if _COMPONENTS["checkpointer"] is None:
+        from utils.chat_compaction import start_background_compaction
 
+        with _INIT_LOCK:
+            if _COMPONENTS["checkpointer"] is None:
+                _COMPONENTS["checkpointer"] = run_async(_init_checkpointer())
+                start_background_compaction(CHAT_DB_PATH)
+    return _COMPONENTS["checkpointer"]
 
-checkpointer = run_async(_init_checkpointer())
 
 # -------------------
-# 6. Graph
+# 5. Graph
 # -------------------
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_edge(START, "chat_node")
-
-if tool_node:
-    graph.add_node("tools", tool_node)
-    graph.add_conditional_edges("chat_node", tools_condition)
-    graph.add_edge("tools", "chat_node")
-else:
-    graph.add_edge("chat_node", END)
+def _build_graph(llm, tools, checkpointer):
+    from typing import Annotated, TypedDict
+
+    from langchain_core.messages import BaseMessage
+    from langgraph.graph import StateGraph, START, END
+    from langgraph.graph.message import add_messages
+    from langgraph.prebuilt import ToolNode, tools_condition
+
+    from utils.chat_context import build_prompt, record_turn
+
+    class ChatState(TypedDict):
+        messages: Annotated[list[BaseMessage], add_messages]
+
+    llm_with_tools = llm.bind_tools(tools) if tools else llm
+
+    async def chat_node(state: ChatState):
+        """LLM node that may answer or request a tool call."""
+        # recent turns verbatim, older ones summarized, within CHAT_TOKEN_BUDGET
+        messages, report = build_prompt(SYSTEM_PROMPT_TEXT, state["messages"])
+
+        response = await llm_with_tools.ainvoke(messages)
+
+        report["input_tokens"] = (response.usage_metadata or {}).get("input_tokens")
+        record_turn(report)
+        return {"messages": [response]}
+
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_edge(START, "chat_node")
+
+    if tools:
+        graph.add_node("tools", ToolNode(tools))
+        graph.add_conditional_edges("chat_node", tools_condition)
+        graph.add_edge("tools", "chat_node")
+    else:
+        graph.add_edge("chat_node", END)
+
+    return graph.compile(checkpointer=checkpointer)
+
+
+def get_chatbot():
+    """
+    Compiled graph, built on first use. Built without tools while the MCP
+    server is unreachable; a background retry swaps in a graph with tools,
+    so a chat turn never waits for discovery after the first one.
+    Call from a normal thread, not from a coroutine on the backend loop.
+    """
+    with _INIT_LOCK:
+        tools = discover_tools()
+        if _COMPONENTS["chatbot"] is None:
+            _COMPONENTS["chatbot"] = _build_graph(get_llm(), tools, get_checkpointer())
+        return _COMPONENTS["chatbot"]
+
+
+def readiness():
+    """Which components are initialized (nothing is built by asking)."""
+    tools = _COMPONENTS["tools"]
+    return {
+        "ready": _COMPONENTS["chatbot"] is not None and bool(tools),
+        "llm": _COMPONENTS["llm"] is not None,
+        "checkpointer": _COMPONENTS["checkpointer"] is not None,
+        "graph": _COMPONENTS["chatbot"] is not None,
+        "tool_mode": TOOL_MODE,
+        "tools": None if tools is None else [t.name for t in tools],
+        "tool_discovery_attempts": _DISCOVERY["attempts"],
+        "tool_discovery_error": _DISCOVERY["last_error"],
+        "tool_discovery_retrying": _DISCOVERY["retrying"],
+    }
+
+
+def __getattr__(name):
+    # module attributes of the eager version, built on first access
+    if name == "chatbot":
+        return get_chatbot()
+    if name == "checkpointer":
+        return get_checkpointer()
+    if name == "llm":
+        return get_llm()
+    if name == "tools":
+        return discover_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-chatbot = graph.compile(checkpointer=checkpointer)
 
 # -------------------
-# 7. Helper
+# 6. Helper
 # -------------------
-async def _alist_threads():
-    all_threads = set()
-    async for checkpoint in checkpointer.alist(None):
-        all_threads.add(checkpoint.config["configurable"]["thread_id"])
-    return list(all_threads)
+def list_threads(limit=None, cursor=None):
+    """
+    One page of conversations, most recent first: (threads, next_cursor).
+    Each thread has thread_id, title, created_at, last_activity, message_count.
+    """
+    from utils.thread_registry import THREADS_PAGE_SIZE
+
+    return run_async(get_checkpointer().alist_threads(limit or THREADS_PAGE_SIZE, cursor))
+
+
+def load_history(thread_id, limit=None, before=None):
+    """
+    One page of a thread's messages for the chat page (last page first):
+    {messages, before, checkpoint_id, total}; pass `before` back for older ones.
+    """
+    from utils.chat_history import load_history as aload_history
+
+    return run_async(aload_history(get_checkpointer(), thread_id, limit, before))
+
+
+async def _alist_threads(checkpointer):
+    all_threads, cursor = [], None
+    while True:
+        page, cursor = await checkpointer.alist_threads(1000, cursor)
+        all_threads.extend(t["thread_id"] for t in page)
+        if cursor is None:
+            return all_threads
 
 
 def retrieve_all_threads():
-    return run_async(_alist_threads())
+    """Every thread id, oldest activity first (prefer list_threads for the UI)."""
+    return run_async(_alist_threads(get_checkpointer()))[::-1]
@@ -1,37 +1,84 @@
-import sqlite3
-import uuid
+import argparse
+import asyncio
+import os
+import threading
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any
 from fastapi import HTTPException
 from fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from backend.crud_backend import (
-    get_available_slots,
+    get_available_slots_internal,
     create_booking_internal,
     Booking
 )
+from backend.db_pool import db_connection
+from backend.db_table import init_db
+from backend.db_executor import BoundedExecutor
 
 from utils.helper_booking import get_test_info, parse_window_selection          # test + date + patient info parser
-# from lab_info import ask_question
-
-DB_PATH = "lab_system.db"
+from utils.context_store import get_context_store                              # booking flows (TTL + size cap)
+from utils.answer_cache import get_answer_cache                                # rag_retrieval_tool answers
 
 # -------------------------------------------------
 # MCP SERVER
 # -------------------------------------------------
 mcp = FastMCP("LocalLabTools")
 
+# -------------------------------------------------
+# BLOCKING WORK
+# -------------------------------------------------
+# Tool bodies call the LLM (get_test_info fallback) and sqlite synchronously.
+# They run on a bounded thread pool so the event loop keeps serving other
+# chat sessions; when the pool and its queue are full the tool answers
+# "busy" right away.
+TOOL_WORKERS = int(os.getenv("MCP_TOOL_WORKERS", "16"))
+TOOL_MAX_PENDING = int(os.getenv("MCP_TOOL_MAX_PENDING", "256"))
+
+_TOOL_EXECUTOR = None
+_TOOL_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_tool_executor() -> BoundedExecutor:
+    global _TOOL_EXECUTOR
+    if _TOOL_EXECUTOR is None:
+        with _TOOL_EXECUTOR_LOCK:
+            if _TOOL_EXECUTOR is None:
+                _TOOL_EXECUTOR = BoundedExecutor(TOOL_WORKERS, TOOL_MAX_PENDING, "mcp-tool")
+    return _TOOL_EXECUTOR
+
+
+async def run_blocking(fn, *args) -> Dict[str, Any]:
+    try:
+        return await asyncio.wrap_future(get_tool_executor().submit(fn, *args))
+    except HTTPException as e:
+        return {"status": "error", "message": e.detail}
+
+
 # -------------------------------------------------
 # TOOL 1: CHECK AVAILABLE SLOTS (READ-ONLY)
 # -------------------------------------------------
 
-import uuid
+def _window_list(windows):
+    return [
+        {
+            "window_no": i + 1,
+            "time": f"{w['window_start']} - {w['window_end']}",
+            "available": w["available_slots"]
+        }
+        for i, w in enumerate(windows)
+    ]
 
-BOOKING_CONTEXT = {}
 
 @mcp.tool()
 async def start_booking_tool(query: str) -> Dict[str, Any]:
     """Fetch windows and initialize booking context"""
+    return await run_blocking(start_booking, query)
+
+
+def start_booking(query: str) -> Dict[str, Any]:
     result = get_test_info(query)
     if "error" in result:
         return result
@@ -39,30 +86,21 @@ async def start_booking_tool(query: str) -> Dict[str, Any]:
     test_id = result["test_id"]
     booking_date = result["date_str"]
 
-    windows = get_available_slots(test_id, booking_date)
+    windows = get_available_slots_internal(test_id, booking_date)
     if not windows:
         return {"status": "no_windows"}
 
-    context_id = str(uuid.uuid4())
-
-    BOOKING_CONTEXT[context_id] = {
+    context_id = get_context_store().create({
         "test_id": test_id,
         "test_name": result["test_name"],
         "booking_date": booking_date,
         "windows": windows
-    }
+    })
 
     return {
         "status": "awaiting_window_selection",
         "context_id": context_id,
-        "windows": [
-            {
-                "window_no": i + 1,
-                "time": f"{w['window_start']} - {w['window_end']}",
-                "available": w["available_slots"]
-            }
-            for i, w in enumerate(windows)
-        ]
+        "windows": _window_list(windows)
     }
 
 
@@ -75,19 +113,48 @@ async def create_booking_tool(
     confirm: bool = False
 ) -> Dict[str, Any]:
     """Finalize booking for selected window"""
-    context = BOOKING_CONTEXT.get(context_id)
+    return await run_blocking(
+        create_booking, context_id, window_selection, patient_name, patient_mobile, confirm
+    )
+
+
+def create_booking(
+    context_id: str,
+    window_selection: str,
+    patient_name: str,
+    patient_mobile: str,
+    confirm: bool = False
+) -> Dict[str, Any]:
+    store = get_context_store()
+    context = store.get(context_id)
     if not context:
         return {"status": "error", "message": "Booking context expired"}
 
     windows = context["windows"]
 
-    # Parse window dynamically
+    # Parse window dynamically (numbers refer to the list the user was shown)
     try:
         window_no = parse_window_selection(window_selection, windows)
     except ValueError:
         return {"status": "error", "message": "Invalid window selection"}
 
-    selected_window = windows[window_no - 1]
+    # Revalidate: the cached list may be minutes old
+    current = get_available_slots_internal(context["test_id"], context["booking_date"])
+    selected_window = next(
+        (w for w in current if w["window_id"] == windows[window_no - 1]["window_id"]),
+        None
+    )
+    if not selected_window or selected_window["available_slots"] <= 0:
+        context["windows"] = current
+        store.save(context_id, context)
+        if not current:
+            return {"status": "no_windows", "message": "No windows are available on this date anymore"}
+        return {
+            "status": "awaiting_window_selection",
+            "message": "The selected window is no longer available, please choose again",
+            "context_id": context_id,
+            "windows": _window_list(current)
+        }
 
     if not confirm:
         return {
@@ -109,9 +176,14 @@ async def create_booking_tool(
         booking_date=datetime.strptime(context["booking_date"], "%Y-%m-%d").date(),
       )
 
-    result = create_booking_internal(booking)
+    try:
+        with db_connection() as conn:
+            result = create_booking_internal(booking, conn)
+    except HTTPException as e:
+        # e.g. the window filled up between the check above and the insert
+        return {"status": "error", "message": e.detail}
 
-    BOOKING_CONTEXT.pop(context_id, None)  # cleanup
+    store.delete(context_id)  # cleanup
 
     return {
         "status": "success",
@@ -120,40 +192,88 @@ async def create_booking_tool(
     }
 
 
-# @mcp.tool()
-# async def rag_retrieval_tool(query: str) -> Dict[str, Any]:
-#     """
-#     Retrieve relevant lab information for general user questions.
+# -------------------------------------------------
+# TOOL 3: GENERAL LAB QUESTIONS (RAG)
+# -------------------------------------------------
+# lab_info (PDF + table index, LLM) is imported on the first question, so
+# booking-only workers never load it. Answers are cached, see
+# utils/answer_cache.py; hit rates are served at GET /stats.
 
-#     This tool is used only for general, non-booking queries about the lab
-#     (e.g. lab timings, holidays, tests, doctors, services).
-#     It does NOT handle appointments, dates, or slot availability.
-#     """
+@mcp.tool()
+async def rag_retrieval_tool(query: str) -> Dict[str, Any]:
+    """
+    Retrieve relevant lab information for general user questions.
 
-#     retrieved_chunks = ask_question(query)
+    This tool is used only for general, non-booking queries about the lab
+    (e.g. lab timings, holidays, tests, doctors, services).
+    It does NOT handle appointments, dates, or slot availability.
+    """
+    return await run_blocking(rag_retrieval, query)
 
-#     context_id = str(uuid.uuid4())
-#     RAG_CONTEXT = {}
-#     RAG_CONTEXT[context_id] = {
-#         "query": query,
-#         "chunks": retrieved_chunks
-#     }
 
-#     return {
-#         "status": "success",
-#         "context_id": context_id,
-#         "chunks": retrieved_chunks
-#     }
+def rag_retrieval(query: str) -> Dict[str, Any]:
+    from lab_info import answer_question, ask_question
+
+    try:
+        result = answer_question(query)
+    except Exception as e:
+        # LLM unavailable: the chat model can still answer from the chunks
+        print(f"[rag_retrieval_tool] answer failed: {e}")
+        return {"status": "success", "answer": None, "chunks": ask_question(query), "cache": "error"}
+    return {
+        "status": "success",
+        "answer": result["answer"],
+        "chunks": result["chunks"],
+        "cache": result["cache"]
+    }
+
+
+@mcp.custom_route("/stats", methods=["GET"])
+async def stats_route(request: Request) -> JSONResponse:
+    """Answer cache and booking context store counters (this worker)."""
+    return JSONResponse({
+        "answer_cache": get_answer_cache().stats(),
+        "booking_contexts": get_context_store().stats()
+    })
 
 
 # ==============================
 # Run MCP Server
 # ==============================
-def run_server():
-    print("🚀 MCP Local Lab Server running on http://127.0.0.1:8005/mcp")
-    mcp.run(transport="streamable-http", host="127.0.0.1", port=8005)
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "8005"))
+
+
+def create_app():
+    """
+    ASGI app for multi-worker mode (uvicorn factory). Stateless HTTP: every
+    request stands alone, so any worker can serve any chat session; booking
+    contexts live in the shared SQLite store.
+    """
+    init_db()
+    return mcp.http_app(transport="streamable-http", stateless_http=True)
+
+
+def run_server(workers: int = 1, host: str = MCP_HOST, port: int = MCP_PORT):
+    print(f"🚀 MCP Local Lab Server running on http://{host}:{port}/mcp ({workers} worker(s))")
+    if workers <= 1:
+        init_db()   # the tools read ref_generations / window_capacity
+        mcp.run(transport="streamable-http", host=host, port=port)
+        return
+
+    import uvicorn
+
+    # worker processes inherit the environment: share booking contexts through the DB
+    os.environ.setdefault("BOOKING_CONTEXT_STORE", "sqlite")
+    uvicorn.run("server:create_app", factory=True, host=host, port=port, workers=workers)
+
 
 if __name__ == "__main__":
-    run_server()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MCP_WORKERS", "1")))
+    parser.add_argument("--host", default=MCP_HOST)
+    parser.add_argument("--port", type=int, default=MCP_PORT)
+    args = parser.parse_args()
+    run_server(args.workers, args.host, args.port)
 
 
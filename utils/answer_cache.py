@@ -0,0 +1,186 @@
+# -------------------------------
+# RAG ANSWER CACHE
+# -------------------------------
+# rag_retrieval_tool answers general questions ("what are your timings?")
+# that many users ask again and again, each answer costing a retrieval and
+# an LLM call. Two cache levels in front of them:
+#
+#   exact      the normalized question (lowercase, punctuation and extra
+#              spaces dropped) -> answer, LRU of ANSWER_CACHE_ENTRIES.
+#              A hit costs no embedding, retrieval or LLM call.
+#   semantic   after retrieval: a cached answer is reused when its question
+#              embeds within SEMANTIC_CACHE_THRESHOLD (cosine) of this one,
+#              was answered from the same retrieved chunks, and names the
+#              same key terms (question words found in those chunks,
+#              stopwords aside). A hit saves the LLM call. Embeddings alone
+#              rate "is the lab open on Sunday?" and "... on Saturday?" as
+#              near-identical, and one PDF chunk answers "who handles the
+#              CBC?" as well as "who handles the Lipid Profile?"; the key
+#              terms tell them apart.
+#
+# Invalidation: every answer is tagged with the retriever's version (the
+# digests of the indexed PDFs and the ref_generations of the indexed
+# tables). When it moves, both levels are dropped.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from utils.keyword_search import tokenize
+
+ANSWER_CACHE_ENTRIES = int(os.getenv("ANSWER_CACHE_ENTRIES", "1024"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.75"))
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+STOPWORDS = frozenset("""
+    a an and are at can could do does for from hi hello how i in is it lab me my of on or please
+    tell the there this to what when where which who whom whose why will with would you your
+""".split())
+
+
+def semantic_key(question: str, chunks: List[str]) -> str:
+    """
+    Fingerprint of the retrieved chunks (order does not matter) and the
+    question's key terms: only answers with the same key are compared.
+    """
+    context_terms = set(tokenize(" ".join(chunks)))
+    terms = sorted({t for t in tokenize(question) if t in context_terms and t not in STOPWORDS})
+    digest = hashlib.sha256()
+    for chunk in sorted(chunks):
+        digest.update(chunk.encode())
+        digest.update(b"\0")
+    digest.update(" ".join(terms).encode())
+    return digest.hexdigest()
+
+
+class CachedAnswer:
+    __slots__ = ("answer", "chunks", "vector", "key")
+
+    def __init__(self, answer, chunks, vector, key):
+        self.answer = answer
+        self.chunks = chunks
+        self.vector = vector
+        self.key = key
+
+
+class AnswerCache:
+    def __init__(self, max_entries=ANSWER_CACHE_ENTRIES, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()       # normalized question -> CachedAnswer
+        self._by_key = {}                   # semantic key -> {normalized question}
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    def check_version(self, version):
+        """Drop everything when the indexed sources changed. Returns the version to tag answers with."""
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self._by_key.clear()
+                self._version = version
+        return version
+
+    def get_exact(self, question):
+        with self._lock:
+            entry = self._entries.get(question)
+            if entry is not None:
+                self._entries.move_to_end(question)
+                self._stats["exact_hits"] += 1
+            return entry
+
+    def get_similar(self, vector, key):
+        """Best cached answer with the same semantic key within the threshold, or None (counted as a miss)."""
+        with self._lock:
+            questions = list(self._by_key.get(key, ()))
+            if questions:
+                vectors = np.stack([self._entries[q].vector for q in questions])
+                scores = vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(questions[best])
+                    self._stats["semantic_hits"] += 1
+                    return self._entries[questions[best]]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, question, entry, version):
+        with self._lock:
+            if version != self._version:
+                return      # sources changed while this was being answered
+            self._discard(question)
+            self._entries[question] = entry
+            self._by_key.setdefault(entry.key, set()).add(question)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, question):
+        entry = self._entries.pop(question, None)
+        if entry is not None:
+            questions = self._by_key[entry.key]
+            questions.discard(question)
+            if not questions:
+                del self._by_key[entry.key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        return {
+            **stats,
+            "lookups": lookups,
+            "exact_hit_ratio": round(stats["exact_hits"] / lookups, 3) if lookups else None,
+            "semantic_hit_ratio": round(stats["semantic_hits"] / lookups, 3) if lookups else None,
+            "hit_ratio": round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 3) if lookups else None,
+            "size": size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+        }
+
+
+_CACHE = AnswerCache()
+
+
+def get_answer_cache() -> AnswerCache:
+    return _CACHE
+
+
+def answer_with_cache(question: str, retriever, generate: Callable[[str, List[str]], str],
+                      k: int = 2, cache: AnswerCache = None) -> Dict:
+    """
+    Answer `question` from the retriever's top-k chunks, generate(question,
+    chunks) being the LLM call. Returns {answer, chunks, cache} with cache
+    "exact", "semantic" or "miss".
+    """
+    cache = cache or _CACHE
+    version = cache.check_version(retriever.version())
+    normalized = normalize_question(question)
+
+    entry = cache.get_exact(normalized)
+    if entry is not None:
+        return {"answer": entry.answer, "chunks": entry.chunks, "cache": "exact"}
+
+    vectors = retriever.vector_index.embeddings.embed_array([question])
+    chunks = [doc["text"] for doc in retriever.search_many([question], k=k, vectors=vectors)[0]]
+    key = semantic_key(question, chunks)
+
+    entry = cache.get_similar(vectors[0], key)
+    if entry is not None:
+        cache.put(normalized, CachedAnswer(entry.answer, chunks, vectors[0], key), version)
+        return {"answer": entry.answer, "chunks": chunks, "cache": "semantic"}
+
+    answer = generate(question, chunks)
+    cache.put(normalized, CachedAnswer(answer, chunks, vectors[0], key), version)
+    return {"answer": answer, "chunks": chunks, "cache": "miss"}
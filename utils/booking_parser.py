@@ -0,0 +1,211 @@
+# -------------------------------
+# LOCAL BOOKING QUERY PARSER
+# -------------------------------
+# Deterministic extraction of test name, date, patient name and mobile
+# number from a chatbot booking query. get_test_info runs this first and
+# only asks the LLM when the test or the date could not be found with
+# enough confidence.
+#
+#   - mobile: regex (Pakistani 03xx / +92 3xx numbers, other 10-13 digit runs)
+#   - date:   ISO dates; numeric / month-name dates via dateparser;
+#             weekdays and today / tomorrow / in N days computed locally
+#   - test:   rapidfuzz over word n-grams of the query against the DB test names
+#   - name:   regex after "for", "name is", "patient", "I am", ...
+
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import dateparser
+from rapidfuzz import fuzz, process, utils as fuzz_utils
+
+TEST_MATCH_THRESHOLD = 85   # rapidfuzz score (0-100) accepted without the LLM
+TEST_MATCH_MARGIN = 5       # best must beat the runner-up test by this much
+
+DATEPARSER_SETTINGS = {
+    "PREFER_DATES_FROM": "future",
+    "DATE_ORDER": "DMY",
+    "RETURN_AS_TIMEZONE_AWARE": False,
+}
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+
+MOBILE_RE = re.compile(r"(?<!\d)(?:\+?92[\s-]?|0)3\d{2}[\s-]?\d{7}(?!\d)|(?<!\d)\+?\d{10,13}(?!\d)")
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_DATE_RE = re.compile(r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b")
+MONTH_DATE_RE = re.compile(
+    rf"\b(?:\d{{1,2}}(?:st|nd|rd|th)?(?:\s+of)?\s+(?:{MONTHS})\.?|(?:{MONTHS})\.?\s+\d{{1,2}}(?:st|nd|rd|th)?)(?:,?\s+\d{{4}})?\b",
+    re.IGNORECASE
+)
+RELATIVE_DATE_RE = re.compile(
+    r"\b(?:(?:the\s+)?day\s+after\s+tomorrow|today|tomorrow|tmrw|tonight"
+    r"|in\s+\d+\s+(?:days?|weeks?)"
+    rf"|(?:(?:next|this|coming)\s+)?(?:{'|'.join(WEEKDAYS)}))\b",
+    re.IGNORECASE
+)
+
+NAME_RE = re.compile(
+    r"\b(?:my\s+name\s+is|name\s*(?:is|:)|patient(?:\s+name)?\s*(?:is|:)?|i\s+am|i'm|this\s+is|for)\s+"
+    r"([a-z][a-z.'-]*(?:\s+[a-z][a-z.'-]*){0,3})",
+    re.IGNORECASE
+)
+# words that end a name ("for Ali on Monday", "for Sara mobile 0300...")
+NAME_STOPWORDS = {
+    "a", "an", "and", "at", "book", "booking", "by", "cell", "contact", "date", "for", "from",
+    "in", "is", "me", "mob", "mobile", "my", "next", "no", "number", "of", "on", "phone",
+    "please", "pls", "slot", "test", "the", "this", "to", "today", "tomorrow", "with",
+    *WEEKDAYS,
+}
+
+
+# -------------------------------
+# Mobile
+# -------------------------------
+def extract_mobile(query: str):
+    """(digits, span) of the first phone number, or (None, None)."""
+    match = MOBILE_RE.search(query)
+    if not match:
+        return None, None
+    return re.sub(r"\D", "", match.group(0)), match.span()
+
+
+# -------------------------------
+# Date
+# -------------------------------
+RELATIVE_DAYS = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1}
+
+
+def _relative_date(phrase: str, today: date) -> date:
+    """Dates for RELATIVE_DATE_RE matches, without dateparser."""
+    words = phrase.lower().split()
+    if words[-1] in WEEKDAYS:
+        ahead = (WEEKDAYS.index(words[-1]) - today.weekday()) % 7
+        if ahead == 0 and words[0] in ("next", "coming"):
+            ahead = 7
+        return today + timedelta(days=ahead)
+    if words[0] == "in":
+        unit = 7 if words[2].startswith("week") else 1
+        return today + timedelta(days=int(words[1]) * unit)
+    if words[-1] == "tomorrow" and "after" in words:
+        return today + timedelta(days=2)
+    return today + timedelta(days=RELATIVE_DAYS[words[-1]])
+
+
+def extract_date(query: str, today: Optional[date] = None):
+    """(YYYY-MM-DD, span) of the first date in the query, or (None, None)."""
+    today = today or date.today()
+
+    match = ISO_DATE_RE.search(query)
+    if match:
+        try:
+            return date(*map(int, match.groups())).isoformat(), match.span()
+        except ValueError:
+            pass
+
+    # "future" is strictly after the base: a yearless "18 October" on 18 October is today
+    base = datetime.combine(today - timedelta(days=1), datetime.min.time())
+    for pattern in (NUMERIC_DATE_RE, MONTH_DATE_RE):
+        match = pattern.search(query)
+        if not match:
+            continue
+        parsed = dateparser.parse(
+            match.group(0),
+            languages=["en"],
+            settings={**DATEPARSER_SETTINGS, "RELATIVE_BASE": base}
+        )
+        if parsed:
+            return parsed.date().isoformat(), match.span()
+
+    match = RELATIVE_DATE_RE.search(query)
+    if match:
+        return _relative_date(match.group(0), today).isoformat(), match.span()
+    return None, None
+
+
+# -------------------------------
+# Test name
+# -------------------------------
+def _ngrams(words, max_len):
+    for size in range(1, max_len + 1):
+        for i in range(len(words) - size + 1):
+            yield " ".join(words[i:i + size])
+
+
+def match_test_name(query: str, test_names: Iterable[str]):
+    """
+    (test_name, score, ambiguous) for the DB test that best matches some
+    word n-gram of the query. Case, punctuation and small typos are ignored.
+    """
+    choices = {fuzz_utils.default_process(name): name for name in test_names}
+    choices.pop("", None)
+    if not choices:
+        return None, 0, False
+
+    words = fuzz_utils.default_process(query).split()
+    max_len = max(len(c.split()) for c in choices) + 1
+    best = {}
+    for gram in _ngrams(words, max_len):
+        for choice, score, _ in process.extract(gram, list(choices), scorer=fuzz.ratio, limit=2):
+            if score > best.get(choice, 0):
+                best[choice] = score
+
+    if not best:
+        return None, 0, False
+    ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+    choice, score = ranked[0]
+    ambiguous = len(ranked) > 1 and score - ranked[1][1] < TEST_MATCH_MARGIN
+    return choices[choice], score, ambiguous
+
+
+# -------------------------------
+# Patient name
+# -------------------------------
+def extract_patient_name(query: str) -> Optional[str]:
+    for match in NAME_RE.finditer(query):
+        words = []
+        for word in match.group(1).split():
+            if word.lower().strip(".") in NAME_STOPWORDS:
+                break
+            words.append(word)
+        if words:
+            return " ".join(w.capitalize() if w.islower() else w for w in words)
+    return None
+
+
+def _mask(text: str, span) -> str:
+    if not span:
+        return text
+    return text[:span[0]] + " " * (span[1] - span[0]) + text[span[1]:]
+
+
+# -------------------------------
+# Pipeline
+# -------------------------------
+def parse_booking_query(query: str, test_names: Iterable[str], today: Optional[date] = None) -> Dict:
+    """
+    Fields found locally plus "confident": True when the test matched
+    unambiguously above TEST_MATCH_THRESHOLD and a date was found, i.e. the
+    LLM is not needed. Missing fields are None.
+    """
+    patient_mobile, mobile_span = extract_mobile(query)
+    rest = _mask(query, mobile_span)
+    date_str, date_span = extract_date(rest, today)
+    rest = _mask(rest, date_span)
+
+    test_name, score, ambiguous = match_test_name(rest, test_names)
+    test_ok = test_name is not None and score >= TEST_MATCH_THRESHOLD and not ambiguous
+
+    # the test name must not end up in the patient name ("book CBC for Ali")
+    name_text = rest
+    if test_ok:
+        name_text = re.sub(re.escape(test_name), " ", name_text, flags=re.IGNORECASE)
+
+    return {
+        "test_name": test_name if test_ok else None,
+        "test_score": score,
+        "date_str": date_str,
+        "patient_name": extract_patient_name(name_text),
+        "patient_mobile": patient_mobile,
+        "confident": test_ok and date_str is not None,
+    }
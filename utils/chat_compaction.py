@@ -0,0 +1,257 @@
+# -------------------------------
+# CHAT HISTORY COMPACTION (chatbot.db)
+# -------------------------------
+# LangGraph writes a checkpoint for every graph step and never deletes one,
+# so chatbot.db grows with every turn. Compaction:
+#   - keeps the latest CHECKPOINT_KEEP checkpoints of every thread (and the
+#     pending writes of those), older ones are deleted
+#   - deletes threads idle for more than CHAT_RETENTION_DAYS (0 = keep all)
+#   - returns the freed pages to the file system with incremental VACUUM
+#     (files created with auto_vacuum=INCREMENTAL, which the chat backend
+#     sets on a new chatbot.db; an older file keeps its free pages for reuse
+#     until it is converted offline with --convert)
+#
+# Safe for this app because every checkpoint of ChatState holds the full
+# message list (no delta channels): the latest checkpoint alone restores
+# the conversation. Deleting old ones only shortens get_state_history().
+#
+# Work is done in batches of threads, one short transaction each, so the
+# chat keeps writing while compaction runs (WAL, busy timeout).
+#
+#   python -m utils.chat_compaction                       # compact chatbot.db
+#   python -m utils.chat_compaction --keep 5 --retention-days 30 --db path/to/chatbot.db
+#   python -m utils.chat_compaction --convert              # chat stopped: one-time full VACUUM
+#
+# The chat backend also runs it every CHAT_COMPACTION_INTERVAL seconds in a
+# background thread (0 disables).
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.thread_registry import checkpoint_time
+
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "chatbot.db")
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "10"))
+CHAT_RETENTION_DAYS = float(os.getenv("CHAT_RETENTION_DAYS", "0"))
+CHAT_COMPACTION_INTERVAL = float(os.getenv("CHAT_COMPACTION_INTERVAL", "3600"))
+COMPACTION_BATCH_THREADS = 200
+VACUUM_STEP_PAGES = 2000
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def _table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+    ).fetchone() is not None
+
+
+def _db_bytes(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return conn.execute("PRAGMA page_count").fetchone()[0] * page_size, page_size
+
+
+# -------------------------------
+# Retention
+# -------------------------------
+def _idle_threads(conn, cutoff):
+    """Thread ids whose last activity is before cutoff (unix time)."""
+    if _table_exists(conn, "threads"):
+        rows = conn.execute("SELECT thread_id FROM threads WHERE last_activity < ?", (cutoff,))
+        return [r[0] for r in rows]
+    # no registry yet: last checkpoint id of each thread is time-ordered
+    rows = conn.execute("SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id")
+    return [thread_id for thread_id, last in rows if (checkpoint_time(last) or cutoff) < cutoff]
+
+
+def prune_idle_threads(conn, retention_days):
+    """Delete threads idle longer than retention_days. Returns the number deleted."""
+    if retention_days <= 0:
+        return 0
+    idle = _idle_threads(conn, time.time() - retention_days * 86400)
+    has_registry = _table_exists(conn, "threads")
+    for i in range(0, len(idle), COMPACTION_BATCH_THREADS):
+        batch = json.dumps(idle[i:i + COMPACTION_BATCH_THREADS])
+        conn.execute("DELETE FROM checkpoints WHERE thread_id IN (SELECT value FROM json_each(?))", (batch,))
+        conn.execute("DELETE FROM writes WHERE thread_id IN (SELECT value FROM json_each(?))", (batch,))
+        if has_registry:
+            conn.execute("DELETE FROM threads WHERE thread_id IN (SELECT value FROM json_each(?))", (batch,))
+        conn.commit()
+    return len(idle)
+
+
+# -------------------------------
+# Keep the latest N checkpoints
+# -------------------------------
+def _thread_batches(conn):
+    last = ""
+    while True:
+        rows = conn.execute("""
+            SELECT DISTINCT thread_id FROM checkpoints
+            WHERE thread_id > ?
+            ORDER BY thread_id
+            LIMIT ?
+        """, (last, COMPACTION_BATCH_THREADS)).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [r[0] for r in rows]
+
+
+def trim_checkpoints(conn, keep):
+    """Delete all but the latest `keep` checkpoints (and their writes) per thread and namespace."""
+    deleted = {"checkpoints": 0, "writes": 0}
+    for threads in _thread_batches(conn):
+        batch = json.dumps(threads)
+        cursor = conn.execute("""
+            DELETE FROM checkpoints WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                    ) AS rn
+                    FROM checkpoints
+                    WHERE thread_id IN (SELECT value FROM json_each(?))
+                )
+                WHERE rn > ?
+            )
+        """, (batch, keep))
+        deleted["checkpoints"] += cursor.rowcount
+        if cursor.rowcount:
+            cursor = conn.execute("""
+                DELETE FROM writes
+                WHERE thread_id IN (SELECT value FROM json_each(?))
+                AND NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = writes.thread_id
+                    AND c.checkpoint_ns = writes.checkpoint_ns
+                    AND c.checkpoint_id = writes.checkpoint_id
+                )
+            """, (batch,))
+            deleted["writes"] += cursor.rowcount
+        conn.commit()
+    return deleted
+
+
+# -------------------------------
+# Incremental VACUUM
+# -------------------------------
+def incremental_vacuum(conn, convert=False):
+    """
+    Return free pages to the file system. A database created without
+    auto_vacuum=INCREMENTAL is only converted (a full VACUUM, which rewrites
+    the file under an exclusive lock) when convert is set: do that with the
+    chat stopped, never from the background thread.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if not convert:
+            return "skipped (auto_vacuum off, run with --convert offline)"
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return "full (converted to incremental)"
+    while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+    return "incremental"
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def compact_chat_db(db_path=None, keep=None, retention_days=None, vacuum=True, convert=False):
+    """Run retention, trimming and vacuum on chatbot.db. Returns a report dict."""
+    db_path = db_path or CHAT_DB_PATH
+    keep = CHECKPOINT_KEEP if keep is None else keep
+    retention_days = CHAT_RETENTION_DAYS if retention_days is None else retention_days
+    if keep < 1:
+        raise ValueError("keep must be at least 1 (the latest checkpoint holds the conversation)")
+
+    started = time.perf_counter()
+    conn = _connect(db_path)
+    try:
+        if not _table_exists(conn, "checkpoints"):
+            return {"db_path": db_path, "skipped": "no checkpoints table"}
+
+        bytes_before, page_size = _db_bytes(conn)
+        pruned = prune_idle_threads(conn, retention_days)
+        deleted = trim_checkpoints(conn, keep)
+        vacuum_mode = incremental_vacuum(conn, convert) if vacuum else None
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        bytes_after, _ = _db_bytes(conn)
+    finally:
+        conn.close()
+
+    return {
+        "db_path": db_path,
+        "keep": keep,
+        "retention_days": retention_days,
+        "threads_pruned": pruned,
+        "checkpoints_deleted": deleted["checkpoints"],
+        "writes_deleted": deleted["writes"],
+        "vacuum": vacuum_mode,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": bytes_before - bytes_after,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _compact_forever(db_path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            report = compact_chat_db(db_path)
+            if report.get("checkpoints_deleted") or report.get("threads_pruned"):
+                print(f"[chat_compaction] {report}")
+        except Exception as e:
+            print(f"[chat_compaction] compaction failed: {e}")
+
+
+_COMPACTOR = None
+_COMPACTOR_LOCK = threading.Lock()
+
+
+def start_background_compaction(db_path=None, interval=None):
+    """Start the compaction thread once per process (no-op when the interval is 0)."""
+    global _COMPACTOR
+    interval = CHAT_COMPACTION_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+    with _COMPACTOR_LOCK:
+        if _COMPACTOR is None:
+            _COMPACTOR = threading.Thread(
+                target=_compact_forever,
+                args=(db_path or CHAT_DB_PATH, interval),
+                name="chat-compaction",
+                daemon=True
+            )
+            _COMPACTOR.start()
+    return _COMPACTOR
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the chat checkpoint database")
+    parser.add_argument("--db", default=CHAT_DB_PATH)
+    parser.add_argument("--keep", type=int, default=CHECKPOINT_KEEP,
+                        help="checkpoints kept per thread")
+    parser.add_argument("--retention-days", type=float, default=CHAT_RETENTION_DAYS,
+                        help="delete threads idle longer than this (0 = keep all)")
+    parser.add_argument("--no-vacuum", action="store_true")
+    parser.add_argument("--convert", action="store_true",
+                        help="switch an existing file to auto_vacuum=INCREMENTAL (full VACUUM, stop the chat first)")
+    args = parser.parse_args()
+
+    report = compact_chat_db(args.db, args.keep, args.retention_days,
+                             vacuum=not args.no_vacuum, convert=args.convert)
+    for key, value in report.items():
+        print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# -------------------------------
+# CHAT CONTEXT WINDOWING
+# -------------------------------
+# chat_node used to send the whole thread (every turn, every tool call and
+# tool result) to the LLM. build_prompt() sends instead:
+#   - the system prompt, extended with a compact summary of older turns
+#   - the last CHAT_RECENT_TURNS turns verbatim (a turn = one user message
+#     and everything up to the next one, so tool calls stay paired with
+#     their results)
+# and keeps the estimate under CHAT_TOKEN_BUDGET tokens: recent turns are
+# moved into the summary while over budget (the last turn always stays) and
+# the summary keeps its newest CHAT_SUMMARY_LINES lines that still fit.
+#
+# The summary is built without an LLM call: completed booking flows become
+# one "Booked ..." line, an unfinished flow keeps its context_id and offered
+# windows so the booking can still be completed, other turns keep a short
+# excerpt of the user message and the reply.
+#
+# The checkpointed state is not changed; only what is sent is windowed.
+
+import json
+import os
+import threading
+from collections import deque
+
+from langchain_core.messages import SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "3000"))
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "4"))
+CHAT_SUMMARY_LINES = int(os.getenv("CHAT_SUMMARY_LINES", "24"))
+EXCERPT_CHARS = 160
+MAX_OFFERED_WINDOWS = 12
+TURN_SAMPLES = 512      # recent turns kept for context_stats()
+
+START_TOOL = "start_booking_tool"
+CREATE_TOOL = "create_booking_tool"
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            block if isinstance(block, str) else str(block.get("text", ""))
+            for block in content
+        )
+    return str(content)
+
+
+def _excerpt(content):
+    text = " ".join(_text(content).split())
+    return text if len(text) <= EXCERPT_CHARS else text[:EXCERPT_CHARS - 1].rstrip() + "…"
+
+
+def _tool_result(message):
+    """Result dict of a booking tool message (artifact in local mode, JSON text over MCP)."""
+    if isinstance(message.artifact, dict):
+        return message.artifact
+    try:
+        result = json.loads(_text(message.content))
+    except (ValueError, TypeError):
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def split_turns(messages):
+    """Messages grouped into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if message.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+# -------------------------------
+# Summary of older turns
+# -------------------------------
+def summarize_turns(turns):
+    """
+    Summary lines for `turns`: (pinned, lines). Pinned lines (unfinished
+    booking flows) are always sent; the others oldest first. All turns of a
+    completed booking flow collapse into its "Booked" line.
+    """
+    calls = {}          # tool_call_id -> (tool name, args)
+    queries = {}        # context_id -> start_booking_tool query
+    open_flows = {}     # context_id -> pinned line
+    groups = []         # [context_id or None, lines] per turn
+
+    for turn in turns:
+        flow, booked, tool_lines = None, None, []
+        for message in turn:
+            if message.type == "ai":
+                for call in message.tool_calls or ():
+                    calls[call["id"]] = (call["name"], call["args"])
+                continue
+            if message.type != "tool":
+                continue
+
+            name, args = calls.get(message.tool_call_id, (message.name, {}))
+            result = _tool_result(message) or {}
+            status = result.get("status")
+            if name == START_TOOL and status == "awaiting_window_selection":
+                flow = result["context_id"]
+                queries[flow] = _excerpt(args.get("query", ""))
+                windows = ", ".join(
+                    f"{w['window_no']}) {w['time']} ({w['available']} left)"
+                    for w in result.get("windows", [])[:MAX_OFFERED_WINDOWS]
+                )
+                open_flows[flow] = (
+                    f"- Unfinished booking (context_id={flow}) for \"{queries[flow]}\"; "
+                    f"windows offered: {windows}"
+                )
+            elif name == CREATE_TOOL:
+                flow = args.get("context_id")
+                if status == "success":
+                    open_flows.pop(flow, None)
+                    booked = (
+                        f"- Booked \"{queries.get(flow, '')}\": booking_id={result.get('booking_id')}, "
+                        f"patient {args.get('patient_name', '?')}"
+                    )
+                elif status == "error":
+                    if "expired" in str(result.get("message")):
+                        open_flows.pop(flow, None)
+                    tool_lines.append(f"- Booking attempt failed: {_excerpt(result.get('message', ''))}")
+
+        if booked:
+            groups = [group for group in groups if group[0] != flow]
+            groups.append([None, [booked]])
+            continue
+
+        user = next((m for m in turn if m.type == "human"), None)
+        reply = next((m for m in reversed(turn) if m.type == "ai" and not m.tool_calls), None)
+        lines = [f"- User: {_excerpt(user.content)}"] if user is not None else []
+        lines.extend(tool_lines)
+        if reply is not None and _text(reply.content).strip():
+            lines.append(f"  Assistant: {_excerpt(reply.content)}")
+        groups.append([flow, lines])
+
+    return list(open_flows.values()), [line for _, lines in groups for line in lines]
+
+
+def _summary_block(pinned, lines):
+    if not pinned and not lines:
+        return ""
+    return "\n\nEARLIER IN THIS CONVERSATION (summary):\n" + "\n".join(pinned + lines)
+
+
+def _line_tokens(line):
+    return len(line) / 4 + 1
+
+
+# -------------------------------
+# Prompt
+# -------------------------------
+def build_prompt(system_text, messages, budget=None, recent_turns=None):
+    """
+    Messages to send for this turn and a report:
+    {messages_in, messages_sent, turns, turns_summarized, tokens_full, tokens_sent}
+    (token counts are estimates; the real input count comes back in usage_metadata).
+    """
+    budget = CHAT_TOKEN_BUDGET if budget is None else budget
+    recent_turns = CHAT_RECENT_TURNS if recent_turns is None else recent_turns
+
+    turns = split_turns(messages)
+    turn_tokens = [count_tokens_approximately(turn) for turn in turns]
+    system_tokens = count_tokens_approximately([SystemMessage(content=system_text)])
+
+    keep = min(max(recent_turns, 1), len(turns))
+    while keep > 1 and system_tokens + sum(turn_tokens[-keep:]) > budget:
+        keep -= 1
+    older, recent = turns[:len(turns) - keep], turns[len(turns) - keep:]
+
+    pinned, lines = summarize_turns(older)
+    allowance = budget - system_tokens - sum(turn_tokens[len(turns) - keep:]) - sum(map(_line_tokens, pinned))
+    kept_lines = []
+    for line in reversed(lines[-CHAT_SUMMARY_LINES:]):      # newest first
+        allowance -= _line_tokens(line)
+        if allowance < 0:
+            break
+        kept_lines.append(line)
+    kept_lines.reverse()
+
+    prompt = [SystemMessage(content=system_text + _summary_block(pinned, kept_lines))]
+    prompt.extend(message for turn in recent for message in turn)
+
+    report = {
+        "messages_in": len(messages),
+        "messages_sent": len(prompt),
+        "turns": len(turns),
+        "turns_summarized": len(older),
+        "tokens_full": system_tokens + sum(turn_tokens),
+        "tokens_sent": count_tokens_approximately(prompt),
+    }
+    return prompt, report
+
+
+# -------------------------------
+# Per-turn statistics
+# -------------------------------
+_TURNS = deque(maxlen=TURN_SAMPLES)
+_TURNS_LOCK = threading.Lock()
+
+
+def record_turn(report):
+    with _TURNS_LOCK:
+        _TURNS.append(report)
+
+
+def context_stats():
+    """Prompt sizes of recent turns: averages and maxima, estimated and (when reported) actual."""
+    with _TURNS_LOCK:
+        turns = list(_TURNS)
+    if not turns:
+        return {"turns": 0}
+    sent = [t["tokens_sent"] for t in turns]
+    full = [t["tokens_full"] for t in turns]
+    actual = [t["input_tokens"] for t in turns if t.get("input_tokens")]
+    return {
+        "turns": len(turns),
+        "budget": CHAT_TOKEN_BUDGET,
+        "avg_tokens_sent": round(sum(sent) / len(sent)),
+        "max_tokens_sent": max(sent),
+        "avg_tokens_full": round(sum(full) / len(full)),
+        "max_tokens_full": max(full),
+        "avg_input_tokens": round(sum(actual) / len(actual)) if actual else None,
+    }
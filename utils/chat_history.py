@@ -0,0 +1,129 @@
+# -------------------------------
+# CHAT HISTORY LOADER
+# -------------------------------
+# Pages of a thread's messages for the chat page, newest page first:
+#   load_history(saver, thread_id)                  last HISTORY_PAGE_SIZE messages
+#   load_history(saver, thread_id, before=cursor)   the page before it
+#
+# Only user messages and assistant text are shown (tool calls and tool
+# results are not), as {"role": "user" | "assistant", "content": str}.
+#
+# Decoding a checkpoint (msgpack of the whole message list) is the slow
+# part, so the decoded display list is cached per (thread_id,
+# checkpoint_id), LRU, HISTORY_CACHE_ENTRIES threads' worth. Finding the
+# latest checkpoint id is a primary-key lookup, so switching back to a
+# thread that has not changed costs no decoding at all. Messages are only
+# ever appended to a thread, so a cursor (index into the list) stays valid
+# on later checkpoints, and pages are always cut from the latest one.
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "30"))
+HISTORY_CACHE_ENTRIES = int(os.getenv("HISTORY_CACHE_ENTRIES", "64"))
+
+
+def message_text(content) -> str:
+    """Plain text of a message (Gemini returns a list of content parts)."""
+    if isinstance(content, list):
+        return "".join(
+            part.get("text", "")
+            for part in content
+            if isinstance(part, dict) and part.get("type") == "text"
+        )
+    if isinstance(content, str):
+        return content
+    return ""
+
+
+def to_display(messages) -> List[Dict[str, str]]:
+    display = []
+    for message in messages:
+        if message.type == "human":
+            display.append({"role": "user", "content": message_text(message.content)})
+        elif message.type == "ai":
+            text = message_text(message.content)
+            if text.strip():
+                display.append({"role": "assistant", "content": text})
+    return display
+
+
+class HistoryCache:
+    """LRU of decoded display lists keyed by (thread_id, checkpoint_id)."""
+
+    def __init__(self, max_entries=HISTORY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            display = self._entries.get(key)
+            if display is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return display
+
+    def put(self, key, display):
+        with self._lock:
+            # one entry per thread: only the latest checkpoint is ever asked for
+            for old in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[old]
+            self._entries[key] = display
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {"size": size, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+_CACHE = HistoryCache()
+
+
+async def _display_list(saver, thread_id, checkpoint_id):
+    key = (thread_id, checkpoint_id)
+    display = _CACHE.get(key)
+    if display is None:
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}}
+        state = await saver.aget_tuple(config)
+        if state is None:
+            return None
+        display = to_display(state.checkpoint["channel_values"].get("messages", []))
+        _CACHE.put(key, display)
+    return display
+
+
+async def load_history(saver, thread_id, limit: Optional[int] = None, before: Optional[int] = None) -> Dict[str, Any]:
+    """
+    One page of a thread's messages, oldest first within the page:
+    {messages, before, checkpoint_id, total}. Pass `before` back for the
+    previous page; it is None on the first page of the thread.
+    """
+    limit = limit or HISTORY_PAGE_SIZE
+    thread_id = str(thread_id)
+
+    checkpoint_id = await saver.alatest_checkpoint_id(thread_id)
+    display = await _display_list(saver, thread_id, checkpoint_id) if checkpoint_id else None
+    display = display or []
+
+    end = len(display) if before is None else min(before, len(display))
+    start = max(0, end - limit)
+    return {
+        "messages": display[start:end],
+        "before": start or None,
+        "checkpoint_id": checkpoint_id,
+        "total": len(display),
+    }
+
+
+def history_cache_stats():
+    return _CACHE.stats()
@@ -0,0 +1,262 @@
+# -------------------------------
+# BOOKING CONTEXT STORE
+# -------------------------------
+# start_booking_tool stores the test, date and offered windows of a booking
+# flow under a context_id; create_booking_tool picks it up again. Flows
+# that are never finished expire after CONTEXT_TTL seconds (counted from
+# the last use) and the store never holds more than CONTEXT_MAX_ENTRIES
+# contexts (least recently used dropped first).
+#
+#   BOOKING_CONTEXT_STORE=memory   per process (default)
+#   BOOKING_CONTEXT_STORE=sqlite   booking_contexts table of the lab DB,
+#                                  shared by all MCP worker processes
+#
+# Contexts must be JSON serializable. A background thread sweeps expired
+# contexts every CONTEXT_SWEEP_INTERVAL seconds; reads never return them.
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from backend.db_pool import db_connection, run_write_transaction
+
+CONTEXT_TTL = float(os.getenv("CONTEXT_TTL", "900"))
+CONTEXT_MAX_ENTRIES = int(os.getenv("CONTEXT_MAX_ENTRIES", "10000"))
+CONTEXT_SWEEP_INTERVAL = float(os.getenv("CONTEXT_SWEEP_INTERVAL", "60"))
+
+
+class _Counters:
+    NAMES = ("created", "hits", "misses", "expired", "evicted", "deleted", "sweeps")
+
+    def __init__(self):
+        self._values = dict.fromkeys(self.NAMES, 0)
+        self._lock = threading.Lock()
+
+    def add(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self._values[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            values = dict(self._values)
+        lookups = values["hits"] + values["misses"]
+        values["hit_ratio"] = round(values["hits"] / lookups, 3) if lookups else None
+        return values
+
+
+# -------------------------------
+# In-memory LRU + TTL
+# -------------------------------
+class MemoryContextStore:
+    def __init__(self, ttl=CONTEXT_TTL, max_entries=CONTEXT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()      # context_id -> (expires_at, context)
+        self._lock = threading.Lock()
+        self.counters = _Counters()
+
+    def create(self, context: Dict[str, Any]) -> str:
+        context_id = str(uuid.uuid4())
+        self.save(context_id, context)
+        self.counters.add("created")
+        return context_id
+
+    def save(self, context_id: str, context: Dict[str, Any]):
+        """Store (or replace) a context and restart its TTL."""
+        evicted = 0
+        with self._lock:
+            self._entries[context_id] = (time.monotonic() + self.ttl, context)
+            self._entries.move_to_end(context_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self.counters.add("evicted", evicted)
+
+    def get(self, context_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(context_id)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[context_id]
+                entry = None
+                self.counters.add("expired")
+            if entry is None:
+                self.counters.add("misses")
+                return None
+            self._entries[context_id] = (time.monotonic() + self.ttl, entry[1])
+            self._entries.move_to_end(context_id)
+        self.counters.add("hits")
+        return entry[1]
+
+    def delete(self, context_id: str):
+        with self._lock:
+            found = self._entries.pop(context_id, None) is not None
+        self.counters.add("deleted", found)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [cid for cid, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for context_id in expired:
+                del self._entries[context_id]
+        self.counters.add("expired", len(expired))
+        self.counters.add("sweeps")
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {"backend": "memory", "size": size, "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl, **self.counters.snapshot()}
+
+
+# -------------------------------
+# SQLite (shared by worker processes)
+# -------------------------------
+class SQLiteContextStore:
+    """
+    booking_contexts table; wall-clock expiry so all processes agree.
+    Every read that may write (expire, touch, evict) runs in BEGIN IMMEDIATE
+    (run_write_transaction): a deferred transaction upgrading from read to
+    write can fail with SQLITE_BUSY without waiting for busy_timeout.
+    """
+
+    def __init__(self, ttl=CONTEXT_TTL, max_entries=CONTEXT_MAX_ENTRIES):
+        from backend.db_table import init_db
+
+        init_db()       # creates booking_contexts when this process is the first user
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counters = _Counters()    # this process only
+
+    def create(self, context: Dict[str, Any]) -> str:
+        context_id = str(uuid.uuid4())
+
+        def work(cursor):
+            self._write(cursor, context_id, context)
+            # over the cap: drop the least recently used (only new contexts grow the table)
+            cursor.execute("""
+                DELETE FROM booking_contexts WHERE context_id IN (
+                    SELECT context_id FROM booking_contexts
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            return max(cursor.rowcount, 0)
+
+        with db_connection() as conn:
+            evicted = run_write_transaction(conn, work)
+        self.counters.add("evicted", evicted)
+        self.counters.add("created")
+        return context_id
+
+    def save(self, context_id: str, context: Dict[str, Any]):
+        """Store (or replace) a context and restart its TTL."""
+        with db_connection() as conn:
+            run_write_transaction(conn, lambda cursor: self._write(cursor, context_id, context))
+
+    def _write(self, cursor, context_id, context):
+        now = time.time()
+        cursor.execute("""
+            INSERT INTO booking_contexts (context_id, payload, expires_at, last_used)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(context_id) DO UPDATE SET
+                payload = excluded.payload,
+                expires_at = excluded.expires_at,
+                last_used = excluded.last_used
+        """, (context_id, json.dumps(context), now + self.ttl, now))
+
+    def get(self, context_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+
+        def work(cursor):
+            row = cursor.execute(
+                "SELECT payload, expires_at FROM booking_contexts WHERE context_id=?", (context_id,)
+            ).fetchone()
+            if row is not None and row[1] <= now:
+                cursor.execute("DELETE FROM booking_contexts WHERE context_id=?", (context_id,))
+                return None, True
+            if row is not None:
+                cursor.execute(
+                    "UPDATE booking_contexts SET expires_at=?, last_used=? WHERE context_id=?",
+                    (now + self.ttl, now, context_id)
+                )
+            return row, False
+
+        with db_connection() as conn:
+            row, expired = run_write_transaction(conn, work)
+
+        self.counters.add("expired", expired)
+        if row is None:
+            self.counters.add("misses")
+            return None
+        self.counters.add("hits")
+        return json.loads(row[0])
+
+    def delete(self, context_id: str):
+        def work(cursor):
+            cursor.execute("DELETE FROM booking_contexts WHERE context_id=?", (context_id,))
+            return cursor.rowcount
+
+        with db_connection() as conn:
+            deleted = run_write_transaction(conn, work)
+        self.counters.add("deleted", deleted)
+
+    def sweep(self) -> int:
+        def work(cursor):
+            cursor.execute("DELETE FROM booking_contexts WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
+
+        with db_connection() as conn:
+            expired = run_write_transaction(conn, work)
+        self.counters.add("expired", expired)
+        self.counters.add("sweeps")
+        return expired
+
+    def stats(self):
+        with db_connection() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM booking_contexts").fetchone()[0]
+        return {"backend": "sqlite", "size": size, "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl, **self.counters.snapshot()}
+
+
+# -------------------------------
+# Process-wide store + sweeper
+# -------------------------------
+STORES = {"memory": MemoryContextStore, "sqlite": SQLiteContextStore}
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def _sweep_forever(store, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            store.sweep()
+        except Exception as e:
+            print(f"[context_store] sweep failed: {e}")
+
+
+def get_context_store():
+    """Store selected by BOOKING_CONTEXT_STORE, with its sweeper thread (created on first use)."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                backend = os.getenv("BOOKING_CONTEXT_STORE", "memory")
+                if backend not in STORES:
+                    raise ValueError(f"BOOKING_CONTEXT_STORE must be one of {sorted(STORES)}, got {backend!r}")
+                store = STORES[backend]()
+                threading.Thread(
+                    target=_sweep_forever,
+                    args=(store, CONTEXT_SWEEP_INTERVAL),
+                    name="context-sweeper",
+                    daemon=True
+                ).start()
+                _STORE = store
+    return _STORE
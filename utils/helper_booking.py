@@ -1,7 +1,4 @@
 from pydantic import BaseModel
-import sqlite3
-# from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import List, Dict
 
 import re
@@ -9,9 +6,16 @@ from typing import Dict, Optional
 
 from dotenv import load_dotenv
 
+from backend.db_pool import db_connection
+from backend.ref_cache import get_ref_cache
+from utils.booking_parser import match_test_name, parse_booking_query, TEST_MATCH_THRESHOLD
+from utils.llm_registry import get_structured_model
+
 load_dotenv()
 
-DB_PATH = "lab_system.db"  # adjust path
+
+def _load_test_ids_by_name(conn) -> Dict[str, str]:
+    return {name: test_id for test_id, name in conn.execute("SELECT test_id, test_name FROM tests")}
 
 
 def _normalize(value: Optional[str]) -> Optional[str]:
@@ -33,28 +37,8 @@ class TestBookingSchema(BaseModel):
 
 
 
-def get_test_info(user_query: str) -> Dict[str, str]:
-    """
-    Parse user query using LLM to extract exact test name, date,
-    patient name, and mobile number, then fetch test_id from DB.
-    """
-
-    # -------------------------------
-    # Step 1: Load test names from DB
-    # -------------------------------
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT test_name FROM tests")
-    tests = [row[0] for row in cursor.fetchall()]
-    conn.close()
-
-    # -------------------------------
-    # Step 2: LLM structured parsing
-    # -------------------------------
-    model = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
-    # model = ChatOpenAI(model="gpt-3.5-turbo")
-    structured_model = model.with_structured_output(TestBookingSchema)
-
+def llm_parse_query(user_query: str, tests: List[str]) -> Dict[str, Optional[str]]:
+    """LLM structured parsing (slow path)."""
     prompt = f"""
 Valid lab tests:
 {tests}
@@ -72,18 +56,56 @@ TASK:
 If any field is missing, return NONE.
 """
 
-    parsed = structured_model.invoke(prompt)
+    # shared client and runnable (utils/llm_registry.py)
+    # set LLM_MODEL=gpt-3.5-turbo for OpenAI
+    parsed = get_structured_model(TestBookingSchema).invoke(prompt)
 
-    test_name = _normalize(parsed.test_name)
-    date_str = _normalize(parsed.date_str)
-    patient_name = _normalize(parsed.patient_name)
     patient_mobile = _normalize(parsed.patient_mobile)
-
     if patient_mobile:
         patient_mobile = re.sub(r"\D", "", patient_mobile)
 
+    return {
+        "test_name": _normalize(parsed.test_name),
+        "date_str": _normalize(parsed.date_str),
+        "patient_name": _normalize(parsed.patient_name),
+        "patient_mobile": patient_mobile,
+    }
+
+
+def get_test_info(user_query: str) -> Dict[str, str]:
+    """
+    Extract exact test name, date, patient name and mobile number from the
+    user query, then fetch test_id from DB. The local parser runs first;
+    the LLM is only asked when it cannot find the test or the date.
+    """
+
+    # -------------------------------
+    # Step 1: Load test names (reference cache)
+    # -------------------------------
+    with db_connection() as conn:
+        test_ids_by_name = get_ref_cache().get(conn, "tests", _load_test_ids_by_name, key="ids_by_name").value
+    tests = list(test_ids_by_name)
+
+    # -------------------------------
+    # Step 2: Local parsing, LLM fallback
+    # -------------------------------
+    local = parse_booking_query(user_query, tests)
+    source = "local"
+    parsed = local
+    if not local["confident"]:
+        source = "llm"
+        parsed = llm_parse_query(user_query, tests)
+        # keep what the local parser found and the LLM missed
+        for field in ("date_str", "patient_name", "patient_mobile"):
+            parsed[field] = parsed[field] or local[field]
+
+    test_name = parsed["test_name"]
+    date_str = parsed["date_str"]
+    patient_name = parsed["patient_name"]
+    patient_mobile = parsed["patient_mobile"]
+
     print(
-        f"[DEBUG] Parsed → test={test_name}, date={date_str}, "
+        f"[DEBUG] Parsed ({source}) → test={test_name}, date={date_str}, "
         f"name={patient_name}, mobile={patient_mobile}"
     )
 
@@ -93,23 +115,20 @@ If any field is missing, return NONE.
     if not test_name:
         return {"error": "Test name not provided"}
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT test_id FROM tests WHERE test_name = ?",
-        (test_name,)
-    )
-    row = cursor.fetchone()
-    conn.close()
-
-    if not row:
+    test_id = test_ids_by_name.get(test_name)
+    if not test_id:
+        # LLM answer close to, but not exactly, a DB name
+        matched, score, _ = match_test_name(test_name, tests)
+        if matched and score >= TEST_MATCH_THRESHOLD:
+            test_name, test_id = matched, test_ids_by_name[matched]
+    if not test_id:
         return {"error": f"No test found in DB with name: {test_name}"}
 
     # -------------------------------
     # Step 4: Final structured result
     # -------------------------------
     return {
-        "test_id": row[0],
+        "test_id": test_id,
         "test_name": test_name,
         "date_str": date_str,
         "patient_name": patient_name,
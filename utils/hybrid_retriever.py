@@ -0,0 +1,279 @@
+# -------------------------------
+# HYBRID RETRIEVAL (BM25 + vectors)
+# -------------------------------
+# Lab questions name exact entities (test names, doctor names, dates,
+# timings) that embeddings blur. Every query is ranked twice:
+#   - by BM25 over an inverted keyword index (utils/keyword_search.py)
+#   - by cosine similarity over the vectors (utils/rag_index.py)
+# and the two rankings are fused with reciprocal rank fusion,
+# score = sum of 1 / (RRF_K + rank), so a document near the top of either
+# list wins without the two score scales having to be comparable.
+#
+# Indexed documents:
+#   - chunks of the lab PDFs held by the VectorIndex
+#   - live rows of tests, doctors and lab_schedule, one sentence per row
+#
+# Incremental updates: each of those tables has a generation counter in
+# ref_generations, bumped by every write (backend/ref_cache.py). The
+# counters are read at most every TABLE_CHECK_INTERVAL seconds; a table
+# whose counter moved is re-read and only the rows whose text changed are
+# re-indexed and re-embedded, deleted rows are dropped. PDF chunks are
+# re-indexed only when the VectorIndex maps a different PDF.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.keyword_search import BM25Index
+from utils.vector_search import DenseMatrix
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "20"))     # per ranking, before fusion
+TABLE_CHECK_INTERVAL = float(os.getenv("RAG_TABLE_CHECK_INTERVAL", "1.0"))
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+# -------------------------------
+# Table rows -> documents
+# -------------------------------
+def _yes_no(value):
+    return "yes" if value else "no"
+
+
+def _test_rows(conn):
+    rows = conn.execute("""
+        SELECT test_id, test_name, category, requires_booking, requires_doctor, price, duration
+        FROM tests
+    """)
+    return {
+        ("tests", test_id): (
+            f"Test {name}: category {category}, price {price if price is not None else 'not set'}, "
+            f"duration {duration or 'not set'}, booking required: {_yes_no(requires_booking)}, "
+            f"doctor required: {_yes_no(requires_doctor)}."
+        )
+        for test_id, name, category, requires_booking, requires_doctor, price, duration in rows
+    }
+
+
+def _doctor_rows(conn):
+    rows = conn.execute("SELECT doctor_id, doctor_name, specialization, contact_info FROM doctors")
+    return {
+        ("doctors", doctor_id): (
+            f"Doctor {name}: specialization {specialization}"
+            + (f", contact {contact}." if contact else ".")
+        )
+        for doctor_id, name, specialization, contact in rows
+    }
+
+
+def _lab_schedule_rows(conn):
+    rows = conn.execute("SELECT schedule_id, day_of_week, opens_at, closes_at, is_closed FROM lab_schedule")
+    documents = {}
+    for schedule_id, day, opens_at, closes_at, is_closed in rows:
+        day = DAY_NAMES[day] if day in range(7) else str(day)
+        timing = "Closed" if is_closed else f"{opens_at} - {closes_at}"
+        documents[("lab_schedule", schedule_id)] = f"Lab timings {day}: {timing}."
+    return documents
+
+
+TABLE_LOADERS = {
+    "tests": _test_rows,
+    "doctors": _doctor_rows,
+    "lab_schedule": _lab_schedule_rows,
+}
+
+
+# -------------------------------
+# Fusion
+# -------------------------------
+def rrf_fuse(rankings, k=RRF_K):
+    """Reciprocal rank fusion of ranked key lists: [(key, score)], best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+# -------------------------------
+# Retriever
+# -------------------------------
+class HybridRetriever:
+    def __init__(self, vector_index, connection=None, tables=tuple(TABLE_LOADERS),
+                 check_interval=TABLE_CHECK_INTERVAL, candidates=RAG_CANDIDATES):
+        """
+        vector_index: the VectorIndex holding the PDF chunks (and the embedder).
+        connection: callable returning a connection context manager, e.g.
+        backend.db_pool.db_connection; None indexes the PDFs only.
+        """
+        self.vector_index = vector_index
+        self.connection = connection
+        self.tables = tables
+        self.check_interval = check_interval
+        self.candidates = candidates
+        self.keywords = BM25Index()
+        self.documents = {}         # key -> {text, source, page}; key = (source, chunk_id) or (table, row id)
+        self._pdf_keys = {}         # source -> (sha256, keys of its chunks)
+        self._generations = {}      # table -> generation its rows were indexed at
+        self._row_texts = {}        # table -> {key: text}
+        self._row_vectors = {}      # key -> embedding
+        self._rows = (None, [])     # DenseMatrix over the row vectors, their keys
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Incremental refresh
+    # -----------------------------
+    def refresh(self, force=False) -> Dict:
+        """Bring the keyword index and row vectors up to date. Returns what changed."""
+        report = {"chunks_indexed": 0, "chunks_removed": 0, "rows_indexed": 0, "rows_removed": 0, "tables": []}
+        with self._lock:
+            self._sync_pdfs(report)
+            now = time.monotonic()
+            if self.connection is not None and (force or now - self._checked_at >= self.check_interval):
+                self._checked_at = now
+                self._sync_tables(report)
+        return report
+
+    def version(self):
+        """
+        Token that changes whenever an indexed PDF or table changes (PDF
+        digests and table generations). Refreshes first, like a search.
+        """
+        self.refresh()
+        with self._lock:
+            pdfs = tuple(sorted((source, digest) for source, (digest, _) in self._pdf_keys.items()))
+            return pdfs, tuple(sorted(self._generations.items()))
+
+    def _sync_pdfs(self, report):
+        documents = self.vector_index.documents
+        for source, (digest, keys) in list(self._pdf_keys.items()):
+            if source in documents and documents[source]["sha256"] == digest:
+                continue
+            for key in keys:
+                self.keywords.remove(key)
+                self.documents.pop(key, None)
+            del self._pdf_keys[source]
+            report["chunks_removed"] += len(keys)
+
+        for source, document in documents.items():
+            if source in self._pdf_keys:
+                continue
+            keys = []
+            for chunk in document["chunks"]:
+                key = (source, chunk["chunk_id"])
+                self.keywords.add(key, chunk["text"])
+                self.documents[key] = chunk
+                keys.append(key)
+            self._pdf_keys[source] = (document["sha256"], keys)
+            report["chunks_indexed"] += len(keys)
+
+    def _sync_tables(self, report):
+        with self.connection() as conn:
+            try:
+                # generations first, then rows: a racing write only causes one more reload
+                generations = dict(conn.execute(
+                    "SELECT name, generation FROM ref_generations WHERE name IN (SELECT value FROM json_each(?))",
+                    (json.dumps(self.tables),)
+                ))
+                changed = [t for t in self.tables if t not in self._generations or generations.get(t) != self._generations[t]]
+                loaded = {table: TABLE_LOADERS[table](conn) for table in changed}
+            except sqlite3.OperationalError as e:
+                # lab database not initialized yet: PDFs only until it is
+                report["skipped"] = str(e)
+                return
+
+        embed = {}
+        for table, texts in loaded.items():
+            old = self._row_texts.get(table, {})
+            for key in old.keys() - texts.keys():
+                self.keywords.remove(key)
+                self.documents.pop(key, None)
+                self._row_vectors.pop(key, None)
+                report["rows_removed"] += 1
+            for key, text in texts.items():
+                if old.get(key) != text:
+                    self.keywords.add(key, text)
+                    self.documents[key] = {"text": text, "source": f"db:{table}", "page": None}
+                    embed[key] = text
+            self._row_texts[table] = texts
+            self._generations[table] = generations.get(table)
+            report["tables"].append(table)
+
+        if embed:
+            vectors = self.vector_index.embeddings.embed_array(list(embed.values()))
+            self._row_vectors.update(zip(embed, vectors))
+            report["rows_indexed"] += len(embed)
+        if embed or report["rows_removed"]:
+            keys = list(self._row_vectors)
+            matrix = np.stack([self._row_vectors[key] for key in keys]) if keys else None
+            self._rows = (DenseMatrix(matrix) if keys else None, keys)
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def search_many(self, queries: List[str], k: int = 4, vectors: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """
+        Top-k documents for each query by fused rank:
+        [{text, source, page, score, dense_rank, keyword_rank}], best first.
+        Pass `vectors` when the queries are already embedded.
+        """
+        if not queries:
+            return []
+        self.refresh()
+        candidates = max(self.candidates, k)
+
+        if vectors is None:
+            vectors = self.vector_index.embeddings.embed_array(list(queries))
+        pdf_hits = self.vector_index.search_vectors(vectors, candidates)
+        row_engine, row_keys = self._rows
+        row_hits = [[] for _ in queries]
+        if row_keys:
+            indices, scores = row_engine.top_k(vectors, candidates)
+            row_hits = [
+                [(row_keys[j], float(score)) for j, score in zip(row_indices, row_scores)]
+                for row_indices, row_scores in zip(indices, scores)
+            ]
+
+        with self._lock:
+            keyword_hits = [self.keywords.search(query, candidates) for query in queries]
+            found = [
+                {key: self.documents[key] for key, _ in hits + rows if key in self.documents}
+                for hits, rows in zip(keyword_hits, row_hits)
+            ]
+
+        results = []
+        for i in range(len(queries)):
+            documents = found[i]
+            dense = [(key, score) for key, score in row_hits[i] if key in documents]
+            for hit in pdf_hits[i]:
+                key = (hit["source"], hit["chunk_id"])
+                documents.setdefault(key, hit)
+                dense.append((key, hit["score"]))
+            dense.sort(key=lambda item: item[1], reverse=True)
+            dense_ranking = [key for key, _ in dense[:candidates]]
+            keyword_ranking = [key for key, _ in keyword_hits[i] if key in documents]
+
+            dense_rank = {key: rank for rank, key in enumerate(dense_ranking, start=1)}
+            keyword_rank = {key: rank for rank, key in enumerate(keyword_ranking, start=1)}
+            results.append([
+                {
+                    "text": documents[key]["text"],
+                    "source": documents[key]["source"],
+                    "page": documents[key].get("page"),
+                    "score": score,
+                    "dense_rank": dense_rank.get(key),
+                    "keyword_rank": keyword_rank.get(key),
+                }
+                for key, score in rrf_fuse([dense_ranking, keyword_ranking])[:k]
+            ])
+        return results
+
+    def search(self, query: str, k: int = 4) -> List[Dict]:
+        return self.search_many([query], k)[0]
@@ -0,0 +1,85 @@
+# -------------------------------
+# BM25 KEYWORD INDEX
+# -------------------------------
+# Inverted index for exact entities that embeddings blur: test names,
+# doctor names, dates, timings. Documents are added, replaced and removed
+# one at a time (only the postings of that document are touched), so a
+# changed table row is re-indexed without rebuilding anything else.
+#
+# Scoring is Okapi BM25 (BM25_K1, BM25_B) with the non-negative idf
+# log(1 + (N - df + 0.5) / (df + 0.5)).
+
+import heapq
+import math
+import os
+import re
+from collections import Counter
+from typing import Hashable, List, Tuple
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}      # term -> {doc_id: term frequency}
+        self.doc_terms = {}     # doc_id -> its distinct terms
+        self.doc_len = {}       # doc_id -> number of tokens
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_len
+
+    def add(self, doc_id: Hashable, text: str):
+        """Index a document (replaces it if doc_id is already indexed)."""
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = tuple(counts)
+        self.doc_len[doc_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def remove(self, doc_id: Hashable) -> bool:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id)
+        return True
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Hashable, float]]:
+        """Top-k (doc_id, score), best first. Documents sharing no term with the query are not returned."""
+        n = len(self.doc_len)
+        if not n or k <= 0:
+            return []
+        avg_len = self.total_len / n or 1.0
+        k1, b = self.k1, self.b
+
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = k1 * (1 - b + b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
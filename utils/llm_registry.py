@@ -0,0 +1,253 @@
+# -------------------------------
+# LLM CLIENT REGISTRY
+# -------------------------------
+# One chat model client per (model, temperature), shared by the MCP server,
+# the LangGraph chat node and RAG. The client keeps its HTTP connections
+# (and TLS sessions) alive between calls, so only the first call of a
+# process pays for client setup.
+#
+# Every call made through a registry client (invoke / ainvoke / stream /
+# astream, also through bind_tools and with_structured_output) is:
+#   - limited to LLM_MAX_CONCURRENCY in-flight calls per model
+#     (threads share one limit, each event loop has its own)
+#   - bounded by LLM_TIMEOUT seconds per request and LLM_MAX_RETRIES retries
+#   - counted: calls, errors, latency and input / output tokens (llm_stats())
+#
+# Settings come from the environment (.env):
+#   LLM_MODEL=gemini-2.5-flash  LLM_TIMEOUT=30  LLM_MAX_RETRIES=2  LLM_MAX_CONCURRENCY=8
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from pydantic import PrivateAttr
+
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LATENCY_SAMPLES = 512      # recent calls kept per model for percentiles
+
+
+# -------------------------------
+# Concurrency limits
+# -------------------------------
+class CallLimiter:
+    def __init__(self, limit):
+        self.limit = limit
+        self._threads = threading.BoundedSemaphore(limit)
+        self._loops = weakref.WeakKeyDictionary()   # event loop -> asyncio.Semaphore
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def sync(self):
+        with self._threads:
+            yield
+
+    @asynccontextmanager
+    async def aio(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._loops.get(loop)
+            if semaphore is None:
+                semaphore = self._loops[loop] = asyncio.Semaphore(self.limit)
+        async with semaphore:
+            yield
+
+
+# -------------------------------
+# Call statistics
+# -------------------------------
+class CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.total_ms = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def finish(self, started, usage=None, error=False):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self.errors += error
+            self.total_ms += elapsed
+            self.latencies.append(elapsed)
+            if usage:
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            pick = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1) if latencies else None
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else None,
+                "p50_ms": pick(0.50),
+                "p95_ms": pick(0.95),
+            }
+
+
+def _add_usage(total, usage):
+    if usage:
+        total["input_tokens"] = total.get("input_tokens", 0) + usage.get("input_tokens", 0)
+        total["output_tokens"] = total.get("output_tokens", 0) + usage.get("output_tokens", 0)
+    return total
+
+
+def _result_usage(result):
+    usage = {}
+    for generation in result.generations:
+        _add_usage(usage, getattr(generation.message, "usage_metadata", None))
+    return usage
+
+
+_LIMITERS: Dict[str, CallLimiter] = {}
+_STATS: Dict[str, CallStats] = {}
+
+
+# -------------------------------
+# Instrumented model classes
+# -------------------------------
+def _instrumented(base):
+    """Subclass of a LangChain chat model class whose calls are limited and counted."""
+
+    class Instrumented(base):
+        _registry_model: str = PrivateAttr(default="")   # key into _LIMITERS / _STATS
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            stats = _STATS[self._registry_model]
+            with _LIMITERS[self._registry_model].sync():
+                started = stats.start()
+                try:
+                    result = super()._generate(messages, stop, run_manager, **kwargs)
+                except BaseException:
+                    stats.finish(started, error=True)
+                    raise
+            stats.finish(started, _result_usage(result))
+            return result
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            stats = _STATS[self._registry_model]
+            async with _LIMITERS[self._registry_model].aio():
+                started = stats.start()
+                try:
+                    result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+                except BaseException:
+                    stats.finish(started, error=True)
+                    raise
+            stats.finish(started, _result_usage(result))
+            return result
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            stats = _STATS[self._registry_model]
+            with _LIMITERS[self._registry_model].sync():
+                started, usage = stats.start(), {}
+                try:
+                    for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+                        _add_usage(usage, getattr(chunk.message, "usage_metadata", None))
+                        yield chunk
+                except BaseException:
+                    stats.finish(started, usage, error=True)
+                    raise
+            stats.finish(started, usage)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            stats = _STATS[self._registry_model]
+            async with _LIMITERS[self._registry_model].aio():
+                started, usage = stats.start(), {}
+                try:
+                    async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                        _add_usage(usage, getattr(chunk.message, "usage_metadata", None))
+                        yield chunk
+                except BaseException:
+                    stats.finish(started, usage, error=True)
+                    raise
+            stats.finish(started, usage)
+
+    Instrumented.__name__ = Instrumented.__qualname__ = f"Instrumented{base.__name__}"
+    return Instrumented
+
+
+_CLASSES = {}
+
+
+def _model_class(model: str):
+    if model.startswith(("gpt-", "o1", "o3", "o4")):
+        from langchain_openai import ChatOpenAI as base
+    else:
+        from langchain_google_genai import ChatGoogleGenerativeAI as base
+    if base not in _CLASSES:
+        _CLASSES[base] = _instrumented(base)
+    return _CLASSES[base]
+
+
+# -------------------------------
+# Registry
+# -------------------------------
+_MODELS = {}
+_STRUCTURED = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_chat_model(model: Optional[str] = None, temperature: Optional[float] = None):
+    """Shared, instrumented chat model for (model, temperature)."""
+    model = model or DEFAULT_MODEL
+    key = (model, temperature)
+    client = _MODELS.get(key)
+    if client is None:
+        with _REGISTRY_LOCK:
+            client = _MODELS.get(key)
+            if client is None:
+                _LIMITERS.setdefault(model, CallLimiter(LLM_MAX_CONCURRENCY))
+                _STATS.setdefault(model, CallStats())
+                options = {"model": model, "timeout": LLM_TIMEOUT, "max_retries": LLM_MAX_RETRIES}
+                if temperature is not None:
+                    options["temperature"] = temperature
+                client = _model_class(model)(**options)
+                client._registry_model = model
+                _MODELS[key] = client
+    return client
+
+
+def get_structured_model(schema, model: Optional[str] = None, temperature: Optional[float] = None):
+    """Shared with_structured_output(schema) runnable on top of get_chat_model()."""
+    key = (schema, model or DEFAULT_MODEL, temperature)
+    runnable = _STRUCTURED.get(key)
+    if runnable is None:
+        client = get_chat_model(model, temperature)
+        with _REGISTRY_LOCK:
+            runnable = _STRUCTURED.get(key)
+            if runnable is None:
+                runnable = _STRUCTURED[key] = client.with_structured_output(schema)
+    return runnable
+
+
+def llm_stats() -> Dict[str, Dict]:
+    """Per-model call counters, latency percentiles and token totals."""
+    return {
+        model: {**stats.snapshot(), "max_concurrency": _LIMITERS[model].limit}
+        for model, stats in list(_STATS.items())
+    }
@@ -0,0 +1,204 @@
+# -------------------------------
+# STREAMING PDF INGESTION
+# -------------------------------
+# Turns one PDF into the RAG index files (<sha256>.npy + <sha256>.json, see
+# utils/rag_index.py) without holding the document in memory:
+#
+#   pages      extracted a few at a time (PAGES_PER_TASK) by a process pool
+#              of INGEST_WORKERS (pdfplumber is CPU-bound Python), at most
+#              2 x workers tasks in flight, yielded in page order
+#   chunks     each page split on its own as it arrives (same chunks as
+#              PDFPlumberLoader + RecursiveCharacterTextSplitter, which also
+#              split page by page)
+#   vectors    embedded EMBED_BATCH_SIZE chunks at a time and appended to
+#              <sha256>.partial/vectors.f32, chunk texts to chunks.jsonl
+#
+# Memory stays at a few pages plus one batch whatever the document size.
+#
+# Checkpoints: after every batch both files are flushed and checkpoint.json
+# records the rows written, the byte length of chunks.jsonl and where the
+# next chunk comes from (page, chunks of that page already written). An
+# interrupted ingest resumes there: the files are cut back to the
+# checkpoint and extraction restarts at that page. Finished, the partial
+# files are streamed into the final .npy / .json and the directory removed.
+#
+# One writer per PDF: ingest_pdf does no locking of its own. VectorIndex.sync
+# calls it with the index directory's lock held (utils/rag_index.py).
+
+import json
+import os
+import shutil
+import threading
+from collections import deque
+
+import numpy as np
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", "8"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+COPY_BLOCK_ROWS = 4096
+
+
+def write_atomic(path, write):
+    """write(tmp) then rename over path, so readers never see a half-written file."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+# -------------------------------
+# Pages
+# -------------------------------
+def page_count(path: str) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_pages(path, start, end):
+    """[(page number, text)] for pages start..end-1 (runs in a pool worker)."""
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(path) as pdf:
+        for number in range(start, end):
+            page = pdf.pages[number]
+            pages.append((number, (page.extract_text() or "") + "\n"))
+            page.close()        # drop the page's parsed layout objects
+    return pages
+
+
+def iter_pages(path, start=0, pool=None, pages_per_task=PAGES_PER_TASK, max_pending=None):
+    """(page number, text) from page `start` on, in order."""
+    total = page_count(path)
+    ranges = [(s, min(s + pages_per_task, total)) for s in range(start, total, pages_per_task)]
+    if pool is None or len(ranges) <= 1:
+        for s, e in ranges:
+            yield from _extract_pages(path, s, e)
+        return
+
+    max_pending = max_pending or 2 * INGEST_WORKERS
+    pending = deque()
+    for s, e in ranges:
+        pending.append(pool.submit(_extract_pages, path, s, e))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+# -------------------------------
+# Chunks
+# -------------------------------
+def iter_chunks(path, pages, skip=0):
+    """
+    (page, index in page, chunk) per chunk; the first `skip` chunks of the
+    first page are left out (already written before a resume).
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for number, text in pages:
+        for index, piece in enumerate(splitter.split_text(text)):
+            if index >= skip:
+                yield number, index, {"text": piece, "source": path, "page": number}
+        skip = 0
+
+
+# -------------------------------
+# Checkpointed ingest
+# -------------------------------
+def _read_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, checkpoint):
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+    write_atomic(path, write)
+
+
+def _finish(partial_dir, matrix_path, chunks_path, rows, dim):
+    """Stream the partial files into the final .npy and .json (matrix last: it marks completion)."""
+    def write_chunks(tmp):
+        with open(os.path.join(partial_dir, "chunks.jsonl"), encoding="utf-8") as src, \
+                open(tmp, "w", encoding="utf-8") as out:
+            out.write("[")
+            for i, line in enumerate(src):
+                out.write(("," if i else "") + line.rstrip("\n"))
+            out.write("]")
+
+    def write_matrix(tmp):
+        with open(os.path.join(partial_dir, "vectors.f32"), "rb") as src, open(tmp, "wb") as out:
+            header = {"descr": "<f4", "fortran_order": False, "shape": (rows, dim)}
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(src, out, COPY_BLOCK_ROWS * dim * 4)
+
+    write_atomic(chunks_path, write_chunks)
+    write_atomic(matrix_path, write_matrix)
+    shutil.rmtree(partial_dir, ignore_errors=True)
+
+
+def ingest_pdf(path, matrix_path, chunks_path, embeddings, pool=None, batch_size=EMBED_BATCH_SIZE):
+    """
+    Extract, chunk and embed one PDF into matrix_path / chunks_path,
+    resuming from a checkpoint left by an interrupted run.
+    Returns {"chunks", "resumed_at_page"}.
+    """
+    partial_dir = os.path.splitext(matrix_path)[0] + ".partial"
+    checkpoint_path = os.path.join(partial_dir, "checkpoint.json")
+    os.makedirs(partial_dir, exist_ok=True)
+
+    checkpoint = _read_checkpoint(checkpoint_path) or {"rows": 0, "chunks_bytes": 0, "page": 0, "skip": 0, "dim": None}
+    resumed_at = checkpoint["page"] if checkpoint["rows"] else None
+    dim = checkpoint["dim"]
+
+    with open(os.path.join(partial_dir, "vectors.f32"), "ab") as vectors_file, \
+            open(os.path.join(partial_dir, "chunks.jsonl"), "ab") as chunks_file:
+        # anything written after the last checkpoint is redone
+        vectors_file.truncate(checkpoint["rows"] * (dim or 0) * 4)
+        chunks_file.truncate(checkpoint["chunks_bytes"])
+
+        def write_batch(batch):
+            nonlocal dim
+            matrix = np.ascontiguousarray(embeddings.embed_array([chunk["text"] for _, _, chunk in batch]), dtype="<f4")
+            dim = matrix.shape[1]
+            vectors_file.write(matrix.tobytes())
+            chunks_file.write("".join(json.dumps(chunk) + "\n" for _, _, chunk in batch).encode())
+            vectors_file.flush()
+            chunks_file.flush()
+            os.fsync(vectors_file.fileno())
+            os.fsync(chunks_file.fileno())
+
+            page, index, _ = batch[-1]
+            checkpoint.update(
+                rows=checkpoint["rows"] + len(batch),
+                chunks_bytes=chunks_file.tell(),
+                page=page,
+                skip=index + 1,
+                dim=dim,
+            )
+            _write_checkpoint(checkpoint_path, checkpoint)
+
+        pages = iter_pages(path, checkpoint["page"], pool)
+        batch = []
+        for item in iter_chunks(path, pages, checkpoint["skip"]):
+            batch.append(item)
+            if len(batch) == batch_size:
+                write_batch(batch)
+                batch = []
+        if batch:
+            write_batch(batch)
+
+    if dim is None:
+        dim = embeddings.embed_array([""]).shape[1]     # PDF without text: an empty (0, dim) matrix
+    _finish(partial_dir, matrix_path, chunks_path, checkpoint["rows"], dim)
+    return {"chunks": checkpoint["rows"], "resumed_at_page": resumed_at}
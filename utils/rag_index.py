@@ -0,0 +1,355 @@
+# -------------------------------
+# RAG VECTOR INDEX (on disk)
+# -------------------------------
+# Chunks of the lab PDFs embedded once and kept on disk, so a restart only
+# maps the vectors back in instead of re-parsing and re-embedding:
+#
+#   rag_index/<embedder>/manifest.json     source path -> sha256, size, mtime, chunks
+#   rag_index/<embedder>/<sha256>.npy      float32 matrix, one L2-normalized row per chunk
+#   rag_index/<embedder>/<sha256>.json     chunk texts and metadata (same order)
+#   rag_index/<embedder>/<sha256>.partial/ ingest in progress (utils/pdf_ingest.py)
+#   rag_index/<embedder>/.lock             held (flock) by the process syncing
+#
+# Files are keyed by the PDF's content hash: a changed PDF gets new files,
+# an unchanged one (same size and mtime, or same hash) is loaded with
+# np.load(mmap_mode="r"). Files of removed or replaced PDFs are deleted.
+# New PDFs are streamed in page by page with checkpoints, so an interrupted
+# sync resumes where it stopped. A source may be a directory of PDFs.
+#
+# Several processes may share one index directory (MCP workers each import
+# lab_info): sync runs under an exclusive flock on .lock, so one process
+# ingests a new PDF while the others wait and then load its files. A .npy
+# whose row count does not match its .json is ingested again.
+#
+#   python -m utils.rag_index lab_info.pdf docs/      # ingest ahead of time
+#
+# Embeddings (RAG_EMBEDDINGS):
+#   hashing   offline, deterministic feature hashing of words, word pairs
+#             and character trigrams (default, no model or network)
+#   google    GoogleGenerativeAIEmbeddings (RAG_EMBEDDING_MODEL)
+# Each embedder has its own directory, so switching does not clobber the other.
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.pdf_ingest import INGEST_WORKERS, PAGES_PER_TASK, ingest_pdf, page_count, write_atomic
+from utils.vector_search import DenseMatrix
+
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "rag_index")
+RAG_EMBEDDINGS = os.getenv("RAG_EMBEDDINGS", "hashing")
+RAG_EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "models/text-embedding-004")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1024"))
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+try:
+    import fcntl
+except ImportError:     # Windows: no cross-process lock, use one process per index directory
+    fcntl = None
+
+
+@contextmanager
+def _exclusive_lock(path):
+    """Exclusive flock on `path`, held across processes (and across VectorIndex instances)."""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# -------------------------------
+# Embeddings
+# -------------------------------
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing into `dim` buckets: words, adjacent word pairs and
+    character trigrams of words (so "vit d" still lands near "vitamin d"),
+    sublinear term frequency, L2-normalized. Deterministic across processes.
+    """
+
+    VERSION = 1
+    TRIGRAM_WEIGHT = 0.5
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    @property
+    def signature(self) -> str:
+        return f"hashing-v{self.VERSION}-{self.dim}"
+
+    def _features(self, text: str) -> Counter:
+        words = WORD_RE.findall(text.lower())
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                features[f"3:{padded[i:i + 3]}"] += self.TRIGRAM_WEIGHT
+        return features
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = zlib.crc32(feature.encode())
+                weight = 1.0 + math.log(count) if count >= 1 else count
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+class NormalizedEmbeddings:
+    """Any LangChain Embeddings as L2-normalized float32 arrays."""
+
+    def __init__(self, base: Embeddings, signature: str):
+        self.base = base
+        self.signature = signature
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        matrix = np.asarray(self.base.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+def get_embeddings():
+    if RAG_EMBEDDINGS == "hashing":
+        return HashingEmbeddings()
+    if RAG_EMBEDDINGS == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        model = RAG_EMBEDDING_MODEL
+        return NormalizedEmbeddings(GoogleGenerativeAIEmbeddings(model=model), "google-" + model.replace("/", "_"))
+    raise ValueError(f"RAG_EMBEDDINGS must be 'hashing' or 'google', got {RAG_EMBEDDINGS!r}")
+
+
+# -------------------------------
+# Sources
+# -------------------------------
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def expand_sources(sources: List[str]) -> List[str]:
+    """PDF paths, with each directory replaced by the PDFs in it (sorted)."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith(".pdf")
+            ))
+        else:
+            paths.append(source)
+    return paths
+
+
+# -------------------------------
+# Index
+# -------------------------------
+class VectorIndex:
+    def __init__(self, index_dir: str = RAG_INDEX_DIR, embeddings=None):
+        self.embeddings = embeddings or get_embeddings()
+        self.dir = os.path.join(index_dir, self.embeddings.signature)
+        os.makedirs(self.dir, exist_ok=True)
+        self._manifest_path = os.path.join(self.dir, "manifest.json")
+        self._lock_path = os.path.join(self.dir, ".lock")
+        self._lock = threading.Lock()
+        self.documents = {}     # source -> {"sha256", "matrix", "chunks"}
+        self.engine = DenseMatrix(np.zeros((0, 1), dtype=np.float32), normalized=True)
+        self.chunks = []        # rows of engine.matrix
+        self.manifest = self._read_manifest()
+        self._pool = None       # extraction workers, only while a sync embeds something
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"documents": {}}
+
+    def _write_manifest(self):
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=1)
+        write_atomic(self._manifest_path, write)
+
+    def _paths(self, digest):
+        return os.path.join(self.dir, f"{digest}.npy"), os.path.join(self.dir, f"{digest}.json")
+
+    def _read_files(self, digest):
+        """(matrix, chunks) of one PDF; None when missing or when their row counts disagree."""
+        matrix_path, chunks_path = self._paths(digest)
+        try:
+            with open(chunks_path, encoding="utf-8") as f:
+                chunks = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if matrix.shape[0] != len(chunks):
+            print(f"[rag_index] {digest[:16]}: {matrix.shape[0]} vectors for {len(chunks)} chunks, ingesting again")
+            return None
+        return matrix, chunks
+
+    def _load_or_embed(self, source):
+        """(digest, matrix, chunks, embedded?) for one PDF (called with the index lock held)."""
+        stat = os.stat(source)
+        entry = self.manifest["documents"].get(source)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            digest = entry["sha256"]
+        else:
+            digest = file_sha256(source)
+
+        # checked under the lock: another process may have just finished this PDF
+        files = self._read_files(digest)
+        embedded = files is None
+        if embedded:
+            matrix_path, chunks_path = self._paths(digest)
+            ingest_pdf(source, matrix_path, chunks_path, self.embeddings, self._extraction_pool(source))
+            files = self._read_files(digest)
+            if files is None:
+                raise RuntimeError(f"ingest of {source} produced inconsistent index files")
+        matrix, chunks = files
+
+        for n, chunk in enumerate(chunks):
+            chunk["source"] = source                    # chunk files are shared by identical PDFs
+            chunk["chunk_id"] = f"{digest[:16]}:{n}"     # stable while the PDF is unchanged
+
+        self.manifest["documents"][source] = {
+            "sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "chunks": len(chunks)
+        }
+        return digest, matrix, chunks, embedded
+
+    def _extraction_pool(self, source):
+        """Process pool for page extraction, started for the first PDF big enough to use it."""
+        if self._pool is None and INGEST_WORKERS > 1 and page_count(source) > PAGES_PER_TASK:
+            self._pool = ProcessPoolExecutor(INGEST_WORKERS)
+        return self._pool
+
+    def sync(self, sources: List[str]) -> Dict:
+        """
+        Make the index hold exactly `sources` (PDFs or directories of PDFs):
+        unchanged PDFs are mapped from disk, new or changed ones streamed in
+        and embedded, removed ones dropped.
+        """
+        started = time.perf_counter()
+        report = {"loaded": [], "embedded": [], "removed": []}
+        with self._lock, _exclusive_lock(self._lock_path):
+            self.manifest = self._read_manifest()     # another process may have synced since
+            documents = {}
+            try:
+                for source in expand_sources(sources):
+                    digest, matrix, chunks, embedded = self._load_or_embed(source)
+                    documents[source] = {"sha256": digest, "matrix": matrix, "chunks": chunks}
+                    report["embedded" if embedded else "loaded"].append(source)
+                    if embedded:
+                        self._write_manifest()      # a resumed sync does not hash this PDF again
+            finally:
+                if self._pool is not None:
+                    self._pool.shutdown()
+                    self._pool = None
+
+            for source in list(self.manifest["documents"]):
+                if source not in documents:
+                    del self.manifest["documents"][source]
+                    report["removed"].append(source)
+            self.documents = documents
+            self._build_engine()
+            self._write_manifest()
+            self._delete_unreferenced()
+
+        report["chunks"] = sum(len(d["chunks"]) for d in self.documents.values())
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+
+    def _delete_unreferenced(self):
+        referenced = {entry["sha256"] for entry in self.manifest["documents"].values()}
+        for name in os.listdir(self.dir):
+            digest, ext = os.path.splitext(name)
+            if digest in referenced or name == "manifest.json":
+                continue
+            if ext == ".partial":
+                shutil.rmtree(os.path.join(self.dir, name), ignore_errors=True)
+            elif ext in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(self.dir, name))
+                except OSError:
+                    pass
+
+    def _build_engine(self):
+        """One contiguous matrix over all documents (a single PDF is used straight from the mmap)."""
+        documents = list(self.documents.values())
+        if len(documents) == 1:
+            matrix = documents[0]["matrix"]
+        elif documents:
+            matrix = np.concatenate([d["matrix"] for d in documents])
+        else:
+            matrix = np.zeros((0, 1), dtype=np.float32)
+        self.engine = DenseMatrix(matrix, normalized=True)     # rows were normalized when embedded
+        self.chunks = [chunk for d in documents for chunk in d["chunks"]]
+
+    def search_many(self, queries: List[str], k: int = 4) -> List[List[Dict]]:
+        """Top-k chunks for each query, embedded and scored as one batch."""
+        if not queries:
+            return []
+        return self.search_vectors(self.embeddings.embed_array(list(queries)), k)
+
+    def search_vectors(self, vectors: np.ndarray, k: int = 4) -> List[List[Dict]]:
+        """Top-k chunks for each row of already embedded queries."""
+        engine, chunks = self.engine, self.chunks
+        if not chunks:
+            return [[] for _ in vectors]
+        indices, scores = engine.top_k(vectors, k)
+        return [
+            [{**chunks[i], "score": float(s)} for i, s in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def search(self, query: str, k: int = 4) -> List[Dict]:
+        """Top-k chunks by cosine similarity: [{text, source, page, chunk_id, score}]."""
+        return self.search_many([query], k)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest PDFs into the RAG index (resumes an interrupted run)")
+    parser.add_argument("sources", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--index-dir", default=RAG_INDEX_DIR)
+    args = parser.parse_args()
+
+    report = VectorIndex(args.index_dir).sync(args.sources)
+    for key, value in report.items():
+        print(f"{key:>10}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,31 @@
 # -----------------------------
 # TEST CAPACITY & WINDOWS
 # -----------------------------
+# Windows are regenerated by diffing the planned layout against the stored
+# one: a window whose (window_start, window_end) is unchanged keeps its
+# window_id, so bookings and booking_counters that point at it stay valid.
+# Only removed intervals are deleted and only new ones are inserted.
+# Nothing here commits when the caller passes its connection; the caller's
+# transaction covers the schedule change and its windows together.
 
-import sqlite3
 from datetime import datetime, timedelta
+import json
+import time
 import uuid
-DB_PATH = "lab_system.db"
 
+from backend.db_pool import db_connection
 
+FMT = "%H:%M"
 
-def get_daily_capacity(test_id, schedule_id):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT duration FROM tests WHERE test_id=?", (test_id,))
-        row = cursor.fetchone()
-        duration = int(row[0]) if row and row[0] else 1
 
-        cursor.execute("SELECT opens_at, closes_at FROM test_schedule WHERE schedule_id=?", (schedule_id,))
-        row = cursor.fetchone()
-        if not row or not row[0] or not row[1]:
-            return 1
-        opens_at, closes_at = row
+def _daily_capacity(duration, opens_at, closes_at):
+    duration = int(duration) if duration else 1
 
-    fmt = "%H:%M"
-    start = datetime.strptime(opens_at, fmt)
-    end = datetime.strptime(closes_at, fmt)
+    if not opens_at or not closes_at:
+        return 1
+
+    start = datetime.strptime(opens_at, FMT)
+    end = datetime.strptime(closes_at, FMT)
     working_minutes = int((end - start).total_seconds() / 60)
     if working_minutes <= 0:
         return 1
@@ -33,59 +34,211 @@ def get_daily_capacity(test_id, schedule_id):
     realistic = max(int(max_raw * 0.75), 1)
     return realistic
 
-def generate_windows_for_schedule(test_id, schedule_id, window_minutes: int):
-    fmt = "%H:%M"
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT opens_at, closes_at FROM test_schedule WHERE schedule_id=?", (schedule_id,))
-        row = cursor.fetchone()
-        if not row or not row[0] or not row[1]:
-            return
-        opens_at, closes_at = row
-
-        start_time = datetime.strptime(opens_at, fmt)
-        end_time = datetime.strptime(closes_at, fmt)
-        working_minutes = int((end_time - start_time).total_seconds() / 60)
-        if working_minutes <= 0 or window_minutes <= 0:
-            return
-
-        # generate windows
-        windows = []
-        current_start = start_time
-        window_index = 0
-        while current_start < end_time:
-            current_end = current_start + timedelta(minutes=window_minutes)
-            if current_end > end_time:
-                current_end = end_time
-            windows.append((window_index, current_start.strftime(fmt), current_end.strftime(fmt)))
-            window_index += 1
-            current_start = current_end
-
-        if not windows:
-            return
-
-        # calculate capacity
-        total_capacity = get_daily_capacity(test_id, schedule_id)
-        win_count = len(windows)
-        base = total_capacity // win_count
-        extra = total_capacity % win_count
-        capacities = [base + (1 if i < extra else 0) for i in range(win_count)]
-
-        # delete existing windows for schedule
-        cursor.execute("DELETE FROM test_schedule_windows WHERE schedule_id=?", (schedule_id,))
-
-        # insert new windows
-        for idx, (win_index, win_start, win_end) in enumerate(windows):
-            window_id = str(uuid.uuid4())
-            max_tests = capacities[idx]
-            cursor.execute("""
-                INSERT INTO test_schedule_windows
-                (window_id, test_id, schedule_id, window_index, window_start, window_end, max_tests)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (window_id, test_id, schedule_id, win_index, win_start, win_end, max_tests))
-
-        conn.commit()
 
+def get_daily_capacity(test_id, schedule_id, conn=None):
+    if conn is None:
+        with db_connection() as conn:
+            return get_daily_capacity(test_id, schedule_id, conn)
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT t.duration, ts.opens_at, ts.closes_at
+        FROM test_schedule ts
+        JOIN tests t ON t.test_id = ts.test_id
+        WHERE ts.schedule_id=? AND t.test_id=?
+    """, (schedule_id, test_id))
+    row = cursor.fetchone()
+    if not row:
+        return 1
+    return _daily_capacity(*row)
+
+
+def plan_windows(opens_at, closes_at, window_minutes, duration):
+    """
+    Window layout for a schedule: [(window_index, window_start, window_end, max_tests)].
+    Returns None when the schedule has no usable hours (windows are left alone).
+    """
+    if not opens_at or not closes_at or not window_minutes or window_minutes <= 0:
+        return None
+
+    start_time = datetime.strptime(opens_at, FMT)
+    end_time = datetime.strptime(closes_at, FMT)
+    if end_time <= start_time:
+        return None
+
+    windows = []
+    current_start = start_time
+    while current_start < end_time:
+        current_end = min(current_start + timedelta(minutes=window_minutes), end_time)
+        windows.append((current_start.strftime(FMT), current_end.strftime(FMT)))
+        current_start = current_end
+
+    # spread the daily capacity over the windows, remainder to the first ones
+    total_capacity = _daily_capacity(duration, opens_at, closes_at)
+    base, extra = divmod(total_capacity, len(windows))
+    return [
+        (index, win_start, win_end, base + (1 if index < extra else 0))
+        for index, (win_start, win_end) in enumerate(windows)
+    ]
+
+
+def _apply_window_diff(cursor, test_id, schedule_id, planned):
+    """Bring the stored windows of a schedule to `planned`. Returns counters."""
+    cursor.execute("""
+        SELECT window_id, window_index, window_start, window_end, max_tests
+        FROM test_schedule_windows
+        WHERE schedule_id=?
+    """, (schedule_id,))
+    existing = {(start, end): (window_id, index, max_tests)
+                for window_id, index, start, end, max_tests in cursor.fetchall()}
+
+    planned_keys = {(start, end) for _, start, end, _ in planned}
+    removed = [window_id for key, (window_id, _, _) in existing.items() if key not in planned_keys]
+
+    changed, moved, inserted = [], [], []
+    for index, start, end, max_tests in planned:
+        current = existing.get((start, end))
+        if current is None:
+            inserted.append((str(uuid.uuid4()), test_id, schedule_id, index, start, end, max_tests))
+        elif current[1:] != (index, max_tests):
+            changed.append((index, max_tests, current[0]))
+            if current[1] != index:
+                moved.append((current[0],))
+
+    orphaned = 0
+    if removed:
+        removed_params = [(window_id,) for window_id in removed]
+        cursor.execute(
+            "SELECT COUNT(*) FROM bookings WHERE booking_date >= date('now') "
+            "AND window_id IN (SELECT value FROM json_each(?))",
+            (_json_list(removed),)
+        )
+        orphaned = cursor.fetchone()[0]
+        cursor.executemany("DELETE FROM test_schedule_windows WHERE window_id=?", removed_params)
+        cursor.executemany("DELETE FROM booking_counters WHERE window_id=?", removed_params)
+
+    if moved:
+        # park the moved indexes first so UNIQUE (schedule_id, window_index) never collides
+        cursor.executemany(
+            "UPDATE test_schedule_windows SET window_index = -1 - window_index WHERE window_id=?",
+            moved
+        )
+    if changed:
+        cursor.executemany(
+            "UPDATE test_schedule_windows SET window_index=?, max_tests=? WHERE window_id=?",
+            changed
+        )
+
+    if inserted:
+        cursor.executemany("""
+            INSERT INTO test_schedule_windows
+            (window_id, test_id, schedule_id, window_index, window_start, window_end, max_tests)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, inserted)
+
+    return {
+        "kept": len(planned) - len(inserted),
+        "updated": len(changed),
+        "inserted": len(inserted),
+        "deleted": len(removed),
+        "orphaned_future_bookings": orphaned,
+    }
+
+
+def _json_list(values):
+    return json.dumps(list(values))
+
+
+def generate_windows_for_schedule(test_id, schedule_id, window_minutes: int, conn=None):
+    """
+    Regenerate the windows of one schedule. With conn: runs in the caller's
+    transaction (caller commits). Without: own pooled connection, committed.
+    Returns the diff counters, or None if the schedule has no usable hours.
+    """
+    if conn is None:
+        with db_connection() as conn:
+            result = generate_windows_for_schedule(test_id, schedule_id, window_minutes, conn)
+            conn.commit()
+            return result
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT ts.opens_at, ts.closes_at, t.duration
+        FROM test_schedule ts
+        JOIN tests t ON t.test_id = ts.test_id
+        WHERE ts.schedule_id=? AND ts.test_id=?
+    """, (schedule_id, test_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    planned = plan_windows(row[0], row[1], window_minutes, row[2])
+    if not planned:
+        return None
+    return _apply_window_diff(cursor, test_id, schedule_id, planned)
+
+
+def _current_window_minutes(window_start, window_end):
+    """Length of a schedule's first window: its window size when none is given."""
+    if not window_start or not window_end:
+        return None
+    start = datetime.strptime(window_start, FMT)
+    end = datetime.strptime(window_end, FMT)
+    return int((end - start).total_seconds() / 60) or None
+
+
+def regenerate_all_windows(conn=None, window_minutes=None, test_ids=None):
+    """
+    Regenerate the windows of every schedule (optionally only of test_ids) in
+    one pass. window_minutes=None keeps each schedule's current window size
+    and only re-applies hours and capacities. Transaction handling as in
+    generate_windows_for_schedule. Returns totals, the test_ids whose
+    windows changed and the elapsed time.
+    """
+    if conn is None:
+        with db_connection() as conn:
+            result = regenerate_all_windows(conn, window_minutes, test_ids)
+            conn.commit()
+            return result
+
+    t0 = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT
+            ts.test_id,
+            ts.schedule_id,
+            ts.opens_at,
+            ts.closes_at,
+            t.duration,
+            (SELECT w.window_start FROM test_schedule_windows w
+             WHERE w.schedule_id = ts.schedule_id ORDER BY w.window_index LIMIT 1),
+            (SELECT w.window_end FROM test_schedule_windows w
+             WHERE w.schedule_id = ts.schedule_id ORDER BY w.window_index LIMIT 1)
+        FROM test_schedule ts
+        JOIN tests t ON t.test_id = ts.test_id
+        WHERE (:tests IS NULL OR ts.test_id IN (SELECT value FROM json_each(:tests)))
+    """, {"tests": _json_list(test_ids) if test_ids else None})
+    schedules = cursor.fetchall()
+
+    totals = {"schedules": 0, "skipped": 0, "kept": 0, "updated": 0, "inserted": 0,
+              "deleted": 0, "orphaned_future_bookings": 0}
+    touched_tests = set()
+    for test_id, schedule_id, opens_at, closes_at, duration, first_start, first_end in schedules:
+        minutes = window_minutes or _current_window_minutes(first_start, first_end)
+        planned = plan_windows(opens_at, closes_at, minutes, duration)
+        if not planned:
+            totals["skipped"] += 1
+            continue
+        result = _apply_window_diff(cursor, test_id, schedule_id, planned)
+        totals["schedules"] += 1
+        for key, value in result.items():
+            totals[key] += value
+        if result["updated"] or result["inserted"] or result["deleted"]:
+            touched_tests.add(test_id)
+
+    totals["changed_test_ids"] = sorted(touched_tests)
+    totals["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return totals
 
 
 
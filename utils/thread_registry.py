@@ -0,0 +1,211 @@
+# -------------------------------
+# CHAT THREAD REGISTRY
+# -------------------------------
+# One row per conversation in chatbot.db (threads table), kept up to date by
+# the checkpointer itself: every checkpoint that changes the messages also
+# upserts the thread's last activity, message count and title (first user
+# message). The sidebar reads pages of this table ordered by recency
+# instead of walking every checkpoint of every thread.
+#
+# Databases created before the registry are backfilled once, when the table
+# is created (activity times come from the time-ordered checkpoint ids).
+
+import base64
+import json
+import os
+import time
+import uuid
+from typing import Optional
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+THREADS_PAGE_SIZE = int(os.getenv("THREADS_PAGE_SIZE", "50"))
+THREAD_TITLE_CHARS = 60
+
+REGISTRY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    title TEXT,
+    created_at REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_threads_recent ON threads(last_activity DESC, thread_id DESC);
+"""
+
+# 100 ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def checkpoint_time(checkpoint_id: str) -> Optional[float]:
+    """Unix time of a (UUID v6) checkpoint id, None if it is not one."""
+    try:
+        u = uuid.UUID(checkpoint_id)
+    except (ValueError, TypeError):
+        return None
+    if u.version != 6:
+        return None
+    ticks = (u.time_low << 28) | (u.time_mid << 12) | (u.time_hi_version & 0x0FFF)
+    return (ticks - _UUID_EPOCH_OFFSET) / 1e7
+
+
+def thread_title(messages) -> Optional[str]:
+    """First user message, shortened for the sidebar."""
+    for message in messages or ():
+        if getattr(message, "type", None) == "human":
+            text = message.content if isinstance(message.content, str) else str(message.content)
+            text = " ".join(text.split())
+            if len(text) > THREAD_TITLE_CHARS:
+                text = text[:THREAD_TITLE_CHARS - 1].rstrip() + "…"
+            return text or None
+    return None
+
+
+def encode_thread_cursor(last_activity: float, thread_id: str) -> str:
+    raw = json.dumps([last_activity, thread_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_thread_cursor(value: str):
+    """Raises ValueError for a cursor that was not made by encode_thread_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        last_activity, thread_id = json.loads(raw)
+        return float(last_activity), str(thread_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid thread cursor") from e
+
+
+class ThreadRegistrySaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver that maintains the threads table next to the checkpoints."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._registry_ready = False
+
+    async def setup(self) -> None:
+        if self._registry_ready:
+            return
+        await super().setup()
+        async with self.lock:
+            if self._registry_ready:
+                return
+            async with self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='threads'"
+            ) as cur:
+                exists = await cur.fetchone() is not None
+            await self.conn.executescript(REGISTRY_SCHEMA)
+            if not exists:
+                await self._backfill()
+            await self.conn.commit()
+            self._registry_ready = True
+
+    async def _backfill(self):
+        async with self.conn.execute("""
+            SELECT thread_id, MIN(checkpoint_id), MAX(checkpoint_id)
+            FROM checkpoints
+            WHERE checkpoint_ns = ''
+            GROUP BY thread_id
+        """) as cur:
+            rows = await cur.fetchall()
+        now = time.time()
+        await self.conn.executemany(
+            "INSERT OR IGNORE INTO threads (thread_id, created_at, last_activity) VALUES (?, ?, ?)",
+            [
+                (thread_id, checkpoint_time(first) or now, checkpoint_time(last) or now)
+                for thread_id, first, last in rows
+            ]
+        )
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        await self.setup()
+        if "messages" in new_versions and not config["configurable"].get("checkpoint_ns"):
+            messages = checkpoint["channel_values"].get("messages")
+            now = time.time()
+            # Not atomic with the checkpoint: the upsert is left in the
+            # connection's open transaction and goes out with the next commit
+            # on it, normally the checkpoint INSERT of the aput below (the lock
+            # is released in between, so another coroutine's commit may take it
+            # first). If that aput fails, the sidebar may show the activity of
+            # a turn whose checkpoint was not saved; the conversation itself
+            # is unaffected.
+            async with self.lock:
+                await self.conn.execute("""
+                    INSERT INTO threads (thread_id, title, created_at, last_activity, message_count)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(thread_id) DO UPDATE SET
+                        title = COALESCE(threads.title, excluded.title),
+                        last_activity = excluded.last_activity,
+                        message_count = excluded.message_count
+                """, (
+                    str(config["configurable"]["thread_id"]),
+                    thread_title(messages),
+                    now,
+                    now,
+                    len(messages or ()),
+                ))
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def adelete_thread(self, thread_id) -> None:
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self.conn.execute("DELETE FROM threads WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.commit()
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    async def alist_threads(self, limit: int = THREADS_PAGE_SIZE, cursor: Optional[str] = None):
+        """
+        One page of threads, most recent first. Returns (threads, next_cursor);
+        pass next_cursor back for the following page (None on the last one).
+        """
+        await self.setup()
+        params = {"limit": limit + 1}   # one extra row tells us whether there is a next page
+        page_filter = ""
+        if cursor:
+            params["after_activity"], params["after_id"] = decode_thread_cursor(cursor)
+            page_filter = "WHERE (last_activity, thread_id) < (:after_activity, :after_id)"
+
+        async with self.conn.execute(f"""
+            SELECT thread_id, title, created_at, last_activity, message_count
+            FROM threads
+            {page_filter}
+            ORDER BY last_activity DESC, thread_id DESC
+            LIMIT :limit
+        """, params) as cur:
+            rows = await cur.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_thread_cursor(rows[-1][3], rows[-1][0])
+
+        threads = [
+            {
+                "thread_id": r[0],
+                "title": r[1],
+                "created_at": r[2],
+                "last_activity": r[3],
+                "message_count": r[4],
+            }
+            for r in rows
+        ]
+        return threads, next_cursor
+
+    async def alatest_checkpoint_id(self, thread_id) -> Optional[str]:
+        """Id of the thread's latest checkpoint, without loading it (primary key only)."""
+        await self.setup()
+        async with self.conn.execute("""
+            SELECT checkpoint_id FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ''
+            ORDER BY checkpoint_id DESC
+            LIMIT 1
+        """, (str(thread_id),)) as cur:
+            row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def acount_threads(self) -> int:
+        await self.setup()
+        async with self.conn.execute("SELECT COUNT(*) FROM threads") as cur:
+            return (await cur.fetchone())[0]
@@ -0,0 +1,70 @@
+# -------------------------------
+# DENSE TOP-K SEARCH
+# -------------------------------
+# Retrieval engine for the RAG index: one C-contiguous float32 matrix with
+# L2-normalized rows (normalized once, when the index is built), scored
+# against a block of queries with a single matrix product, top-k picked
+# with np.argpartition (O(n) per query) and only those k sorted.
+#
+# Queries are scored in blocks so the score buffer stays under
+# SCORE_BUFFER_BYTES however many queries are passed in one call.
+
+import os
+
+import numpy as np
+
+SCORE_BUFFER_BYTES = int(os.getenv("SCORE_BUFFER_BYTES", str(64 * 1024 * 1024)))
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """float32, C-contiguous, unit-length rows (zero rows stay zero)."""
+    matrix = np.array(matrix, dtype=np.float32, order="C", copy=True, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class DenseMatrix:
+    def __init__(self, matrix: np.ndarray, normalized: bool = False):
+        """
+        matrix: (n, dim) vectors. Pass normalized=True when rows are already
+        unit length float32 (e.g. a memory-mapped index file) to skip the copy.
+        """
+        if normalized and matrix.dtype == np.float32 and matrix.flags.c_contiguous:
+            self.matrix = matrix
+        else:
+            self.matrix = l2_normalize(matrix)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def top_k(self, queries: np.ndarray, k: int):
+        """
+        Cosine top-k for one query (dim,) or a batch (m, dim).
+        Returns (indices, scores), each (m, k') with k' = min(k, n), best first.
+        """
+        queries = l2_normalize(queries)
+        n = len(self)
+        k = min(k, n)
+        m = queries.shape[0]
+        indices = np.empty((m, k), dtype=np.int64)
+        scores = np.empty((m, k), dtype=np.float32)
+        if k == 0:
+            return indices, scores
+
+        block = max(1, SCORE_BUFFER_BYTES // (4 * n))
+        for start in range(0, m, block):
+            block_scores = queries[start:start + block] @ self.matrix.T       # (b, n)
+            if k < n:
+                top = np.argpartition(block_scores, n - k, axis=1)[:, n - k:]
+            else:
+                top = np.broadcast_to(np.arange(n), block_scores.shape)
+            top_scores = np.take_along_axis(block_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            indices[start:start + block] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + block] = np.take_along_axis(top_scores, order, axis=1)
+        return indices, scores